@@ -1,9 +1,11 @@
 from functools import lru_cache
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic import Field
 from pydantic_settings import BaseSettings
 
+ReadPreferenceMode = Literal["primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest"]
+
 
 class ApiKeyHubSettings(BaseSettings):
     # APP CONFIG
@@ -15,9 +17,66 @@ class ApiKeyHubSettings(BaseSettings):
     APP_ACCESS_LOG: Optional[bool] = Field(default=True, alias="APP_ACCESS_LOG", description="Enable/Disable access log")
     APP_DEFAULT_PORT: Optional[int] = Field(default=8800, alias="APP_DEFAULT_PORT", description="Default port of the application")
     USE_TRACK_ACTIVITY_LOGS: Optional[bool] = Field(default=False, alias="USE_TRACK_ACTIVITY_LOGS")
+    ACTIVITY_LOGS_QUEUE_SIZE: Optional[int] = Field(
+        default=10000, alias="ACTIVITY_LOGS_QUEUE_SIZE", description="Maximum number of activity logs waiting to be shipped"
+    )
+    ACTIVITY_LOGS_BATCH_SIZE: Optional[int] = Field(
+        default=100, alias="ACTIVITY_LOGS_BATCH_SIZE", description="Maximum number of activity logs shipped per flush"
+    )
+    ACTIVITY_LOGS_FLUSH_INTERVAL: Optional[float] = Field(
+        default=2.0, alias="ACTIVITY_LOGS_FLUSH_INTERVAL", description="Maximum age in seconds of a batch before it is shipped"
+    )
+    ACTIVITY_LOGS_MAX_RETRIES: Optional[int] = Field(
+        default=3, alias="ACTIVITY_LOGS_MAX_RETRIES", description="Retries of a batch before it is spilled to disk"
+    )
+    ACTIVITY_LOGS_RETRY_BASE_DELAY: Optional[float] = Field(
+        default=0.5, alias="ACTIVITY_LOGS_RETRY_BASE_DELAY", description="Base delay in seconds of the jittered retry backoff"
+    )
+    ACTIVITY_LOGS_RETRY_MAX_DELAY: Optional[float] = Field(
+        default=10.0, alias="ACTIVITY_LOGS_RETRY_MAX_DELAY", description="Maximum delay in seconds between two retries"
+    )
+    ACTIVITY_LOGS_DRAIN_TIMEOUT: Optional[float] = Field(
+        default=10.0, alias="ACTIVITY_LOGS_DRAIN_TIMEOUT", description="Time in seconds allowed to drain the queue on shutdown"
+    )
+    ACTIVITY_LOGS_SPILL_PATH: Optional[str] = Field(
+        default=None,
+        alias="ACTIVITY_LOGS_SPILL_PATH",
+        description="NDJSON file of activity logs spilled while trailhub is down (temp dir by default), suffixed by the pid",
+    )
+    ACTIVITY_LOGS_AUTHORIZATION: Optional[str] = Field(
+        default=None,
+        alias="ACTIVITY_LOGS_AUTHORIZATION",
+        description="Authorization header of the trailhub service credential, required when USE_TRACK_ACTIVITY_LOGS is on",
+    )
     APP_LOOP: Optional[str] = Field(
         default="uvloop", alias="APP_LOOP", description="Type of loop to use: none, auto, asyncio or uvloop"
     )
+
+    # PRODUCTION SERVER CONFIG
+    APP_WORKERS: Optional[int] = Field(
+        default=None, alias="APP_WORKERS", description="Number of worker processes of the production server (CPU count if unset)"
+    )
+    APP_BACKLOG: Optional[int] = Field(
+        default=2048, alias="APP_BACKLOG", description="Maximum number of connections waiting to be accepted"
+    )
+    APP_TIMEOUT_KEEP_ALIVE: Optional[int] = Field(
+        default=5, alias="APP_TIMEOUT_KEEP_ALIVE", description="Seconds an idle keep-alive connection is kept open"
+    )
+    APP_LIMIT_CONCURRENCY: Optional[int] = Field(
+        default=None,
+        alias="APP_LIMIT_CONCURRENCY",
+        description="Maximum number of concurrent connections or tasks per worker before answering 503",
+    )
+    APP_LIMIT_MAX_REQUESTS: Optional[int] = Field(
+        default=None,
+        alias="APP_LIMIT_MAX_REQUESTS",
+        description="Number of requests after which a worker is recycled to cap memory growth",
+    )
+    APP_TIMEOUT_GRACEFUL_SHUTDOWN: Optional[int] = Field(
+        default=30,
+        alias="APP_TIMEOUT_GRACEFUL_SHUTDOWN",
+        description="Seconds a worker waits for in-flight requests when stopped or restarted",
+    )
     API_KEY_PREFIX: Optional[str] = Field(
         default="st",
         alias="API_KEY_PREFIX",
@@ -34,6 +93,169 @@ class ApiKeyHubSettings(BaseSettings):
         alias="SECRET_KEY_HASHED",
         description="Hashed secret key to be used for authentication purposes",
     )
+    SECRET_KEY_ID: Optional[str] = Field(
+        default="v1", alias="SECRET_KEY_ID", description="Id of SECRET_KEY_HASHED, the secret of keys without a secret_id"
+    )
+    SECRET_KEYRING: Optional[dict[str, str]] = Field(
+        default={}, alias="SECRET_KEYRING", description="Additional HMAC secrets by id (JSON object), used for rotation"
+    )
+    ACTIVE_SECRET_ID: Optional[str] = Field(
+        default=None, alias="ACTIVE_SECRET_ID", description="Id of the secret hashing new keys, defaults to SECRET_KEY_ID"
+    )
+    STORE_RAW_API_KEY: Optional[bool] = Field(
+        default=True,
+        alias="STORE_RAW_API_KEY",
+        description="Persist the plaintext api_key, disable after migrate-relax-api-key-index then run migrate-drop-raw-api-key",
+    )
+    USE_HASHED_KEY_FALLBACK: Optional[bool] = Field(
+        default=True,
+        alias="USE_HASHED_KEY_FALLBACK",
+        description="Look up keys without a key_id by their hash, disable once migrate-backfill-key-id reports none left",
+    )
+
+    # VERIFY CACHE CONFIG
+    USE_VERIFY_CACHE: Optional[bool] = Field(
+        default=True, alias="USE_VERIFY_CACHE", description="Enable/Disable the in-process API key verification cache"
+    )
+    VERIFY_CACHE_MAXSIZE: Optional[int] = Field(
+        default=10000, alias="VERIFY_CACHE_MAXSIZE", description="Maximum number of cached verification results"
+    )
+    VERIFY_CACHE_TTL: Optional[int] = Field(
+        default=30,
+        alias="VERIFY_CACHE_TTL",
+        description="Lifetime in seconds of a cached verification result, i.e. the revocation window across replicas",
+    )
+    VERIFY_BATCH_MAX_SIZE: Optional[int] = Field(
+        default=1000, alias="VERIFY_BATCH_MAX_SIZE", description="Maximum number of API keys verified in a single batch"
+    )
+
+    # EXPIRY CONFIG
+    APIKEY_EXPIRY_MODE: Literal["none", "sweeper", "ttl_index"] = Field(
+        default="sweeper",
+        alias="APIKEY_EXPIRY_MODE",
+        description="Lifecycle of expired keys: kept as is, deactivated by a background sweeper or deleted by a TTL index",
+    )
+    EXPIRY_SWEEP_INTERVAL: Optional[float] = Field(
+        default=300.0, alias="EXPIRY_SWEEP_INTERVAL", description="Seconds between two sweeps of expired API keys"
+    )
+    EXPIRY_SWEEP_BATCH_SIZE: Optional[int] = Field(
+        default=1000, alias="EXPIRY_SWEEP_BATCH_SIZE", description="Number of expired API keys deactivated per update"
+    )
+    EXPIRY_SWEEP_BATCH_PAUSE: Optional[float] = Field(
+        default=0.5, alias="EXPIRY_SWEEP_BATCH_PAUSE", description="Pause in seconds between two sweep batches"
+    )
+
+    # CHANGE STREAM CONFIG
+    USE_CHANGE_STREAM_INVALIDATION: Optional[bool] = Field(
+        default=True,
+        alias="USE_CHANGE_STREAM_INVALIDATION",
+        description="Evict the local caches from the change stream of the API keys collection",
+    )
+    CHANGE_STREAM_RETRY_DELAY: Optional[float] = Field(
+        default=5.0, alias="CHANGE_STREAM_RETRY_DELAY", description="Seconds before reopening an interrupted change stream"
+    )
+
+    # REHASH CONFIG
+    REHASH_FLUSH_INTERVAL: Optional[float] = Field(
+        default=10.0,
+        alias="REHASH_FLUSH_INTERVAL",
+        description="Seconds between two batches of keys re-hashed with the active secret",
+    )
+    REHASH_BATCH_SIZE: Optional[int] = Field(
+        default=1000, alias="REHASH_BATCH_SIZE", description="Number of re-hashed keys written per bulk database call"
+    )
+
+    # METRICS CONFIG
+    USE_METRICS: Optional[bool] = Field(
+        default=True, alias="USE_METRICS", description="Enable/Disable the request latency histograms of /apikeys/@metrics"
+    )
+    METRICS_MULTIPROCESS_DIR: Optional[str] = Field(
+        default=None,
+        alias="METRICS_MULTIPROCESS_DIR",
+        description="Directory local to the replica where the serve workers share their metrics, emptied by serve at start",
+    )
+    METRICS_SNAPSHOT_INTERVAL: Optional[float] = Field(
+        default=5.0, alias="METRICS_SNAPSHOT_INTERVAL", description="Seconds between two metrics snapshots of a worker"
+    )
+
+    # USAGE TRACKING CONFIG
+    USE_USAGE_TRACKING: Optional[bool] = Field(
+        default=True, alias="USE_USAGE_TRACKING", description="Enable/Disable the last_used_at tracking of verified keys"
+    )
+    USAGE_FLUSH_INTERVAL: Optional[float] = Field(
+        default=10.0, alias="USAGE_FLUSH_INTERVAL", description="Seconds between two bulk writes of the API keys usage"
+    )
+    USAGE_TRACKER_MAX_KEYS: Optional[int] = Field(
+        default=100000, alias="USAGE_TRACKER_MAX_KEYS", description="Number of pending keys that triggers an early flush"
+    )
+
+    # RATE LIMIT CONFIG
+    USE_RATE_LIMITING: Optional[bool] = Field(
+        default=True,
+        alias="USE_RATE_LIMITING",
+        description="Enable/Disable the per-key rate limits (enforced per worker process) and daily quotas (shared)",
+    )
+    RATE_LIMIT_MAX_KEYS: Optional[int] = Field(
+        default=100000, alias="RATE_LIMIT_MAX_KEYS", description="Maximum number of API keys tracked by the rate limiter"
+    )
+    RATE_LIMIT_IDLE_TTL: Optional[float] = Field(
+        default=600.0, alias="RATE_LIMIT_IDLE_TTL", description="Seconds after which the state of an idle API key is evicted"
+    )
+    RATE_LIMIT_SYNC_INTERVAL: Optional[float] = Field(
+        default=5.0, alias="RATE_LIMIT_SYNC_INTERVAL", description="Seconds between two syncs of the daily quotas with MongoDB"
+    )
+
+    # BULK CONFIG
+    BULK_CREATE_MAX_SIZE: Optional[int] = Field(
+        default=50000, alias="BULK_CREATE_MAX_SIZE", description="Maximum number of API keys issued by a bulk request"
+    )
+    BULK_SELECTION_MAX_IDS: Optional[int] = Field(
+        default=100000, alias="BULK_SELECTION_MAX_IDS", description="Maximum number of ids selected by a bulk update or delete"
+    )
+    BULK_CHUNK_SIZE: Optional[int] = Field(
+        default=1000, alias="BULK_CHUNK_SIZE", description="Number of documents written per bulk database call"
+    )
+
+    # EXPORT CONFIG
+    EXPORT_BATCH_SIZE: Optional[int] = Field(
+        default=1000, alias="EXPORT_BATCH_SIZE", description="Number of documents fetched and streamed per export batch"
+    )
+
+    # AUTH CACHE CONFIG
+    USE_AUTH_CACHE: Optional[bool] = Field(
+        default=True, alias="USE_AUTH_CACHE", description="Enable/Disable the cache of token validations and permission checks"
+    )
+    AUTH_CACHE_MAXSIZE: Optional[int] = Field(
+        default=10000, alias="AUTH_CACHE_MAXSIZE", description="Maximum number of cached auth service decisions"
+    )
+    AUTH_CACHE_TTL: Optional[int] = Field(
+        default=15,
+        alias="AUTH_CACHE_TTL",
+        description="Lifetime in seconds of a cached auth service decision, capped by the token expiry",
+    )
+
+    # HTTP CLIENT CONFIG
+    HTTP_CLIENT_MAX_CONNECTIONS: Optional[int] = Field(
+        default=100, alias="HTTP_CLIENT_MAX_CONNECTIONS", description="Maximum number of outbound connections"
+    )
+    HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS: Optional[int] = Field(
+        default=20, alias="HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS", description="Maximum number of idle keep-alive connections"
+    )
+    HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST: Optional[int] = Field(
+        default=50, alias="HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST", description="Maximum number of concurrent requests per host"
+    )
+    HTTP_CLIENT_KEEPALIVE_EXPIRY: Optional[float] = Field(
+        default=30.0, alias="HTTP_CLIENT_KEEPALIVE_EXPIRY", description="Seconds an idle keep-alive connection is kept"
+    )
+    HTTP_CLIENT_TIMEOUT: Optional[float] = Field(
+        default=5.0, alias="HTTP_CLIENT_TIMEOUT", description="Read/write/pool timeout in seconds of outbound calls"
+    )
+    HTTP_CLIENT_CONNECT_TIMEOUT: Optional[float] = Field(
+        default=2.0, alias="HTTP_CLIENT_CONNECT_TIMEOUT", description="Connect timeout in seconds of outbound calls"
+    )
+    HTTP_CLIENT_HTTP2: Optional[bool] = Field(
+        default=True, alias="HTTP_CLIENT_HTTP2", description="Use HTTP/2 for outbound calls when the h2 package is installed"
+    )
 
     # APP MODEL NAME
     ROLE_PRESTATAIRE: Optional[str] = Field(default="prestataire", alias="ROLE_PRESTATAIRE")
@@ -45,6 +267,30 @@ class ApiKeyHubSettings(BaseSettings):
     # DATABASE CONFIG
     MONGO_DB: str = Field(..., alias="MONGO_DB", description="Name of the config")
     MONGODB_URI: str = Field(..., alias="MONGODB_URI", description="URI of the MongoDB config")
+    MONGO_MAX_POOL_SIZE: Optional[int] = Field(
+        default=None, alias="MONGO_MAX_POOL_SIZE", description="Maximum number of connections per server (driver default: 100)"
+    )
+    MONGO_MIN_POOL_SIZE: Optional[int] = Field(
+        default=None, alias="MONGO_MIN_POOL_SIZE", description="Number of connections kept open per server (driver default: 0)"
+    )
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: Optional[int] = Field(
+        default=None, alias="MONGO_WAIT_QUEUE_TIMEOUT_MS", description="Maximum wait in ms for a free pooled connection"
+    )
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: Optional[int] = Field(
+        default=None,
+        alias="MONGO_SERVER_SELECTION_TIMEOUT_MS",
+        description="Maximum wait in ms for a suitable server (driver default: 30000)",
+    )
+    MONGO_COMPRESSORS: Optional[str] = Field(
+        default=None,
+        alias="MONGO_COMPRESSORS",
+        description="Wire compressors by preference, e.g. zstd,snappy,zlib (zstd and snappy need zstandard and python-snappy)",
+    )
+    MONGO_READ_PREFERENCES: dict[str, ReadPreferenceMode] = Field(
+        default_factory=dict,
+        alias="MONGO_READ_PREFERENCES",
+        description='Read preference per read operation ("verify", "all"), verdicts read off the primary are not cached',
+    )
 
     # VALIDATE TOKEN AND CHECK ACCESS ENDPOINT
     API_AUTH_URL_BASE: str = Field(
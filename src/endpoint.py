@@ -1,33 +1,93 @@
+import json
+import time
 from datetime import datetime, timezone
 from typing import Literal, Optional
 
 from beanie import PydanticObjectId
-from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Request, status
-from fastapi_pagination.ext.beanie import paginate
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from fastapi_pagination.ext.motor import paginate
 from pymongo import ASCENDING, DESCENDING
-from slugify import slugify
 
-from src.common.depends.permission import VerifyAccessToken, CheckAccessAllow
 from src.common.helpers.exception import CustomHTTPException
 from src.common.helpers.pagination import customize_page
 from src.common.helpers.utils import SortEnum
-from src.common.services.trailhub_client import send_event
 from src.config import settings
-from src.models import APIKeyDocument, APIKeyFilterSchema
+from src.models import (
+    APIKeyBatchVerifySchema,
+    APIKeyBulkCreateSchema,
+    APIKeyBulkSelectionSchema,
+    APIKeyDocument,
+    APIKeyFilterSchema,
+    APIKeyLimitsSchema,
+    APIKeyOutSchema,
+    APIKeyOwnerSchema,
+    APIKeyVerifyRecord,
+    CursorPage,
+)
+from src.services import (
+    activity_log_shipper,
+    bulk_delete,
+    bulk_update,
+    issue_api_keys,
+    rate_limiter,
+    key_rehasher,
+    RateLimitPolicy,
+    usage_tracker,
+)
 from src.shared import (
-    API_TRAILHUB_ENDPOINT,
     APIKeyErrorCode,
     CHECK_ACCESS_ALLOW_ENDPOINT,
     CHECK_VALIDATE_ACCESS_TOKEN_ENDPOINT,
+    CheckAccessAllow,
+    EXPORT_MEDIA_TYPES,
     find_document,
-    generate_api_key,
-    parse_api_key,
-    verify_api_key,
+    HistogramSeries,
+    hmac_duration,
+    key_codec,
+    mongo_lookup_duration,
+    ownership_scope,
+    ParsedKey,
+    paginate_by_cursor,
+    read_router,
+    stream_export,
+    verification_cache,
+    verifications,
+    VerifyAccessToken,
 )
 
 router = APIRouter(prefix="/keys", tags=["API KEYS"])
 
 
+def _render_keys(docs: list[dict]) -> list[dict]:
+    return [APIKeyOutSchema.render(doc) for doc in docs]
+
+
+async def _reject_update(id: PydanticObjectId) -> None:
+    """
+    Explains why a scoped update matched nothing: the key does not exist or belongs to someone else
+    """
+
+    await find_document(
+        document=APIKeyDocument, query={"_id": id}, status_code=status.HTTP_400_BAD_REQUEST, projection={"_id": True}
+    )
+    raise CustomHTTPException(
+        code_error=APIKeyErrorCode.CANNOT_ACCESS_RESOURCE,
+        message_error="You cannot access this resource",
+        status_code=status.HTTP_403_FORBIDDEN,
+    )
+
+
+def _invalidate_selection(ids: Optional[list]) -> None:
+    # Une sélection par filtre ne donne pas les IDs touchés : vider le cache et les limites plutôt que de relire les documents
+    if ids is not None:
+        verification_cache.invalidate(*ids)
+        rate_limiter.forget(*ids)
+    else:
+        verification_cache.clear()
+        rate_limiter.clear()
+
+
 @router.post(
     "",
     dependencies=[
@@ -41,36 +101,126 @@ router = APIRouter(prefix="/keys", tags=["API KEYS"])
 )
 async def create(
     request: Request,
-    background: BackgroundTasks,
     token_info: dict = Depends(VerifyAccessToken(url=CHECK_VALIDATE_ACCESS_TOKEN_ENDPOINT)),
 ):
     user_id = token_info.get("user_info", {}).get("_id")
 
-    raw_api_key, hashed_key = generate_api_key(user_id)
-    new_doc = await APIKeyDocument(user_id=user_id, api_key=raw_api_key, hashed_key=hashed_key).create()
+    new_doc = await APIKeyDocument.issue(user_id).create()
 
     if settings.USE_TRACK_ACTIVITY_LOGS:
-        await send_event(
-            request=request,
-            bg=background,
-            oauth_url=CHECK_VALIDATE_ACCESS_TOKEN_ENDPOINT,
-            trailhub_url=API_TRAILHUB_ENDPOINT,
-            source=settings.APP_NAME.lower(),
-            message="has created new api key",
-            user_id=str(user_id),
-        )
+        activity_log_shipper.enqueue(request=request, message="has created new api key", user_id=str(user_id))
 
     return new_doc
 
 
+@router.post(
+    "/bulk",
+    dependencies=[
+        Depends(CheckAccessAllow(url=CHECK_ACCESS_ALLOW_ENDPOINT, permissions={"apikey:can-make-apikey"})),
+    ],
+    response_class=StreamingResponse,
+    summary="Create API Keys in bulk, streamed as NDJSON (Soft Create)",
+    status_code=status.HTTP_201_CREATED,
+)
+async def bulk_create(
+    request: Request,
+    payload: APIKeyBulkCreateSchema = Body(...),
+    token_info: dict = Depends(VerifyAccessToken(url=CHECK_VALIDATE_ACCESS_TOKEN_ENDPOINT)),
+):
+    user_info = token_info.get("user_info", {})
+    user_id = user_info.get("_id")
+
+    # Comme pour les autres écritures en masse : seul un super admin émet des clés pour d'autres utilisateurs
+    if (scope := ownership_scope(user_info)) and any(str(owner) != str(scope["user_id"]) for owner in payload.user_ids):
+        raise CustomHTTPException(
+            code_error=APIKeyErrorCode.CANNOT_ACCESS_RESOURCE,
+            message_error="You cannot create API keys for other users",
+            status_code=status.HTTP_403_FORBIDDEN,
+        )
+
+    async def content():
+        created = 0
+        try:
+            async for item in issue_api_keys(payload.user_ids, chunk_size=settings.BULK_CHUNK_SIZE):
+                created += "error" not in item
+                yield json.dumps(item) + "\n"
+        finally:
+            # Journaliser aussi les blocs déjà insérés quand le client se déconnecte en cours de flux
+            if settings.USE_TRACK_ACTIVITY_LOGS:
+                message = f"has created {created} api keys in bulk"
+                activity_log_shipper.enqueue(request=request, message=message, user_id=str(user_id))
+
+    return StreamingResponse(content(), media_type="application/x-ndjson", status_code=status.HTTP_201_CREATED)
+
+
+@router.put(
+    "/bulk/action",
+    dependencies=[
+        Depends(CheckAccessAllow(url=CHECK_ACCESS_ALLOW_ENDPOINT, permissions={"apikey:can-activate-or-deactivate-apikey"})),
+    ],
+    summary="Activate or deactivate API Keys in bulk by IDs or filter (Soft Update)",
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def bulk_activate_or_deactivate(
+    request: Request,
+    action: Literal["activate", "deactivate"],
+    payload: APIKeyBulkSelectionSchema = Body(...),
+    token_info: dict = Depends(VerifyAccessToken(url=CHECK_VALIDATE_ACCESS_TOKEN_ENDPOINT)),
+):
+    user_info = token_info.get("user_info", {})
+    search = payload.filter.build_search() if payload.filter else {}
+
+    is_active = True if action == "activate" else False
+    result = await bulk_update(
+        ids=payload.ids,
+        search=search,
+        scope=ownership_scope(user_info),
+        update={"$set": {"is_active": is_active, "updated_at": datetime.now(timezone.utc)}},
+        chunk_size=settings.BULK_CHUNK_SIZE,
+    )
+    _invalidate_selection(payload.ids)
+
+    if settings.USE_TRACK_ACTIVITY_LOGS:
+        message = f"has {action} {result['modified']} api keys in bulk"
+        activity_log_shipper.enqueue(request=request, message=message, user_id=str(user_info.get("_id")))
+
+    return result
+
+
+@router.delete(
+    "/bulk",
+    dependencies=[
+        Depends(CheckAccessAllow(url=CHECK_ACCESS_ALLOW_ENDPOINT, permissions={"apikey:can-delete-apikey"})),
+    ],
+    summary="Delete API Keys in bulk by IDs or filter (Soft Delete)",
+    status_code=status.HTTP_200_OK,
+)
+async def bulk_remove(
+    request: Request,
+    payload: APIKeyBulkSelectionSchema = Body(...),
+    token_info: dict = Depends(VerifyAccessToken(url=CHECK_VALIDATE_ACCESS_TOKEN_ENDPOINT)),
+):
+    user_info = token_info.get("user_info", {})
+    search = payload.filter.build_search() if payload.filter else {}
+
+    result = await bulk_delete(
+        ids=payload.ids, search=search, scope=ownership_scope(user_info), chunk_size=settings.BULK_CHUNK_SIZE
+    )
+    _invalidate_selection(payload.ids)
+
+    if settings.USE_TRACK_ACTIVITY_LOGS:
+        message = f"has delete {result['deleted']} api keys in bulk"
+        activity_log_shipper.enqueue(request=request, message=message, user_id=str(user_info.get("_id")))
+
+    return result
+
+
 @router.get(
     "",
     dependencies=[
         Depends(CheckAccessAllow(url=CHECK_ACCESS_ALLOW_ENDPOINT, permissions={"apikey:can-read-apikey"})),
     ],
-    response_model=customize_page(APIKeyDocument),
-    response_model_by_alias=True,
-    response_model_exclude={"hashed_key"},
+    response_model=customize_page(APIKeyOutSchema),
     summary="Get all API Keys (Soft Read)",
     status_code=status.HTTP_200_OK,
 )
@@ -78,22 +228,70 @@ async def all(
     query: APIKeyFilterSchema = Depends(APIKeyFilterSchema),
     sort: Optional[SortEnum] = Query(default=SortEnum.DESC, description="Sort order"),
 ):
-    search = query.model_dump(exclude_none=True)
-
-    if query.user_id:
-        search["user_id"] = query.user_id
-    if query.is_active:
-        search["is_active"] = query.is_active
-    if query.last_used_at:
-        search["last_used_at"] = query.last_used_at
-    if query.expires_at:
-        search["expires_at"] = query.expires_at
-    if query.created_at:
-        search["created_at"] = query.created_at
+    search = query.build_search()
+
+    sort_ = DESCENDING if sort == SortEnum.DESC else ASCENDING
+    # Lecture seule : la collection suit la préférence de lecture de "all" (secondaires possibles)
+    page = await paginate(
+        read_router.collection(APIKeyDocument, "all"),
+        search,
+        sort=[("created_at", sort_)],
+        projection={"hashed_key": False},
+        transformer=_render_keys,
+    )
+    # La page est validée une seule fois, la réponse n'est pas re-validée par FastAPI
+    return ORJSONResponse(page.model_dump(by_alias=True))
+
 
+@router.get(
+    "/cursor",
+    dependencies=[
+        Depends(CheckAccessAllow(url=CHECK_ACCESS_ALLOW_ENDPOINT, permissions={"apikey:can-read-apikey"})),
+    ],
+    response_model=CursorPage[APIKeyOutSchema],
+    summary="Get all API Keys with cursor pagination (Soft Read)",
+    status_code=status.HTTP_200_OK,
+)
+async def all_by_cursor(
+    query: APIKeyFilterSchema = Depends(APIKeyFilterSchema),
+    sort: Optional[SortEnum] = Query(default=SortEnum.DESC, description="Sort order"),
+    cursor: Optional[str] = Query(default=None, description="Opaque cursor returned as next_page or previous_page"),
+    size: int = Query(default=50, ge=1, le=100, description="Page size"),
+):
     sort_ = DESCENDING if sort == SortEnum.DESC else ASCENDING
-    apikeys_docs = APIKeyDocument.find(search, sort=[("created_at", sort_)])
-    return await paginate(apikeys_docs)
+    page = await paginate_by_cursor(document=APIKeyDocument, query=query.build_search(), sort=sort_, size=size, cursor=cursor)
+    return ORJSONResponse({**page, "items": _render_keys(page["items"])})
+
+
+@router.get(
+    "/export",
+    dependencies=[
+        Depends(CheckAccessAllow(url=CHECK_ACCESS_ALLOW_ENDPOINT, permissions={"apikey:can-read-apikey"})),
+    ],
+    response_class=StreamingResponse,
+    summary="Export API Keys metadata as NDJSON or CSV (Soft Read)",
+    status_code=status.HTTP_200_OK,
+)
+async def export(
+    request: Request,
+    query: APIKeyFilterSchema = Depends(APIKeyFilterSchema),
+    sort: Optional[SortEnum] = Query(default=SortEnum.DESC, description="Sort order"),
+    export_format: Literal["ndjson", "csv"] = Query(default="ndjson", alias="format", description="Export format"),
+):
+    sort_ = DESCENDING if sort == SortEnum.DESC else ASCENDING
+    content = stream_export(
+        request=request,
+        collection=APIKeyDocument.get_motor_collection(),
+        query=query.build_search(),
+        sort=[("created_at", sort_), ("_id", sort_)],
+        export_format=export_format,
+        batch_size=settings.EXPORT_BATCH_SIZE,
+    )
+    return StreamingResponse(
+        content,
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="apikeys.{export_format}"'},
+    )
 
 
 @router.get(
@@ -101,14 +299,15 @@ async def all(
     dependencies=[
         Depends(CheckAccessAllow(url=CHECK_ACCESS_ALLOW_ENDPOINT, permissions={"apikey:can-read-apikey"})),
     ],
-    response_model=APIKeyDocument,
-    response_model_by_alias=True,
-    response_model_exclude={"hashed_key"},
+    response_model=APIKeyOutSchema,
     summary="Get API Key by ID (Soft Read)",
     status_code=status.HTTP_200_OK,
 )
 async def read(id: PydanticObjectId):
-    return await find_document(document=APIKeyDocument, query={"_id": id}, status_code=status.HTTP_404_NOT_FOUND)
+    doc = await find_document(
+        document=APIKeyDocument, query={"_id": id}, status_code=status.HTTP_404_NOT_FOUND, projection={"hashed_key": False}
+    )
+    return ORJSONResponse(APIKeyOutSchema.render(doc))
 
 
 @router.put(
@@ -124,32 +323,26 @@ async def read(id: PydanticObjectId):
 )
 async def regenerate_apikey(
     request: Request,
-    background: BackgroundTasks,
     id: PydanticObjectId,
     token_info: dict = Depends(VerifyAccessToken(url=CHECK_VALIDATE_ACCESS_TOKEN_ENDPOINT)),
 ):
-    doc = await find_document(document=APIKeyDocument, query={"_id": id}, status_code=status.HTTP_400_BAD_REQUEST)
-
     user_info = token_info.get("user_info", {})
     user_id = user_info.get("_id")
-    if user_id != str(doc.user_id) and not user_info.get("role", {}).get("slug") != slugify(settings.ROLE_SUPER_ADMIN):
-        raise CustomHTTPException(
-            code_error=APIKeyErrorCode.CANNOT_ACCESS_RESOURCE,
-            message_error="You cannot access this resource",
-            status_code=status.HTTP_403_FORBIDDEN,
-        )
+    scope = ownership_scope(user_info)
+
+    # La nouvelle clé embarque l'ID du propriétaire : un super admin doit d'abord le lire
+    if (owner_id := scope.get("user_id")) is None:
+        owner = await APIKeyDocument.find_one({"_id": id}, projection_model=APIKeyOwnerSchema)
+        owner_id = owner.user_id if owner is not None else None
+
+    if owner_id is None or (new_doc := await APIKeyDocument.regenerate_api_key(id=id, user_id=owner_id, scope=scope)) is None:
+        await _reject_update(id)
+    verification_cache.invalidate(id)
+
     if settings.USE_TRACK_ACTIVITY_LOGS:
-        await send_event(
-            request=request,
-            bg=background,
-            oauth_url=CHECK_VALIDATE_ACCESS_TOKEN_ENDPOINT,
-            trailhub_url=API_TRAILHUB_ENDPOINT,
-            source=settings.APP_NAME.lower(),
-            message=f"has regenerate api key {str(id)}",
-            user_id=str(user_id),
-        )
+        activity_log_shipper.enqueue(request=request, message=f"has regenerate api key {str(id)}", user_id=str(user_id))
 
-    return await doc.regenerate_api_key(id=id, user_id=doc.user_id)
+    return new_doc
 
 
 @router.put(
@@ -165,36 +358,53 @@ async def regenerate_apikey(
 )
 async def activate_or_deactivate_apikey(
     request: Request,
-    background: BackgroundTasks,
     id: PydanticObjectId,
     action: Literal["activate", "deactivate"],
     token_info: dict = Depends(VerifyAccessToken(url=CHECK_VALIDATE_ACCESS_TOKEN_ENDPOINT)),
 ):
-    doc = await find_document(document=APIKeyDocument, query={"_id": id}, status_code=status.HTTP_400_BAD_REQUEST)
+    user_info = token_info.get("user_info", {})
+    user_id = user_info.get("_id")
+
+    is_active = True if action == "activate" else False
+    if (updated_doc := await APIKeyDocument.set_active(id=id, is_active=is_active, scope=ownership_scope(user_info))) is None:
+        await _reject_update(id)
+    verification_cache.invalidate(id)
 
+    if settings.USE_TRACK_ACTIVITY_LOGS:
+        activity_log_shipper.enqueue(request=request, message=f"has {action} api key {str(id)}", user_id=str(user_id))
+
+    return updated_doc
+
+
+@router.put(
+    "/{id}/limits",
+    dependencies=[
+        Depends(CheckAccessAllow(url=CHECK_ACCESS_ALLOW_ENDPOINT, permissions={"apikey:can-limit-apikey"})),
+    ],
+    response_model=APIKeyDocument,
+    response_model_by_alias=True,
+    response_model_exclude={"hashed_key"},
+    summary="Set the rate limit and daily quota of an API Key by ID (Soft Update)",
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def set_apikey_limits(
+    request: Request,
+    id: PydanticObjectId,
+    limits: APIKeyLimitsSchema = Body(...),
+    token_info: dict = Depends(VerifyAccessToken(url=CHECK_VALIDATE_ACCESS_TOKEN_ENDPOINT)),
+):
     user_info = token_info.get("user_info", {})
     user_id = user_info.get("_id")
 
-    if user_id != str(doc.user_id) and not user_info.get("role", {}).get("slug") != slugify(settings.ROLE_SUPER_ADMIN):
-        raise CustomHTTPException(
-            code_error=APIKeyErrorCode.CANNOT_ACCESS_RESOURCE,
-            message_error="You cannot access this resource",
-            status_code=status.HTTP_403_FORBIDDEN,
-        )
+    if (updated_doc := await APIKeyDocument.set_limits(id=id, limits=limits, scope=ownership_scope(user_info))) is None:
+        await _reject_update(id)
+    verification_cache.invalidate(id)
+    rate_limiter.forget(id)
 
     if settings.USE_TRACK_ACTIVITY_LOGS:
-        await send_event(
-            request=request,
-            bg=background,
-            oauth_url=CHECK_VALIDATE_ACCESS_TOKEN_ENDPOINT,
-            trailhub_url=API_TRAILHUB_ENDPOINT,
-            source=settings.APP_NAME.lower(),
-            message=f"has {action} api key {str(id)}",
-            user_id=str(user_id),
-        )
+        activity_log_shipper.enqueue(request=request, message=f"has set the limits of api key {str(id)}", user_id=str(user_id))
 
-    is_active = True if action == "activate" else False
-    return await doc.set({"is_active": is_active, "updated_at": datetime.now(timezone.utc)})
+    return updated_doc
 
 
 @router.delete(
@@ -207,52 +417,217 @@ async def activate_or_deactivate_apikey(
 )
 async def remove(
     request: Request,
-    background: BackgroundTasks,
     id: PydanticObjectId,
     token_info: dict = Depends(VerifyAccessToken(url=CHECK_VALIDATE_ACCESS_TOKEN_ENDPOINT)),
 ):
     user_id = token_info.get("user_info", {}).get("_id")
 
     if settings.USE_TRACK_ACTIVITY_LOGS:
-        await send_event(
-            request=request,
-            bg=background,
-            oauth_url=CHECK_VALIDATE_ACCESS_TOKEN_ENDPOINT,
-            trailhub_url=API_TRAILHUB_ENDPOINT,
-            source=settings.APP_NAME.lower(),
-            message=f"has delete api key {str(id)}",
-            user_id=str(user_id),
-        )
+        activity_log_shipper.enqueue(request=request, message=f"has delete api key {str(id)}", user_id=str(user_id))
 
     await APIKeyDocument.find_one({"_id": id}).delete()
+    verification_cache.invalidate(id)
+    rate_limiter.forget(id)
 
 
 router.prefix = ""
 router.tags = ["VERIFY API KEYS"]
 
+# Séries de métriques liées une fois pour toutes : aucun label n'est construit par requête
+_VERIFIED, _REJECTED, _RATE_LIMITED = (verifications.labels(result) for result in ("verified", "rejected", "rate_limited"))
+_LOOKUP_TIMER = mongo_lookup_duration.labels("verify")
+_BATCH_LOOKUP_TIMER = mongo_lookup_duration.labels("verify_batch")
+_LEGACY_LOOKUP_TIMER = mongo_lookup_duration.labels("legacy")
+_HMAC_TIMER = hmac_duration.labels()
+
+
+def _expiry_timestamp(doc: APIKeyVerifyRecord) -> Optional[float]:
+    if doc.expires_at is None:
+        return None
+
+    # Les dates renvoyées par MongoDB sont naïves mais stockées en UTC
+    expires_at = doc.expires_at if doc.expires_at.tzinfo else doc.expires_at.replace(tzinfo=timezone.utc)
+    return expires_at.timestamp()
+
+
+def _verdict(doc: APIKeyVerifyRecord, user_id: str) -> dict:
+    expires_at = _expiry_timestamp(doc)
+    not_expired = expires_at is None or expires_at > datetime.now(timezone.utc).timestamp()
+    return {"verified": bool(doc.is_active) and not_expired and str(doc.user_id) == str(user_id)}
+
+
+def _rejected() -> dict:
+    _REJECTED.inc()
+    return {"verified": False}
+
+
+def _track_usage(result: dict, doc_id: str) -> dict:
+    if not result["verified"]:
+        _REJECTED.inc()
+    elif not result.get("allowed", True):
+        _RATE_LIMITED.inc()
+    else:
+        _VERIFIED.inc()
+        usage_tracker.record(doc_id)
+    return result
+
+
+def _check_limits(
+    result: dict, doc_id: str, policy: Optional[RateLimitPolicy], quota: Optional[tuple[Optional[str], int]] = None
+) -> tuple[dict, dict[str, str]]:
+    if not (settings.USE_RATE_LIMITING and result["verified"] and policy is not None):
+        return _track_usage(result, doc_id), {}
+
+    # Une clé vérifiée mais hors limites reste `verified`, `allowed` porte la décision
+    verdict = rate_limiter.check(doc_id, policy, quota=quota)
+    return _track_usage({**result, "allowed": verdict.allowed}, doc_id), verdict.headers
+
+
+def _apply_limits(
+    response: Response,
+    result: dict,
+    doc_id: str,
+    policy: Optional[RateLimitPolicy],
+    quota: Optional[tuple[Optional[str], int]] = None,
+) -> dict:
+    result, headers = _check_limits(result, doc_id, policy, quota)
+    response.headers.update(headers)
+    return result
+
+
+def _limit_in_batch(
+    result: dict, doc_id: str, policy: Optional[RateLimitPolicy], quota: Optional[tuple[Optional[str], int]] = None
+) -> dict:
+    # Une seule réponse pour tout le lot : le délai d'attente passe de l'en-tête au résultat de chaque clé
+    result, headers = _check_limits(result, doc_id, policy, quota)
+    if "Retry-After" in headers:
+        result["retry_after"] = int(headers["Retry-After"])
+    return result
+
+
+def _cache_verdict(apikey: str, result: dict, doc: APIKeyVerifyRecord, policy: Optional[RateLimitPolicy]) -> None:
+    # Un secondaire en retard peut relire une clé déjà révoquée : seul un verdict lu sur le primaire est mis en cache
+    if read_router.reads_primary("verify"):
+        verification_cache.set(apikey, result, doc_id=doc.id, policy=policy, expires_at=_expiry_timestamp(doc))
+
+
+async def _find_legacy(hashed_keys: list[str]) -> list[APIKeyVerifyRecord]:
+    # Clés émises avant le key_id : recherche par l'empreinte calculée avec SECRET_KEY_HASHED, limitée aux documents sans key_id
+    if not settings.USE_HASHED_KEY_FALLBACK or not hashed_keys:
+        return []
+
+    return await _find_verify({"hashed_key": {"$in": hashed_keys}, "key_id": None}, _LEGACY_LOOKUP_TIMER)
+
+
+async def _find_verify(query: dict, timer: HistogramSeries) -> list[APIKeyVerifyRecord]:
+    """
+    Projected lookup of the verification paths, on the collection bound to the "verify" read preference
+    """
+
+    start = time.perf_counter()
+    cursor = read_router.collection(APIKeyDocument, "verify").find(query, APIKeyVerifyRecord.PROJECTION)
+    docs = [APIKeyVerifyRecord(doc) async for doc in cursor]
+    timer.since(start)
+    return docs
+
+
+def _resolve(doc: APIKeyVerifyRecord, parsed: ParsedKey) -> dict:
+    """
+    Verdict of a presented key against the document it resolved to, queuing its migration to the active secret
+    """
+
+    start = time.perf_counter()
+    matches = key_codec.matches(parsed.raw_key, doc.secret_id, doc.hashed_key)
+    _HMAC_TIMER.since(start)
+    if not matches:
+        return {"verified": False}
+
+    result = _verdict(doc, parsed.user_id)
+    if result["verified"] and key_rehasher.is_outdated(doc.key_id, doc.secret_id):
+        key_rehasher.record(str(doc.id), parsed.raw_key, key_id=parsed.key_id, secret_id=doc.secret_id)
+    return result
+
 
 @router.get(
     "/verify-api-key",
     summary="Verify API Key (Soft Read)",
     status_code=status.HTTP_200_OK,
 )
-async def verify_apikey(apikey: str = Header(..., description="API Key to verify", alias="X-API-Key")):
+async def verify_apikey(response: Response, apikey: str = Header(..., description="API Key to verify", alias="X-API-Key")):
+    if (cached := verification_cache.get(apikey)) is not None:
+        return _apply_limits(response, *cached)
+
     try:
-        # Valider format et extraire user_id
-        is_valid, _, user_id = parse_api_key(apikey)
-        if not is_valid:
-            return {"verified": False}
+        # Valider format et extraire user_id et key_id en une passe
+        if (parsed := key_codec.parse(apikey)) is None:
+            return _rejected()
+
+        # Rechercher le document par key_id (index unique), l'empreinte est vérifiée avec le secret du document
+        start = time.perf_counter()
+        collection = read_router.collection(APIKeyDocument, "verify")
+        doc = await collection.find_one({"key_id": parsed.key_id}, APIKeyVerifyRecord.PROJECTION)
+        doc = APIKeyVerifyRecord(doc) if doc is not None else None
+        _LOOKUP_TIMER.since(start)
+        if doc is None and (legacy := await _find_legacy([key_codec.hash(parsed.raw_key, key_codec.legacy_id)])):
+            doc = legacy[0]
+        if doc is None:
+            return _rejected()
+
+        result = _resolve(doc, parsed)
 
-        # Vérifier existence du document
-        if (doc := await APIKeyDocument.find_one({"user_id": user_id})) is None:
-            return {"verified": False}
+    except HTTPException:
+        return _rejected()
 
-        # Vérifier la clé fournie
-        is_valid, extracted_user_id = verify_api_key(apikey, doc.hashed_key)
+    policy = RateLimitPolicy.from_document(doc)
+    _cache_verdict(apikey, result, doc, policy)
 
-        result = {"verified": is_valid and str(doc.user_id) == str(extracted_user_id)}
+    return _apply_limits(response, result, str(doc.id), policy, quota=(doc.quota_day, doc.quota_used))
 
-    except HTTPException:
-        return {"verified": False}
 
-    return result
+@router.post(
+    "/verify-api-keys",
+    summary="Verify a batch of API Keys (Soft Read)",
+    status_code=status.HTTP_200_OK,
+)
+async def verify_apikeys(payload: APIKeyBatchVerifySchema = Body(...)):
+    results: list[Optional[dict]] = []
+    for apikey in payload.api_keys:
+        cached = verification_cache.get(apikey)
+        results.append(_limit_in_batch(*cached) if cached is not None else None)
+
+    # Valider format et regrouper les clés absentes du cache par key_id
+    pending: dict[str, list[tuple[int, ParsedKey]]] = {}
+    for index, apikey in enumerate(payload.api_keys):
+        if results[index] is not None:
+            continue
+
+        if (parsed := key_codec.parse(apikey)) is None:
+            results[index] = _rejected()
+            continue
+
+        pending.setdefault(parsed.key_id, []).append((index, parsed))
+
+    def _resolve_all(doc: APIKeyVerifyRecord, entries: list[tuple[int, ParsedKey]]) -> None:
+        policy = RateLimitPolicy.from_document(doc)
+        for index, parsed in entries:
+            result = _resolve(doc, parsed)
+            _cache_verdict(payload.api_keys[index], result, doc, policy)
+            results[index] = _limit_in_batch(result, str(doc.id), policy, quota=(doc.quota_day, doc.quota_used))
+
+    # Résoudre tous les key_id en une seule requête, puis les clés sans key_id par leur empreinte
+    if pending:
+        for doc in await _find_verify({"key_id": {"$in": list(pending)}}, _BATCH_LOOKUP_TIMER):
+            _resolve_all(doc, pending.pop(doc.key_id, []))
+
+    legacy: dict[str, list[tuple[int, ParsedKey]]] = {}
+    for entries in pending.values():
+        for index, parsed in entries:
+            legacy.setdefault(key_codec.hash(parsed.raw_key, key_codec.legacy_id), []).append((index, parsed))
+    for doc in await _find_legacy(list(legacy)):
+        _resolve_all(doc, legacy.pop(doc.hashed_key, []))
+
+    for entries in legacy.values():
+        for index, _ in entries:
+            results[index] = _rejected()
+
+    return results
@@ -1,32 +1,86 @@
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
+from fastapi.responses import ORJSONResponse, PlainTextResponse, RedirectResponse
 from fastapi_pagination import add_pagination
 
 from src import models
 from src.common.config import shutdown_db_client, startup_db_client
 from src.config import settings
 from src.common.helpers.exception import setup_exception_handlers
+from src.services import (
+    activity_log_shipper,
+    cache_invalidation_watcher,
+    expiry_sweeper,
+    key_rehasher,
+    rate_limiter,
+    usage_tracker,
+)
+from src.shared import (
+    auth_cache,
+    client_uri,
+    http_client,
+    METRICS_CONTENT_TYPE,
+    metrics_registry,
+    metrics_snapshots,
+    MetricsMiddleware,
+    StatsGauges,
+    verification_cache,
+)
 from .endpoint import router as apikey_router
 
+STATS_SOURCES = {
+    "verification_cache": verification_cache.stats,
+    "auth_cache": auth_cache.stats,
+    "activity_logs": activity_log_shipper.stats,
+    "usage_tracker": usage_tracker.stats,
+    "expiry_sweeper": expiry_sweeper.stats,
+    "rate_limiter": rate_limiter.stats,
+    "change_stream": cache_invalidation_watcher.stats,
+    "key_rehasher": key_rehasher.stats,
+}
+metrics_registry.register(StatsGauges("apikey", STATS_SOURCES))
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await startup_db_client(
         app=app,
-        mongodb_uri=settings.MONGODB_URI,
+        mongodb_uri=client_uri(settings.MONGODB_URI),
         database_name=settings.MONGO_DB,
         document_models=models.document_models,
     )
+    await http_client.start()
+    await key_rehasher.start()
+    if settings.USE_USAGE_TRACKING:
+        await usage_tracker.start()
+    if settings.USE_TRACK_ACTIVITY_LOGS:
+        await activity_log_shipper.start()
+    if settings.USE_RATE_LIMITING:
+        await rate_limiter.start()
+    if settings.USE_CHANGE_STREAM_INVALIDATION:
+        await cache_invalidation_watcher.start()
+    if settings.APIKEY_EXPIRY_MODE == "sweeper":
+        await expiry_sweeper.start()
+    if settings.USE_METRICS:
+        await metrics_snapshots.start()
 
     yield
 
+    await metrics_snapshots.stop()
+    await expiry_sweeper.stop()
+    await cache_invalidation_watcher.stop()
+    await rate_limiter.stop()
+    await key_rehasher.stop()
+    await activity_log_shipper.stop()
+    await usage_tracker.stop()
+    await http_client.close()
     await shutdown_db_client(app=app)
 
 
 app: FastAPI = FastAPI(
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     title=settings.APP_TITLE,
     description="A simple API key manager for developers and their projects.",
     docs_url="/apikeys/docs",
@@ -45,6 +99,19 @@ async def ping():
     return {"message": "pong !"}
 
 
+@app.get("/apikeys/@stats", tags=["DEFAULT"], summary="Get in-process cache statistics")
+async def stats():
+    return {name: source() for name, source in STATS_SOURCES.items()}
+
+
+@app.get("/apikeys/@metrics", tags=["DEFAULT"], summary="Get Prometheus metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(await metrics_snapshots.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+# Time every request by route template for the Prometheus histograms
+app.add_middleware(MetricsMiddleware)
+
 # Add the API key router to the app
 app.include_router(apikey_router)
 
@@ -1,4 +1,15 @@
 from .model import APIKeyDocument
-from .schema import APIKeyBaseSchema, APIKeyFilterSchema  # noqa: F401
+from .schema import (  # noqa: F401
+    APIKeyBaseSchema,
+    APIKeyBatchVerifySchema,
+    APIKeyBulkCreateSchema,
+    APIKeyBulkSelectionSchema,
+    APIKeyFilterSchema,
+    APIKeyLimitsSchema,
+    APIKeyOutSchema,
+    APIKeyOwnerSchema,
+    APIKeyVerifyRecord,
+    CursorPage,
+)
 
 document_models = [APIKeyDocument]
@@ -0,0 +1,145 @@
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from pymongo import ASCENDING, UpdateOne
+
+from src.config import settings
+from src.shared import key_codec
+from .model import API_KEY_USER_ID_INDEX_NAME, HASHED_KEY_INDEX_NAME, KEY_ID_INDEX_NAME
+
+
+def get_apikey_collection(client: AsyncIOMotorClient) -> AsyncIOMotorCollection:
+    return client[settings.MONGO_DB][settings.APIKEY_HUB_COLLECTION.split(".")[1]]
+
+
+async def ensure_hashed_key_index(collection: AsyncIOMotorCollection) -> dict:
+    """
+    Builds the unique `hashed_key` index on an existing collection.
+
+    Documents without a `hashed_key` or sharing the same one would make the
+    build fail half-way, so they are reported first and nothing is changed.
+    """
+
+    missing = await collection.count_documents({"hashed_key": {"$in": [None, ""]}})
+    duplicates = await collection.aggregate(
+        [
+            {"$group": {"_id": "$hashed_key", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+        ],
+        allowDiskUse=True,
+    ).to_list(length=None)
+
+    if missing or duplicates:
+        return {
+            "created": False,
+            "missing_hashed_key": missing,
+            "duplicated_ids": [[str(_id) for _id in dup["ids"]] for dup in duplicates],
+        }
+
+    await collection.create_index([("hashed_key", ASCENDING)], name=HASHED_KEY_INDEX_NAME, unique=True, background=True)
+    return {"created": True, "missing_hashed_key": 0, "duplicated_ids": []}
+
+
+async def relax_api_key_index(collection: AsyncIOMotorCollection) -> dict:
+    """
+    Rebuilds the unique (api_key, user_id) index as a partial index over the stored plaintexts.
+
+    A unique index treats a missing `api_key` as null, so once keys stop storing
+    their plaintext a user's second key would collide with the first one. Run it
+    before setting STORE_RAW_API_KEY=False, the plaintexts still stored stay unique.
+    """
+
+    index = (await collection.index_information()).get(API_KEY_USER_ID_INDEX_NAME)
+    if index is None or "partialFilterExpression" in index:
+        return {"rebuilt": False}
+
+    await collection.drop_index(API_KEY_USER_ID_INDEX_NAME)
+    await collection.create_index(
+        [("api_key", ASCENDING), ("user_id", ASCENDING)],
+        name=API_KEY_USER_ID_INDEX_NAME,
+        unique=True,
+        partialFilterExpression={"api_key": {"$type": "string"}},
+        background=True,
+    )
+    return {"rebuilt": True}
+
+
+async def backfill_key_ids(collection: AsyncIOMotorCollection, batch_size: int) -> dict:
+    """
+    Sets the `key_id` and `secret_id` of the keys issued before them, parsed from their stored plaintext.
+
+    Once every document has a `key_id` the verification no longer needs the hash
+    lookup of USE_HASHED_KEY_FALLBACK, which costs unknown keys a second HMAC and
+    query. Reports the documents still without a `key_id` (plaintext gone or unparsable).
+    """
+
+    backfilled, last_id = 0, None
+    while True:
+        query = {"api_key": {"$type": "string"}, "key_id": None}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        cursor = collection.find(
+            query, projection={"api_key": True, "secret_id": True}, sort=[("_id", ASCENDING)], limit=batch_size
+        )
+        docs = await cursor.to_list(length=batch_size)
+        if not docs:
+            break
+
+        last_id = docs[-1]["_id"]
+        operations = []
+        for doc in docs:
+            if (parsed := key_codec.parse(doc["api_key"])) is None:
+                continue
+            fields = {"key_id": parsed.key_id}
+            if not doc.get("secret_id"):
+                fields["secret_id"] = key_codec.legacy_id
+            operations.append(UpdateOne({"_id": doc["_id"], "key_id": None}, {"$set": fields}))
+
+        if operations:
+            backfilled += (await collection.bulk_write(operations, ordered=False)).modified_count
+
+    return {"backfilled": backfilled, "without_key_id": await collection.count_documents({"key_id": None})}
+
+
+async def drop_raw_api_keys(collection: AsyncIOMotorCollection, batch_size: int) -> dict:
+    """
+    Removes the plaintext `api_key` of every document, batch by batch, keeping its `key_id` for lookup and display.
+
+    The unique (api_key, user_id) index is dropped first: once the plaintext is gone
+    every key of a user would share the same null value. The `key_id` index is built
+    once the documents are rewritten. Keys whose plaintext no longer parses keep no
+    `key_id` and are still found by their hash.
+    """
+
+    indexes = await collection.index_information()
+    if API_KEY_USER_ID_INDEX_NAME in indexes:
+        await collection.drop_index(API_KEY_USER_ID_INDEX_NAME)
+
+    rewritten, unparsed = 0, 0
+    while True:
+        cursor = collection.find({"api_key": {"$type": "string"}}, projection={"api_key": True, "key_id": True}, limit=batch_size)
+        docs = await cursor.to_list(length=batch_size)
+        if not docs:
+            break
+
+        operations = []
+        for doc in docs:
+            update = {"$unset": {"api_key": ""}}
+            if not doc.get("key_id"):
+                if (parsed := key_codec.parse(doc["api_key"])) is not None:
+                    update["$set"] = {"key_id": parsed.key_id}
+                else:
+                    unparsed += 1
+            operations.append(UpdateOne({"_id": doc["_id"], "api_key": doc["api_key"]}, update))
+
+        result = await collection.bulk_write(operations, ordered=False)
+        rewritten += result.modified_count
+
+    if KEY_ID_INDEX_NAME not in indexes:
+        await collection.create_index(
+            [("key_id", ASCENDING)],
+            name=KEY_ID_INDEX_NAME,
+            unique=True,
+            partialFilterExpression={"key_id": {"$type": "string"}},
+            background=True,
+        )
+
+    return {"rewritten": rewritten, "without_key_id": unparsed, "dropped_index": API_KEY_USER_ID_INDEX_NAME in indexes}
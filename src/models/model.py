@@ -1,48 +1,179 @@
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Union
 
 import pymongo
-from beanie import Document, PydanticObjectId
-from pydantic import Field
+from beanie import Document, PydanticObjectId, UpdateResponse
+from pydantic import Field, field_serializer, PrivateAttr
 
 from src.config import settings
-from src.shared import generate_api_key
-from .schema import APIKeyBaseSchema
+from src.shared import IssuedKey, key_codec
+from .schema import APIKeyBaseSchema, APIKeyLimitsSchema
+
+HASHED_KEY_INDEX_NAME = "hashed_key_unique"
+KEY_ID_INDEX_NAME = "key_id_unique"
+API_KEY_USER_ID_INDEX_NAME = "api_key_1_user_id_1"
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _stored_fields(issued: IssuedKey) -> dict:
+    fields = issued._asdict()
+    if not settings.STORE_RAW_API_KEY:
+        fields.pop("api_key")
+    return fields
 
 
 class APIKeyDocument(Document, APIKeyBaseSchema):
-    api_key: str = Field(..., description="The API key to be used for authentication purposes (read-only)")
+    api_key: Optional[str] = Field(
+        default=None, description="The API key to be used for authentication purposes, masked when not stored (read-only)"
+    )
     hashed_key: str = Field(..., description="The hashed version of the API key to be stored in the database (read-only)")
+    key_id: Optional[str] = Field(default=None, description="Public identifier of the API key, used for the lookup (read-only)")
+    secret_id: Optional[str] = Field(default=None, description="Id of the secret that hashed the API key (read-only)")
     is_active: Optional[bool] = Field(default=True, description="Whether the API key is active or not (read-only)")
     last_used_at: Optional[datetime] = Field(
-        default=datetime.now(timezone.utc), description="The date and time the API key was last used (read-only)"
+        default_factory=_utcnow, description="The date and time the API key was last used (read-only)"
     )
+    usage_count: Optional[int] = Field(default=0, description="The number of successful verifications of the API key (read-only)")
+    rate_limit: Optional[float] = Field(default=None, description="Maximum number of verifications per second")
+    rate_limit_burst: Optional[int] = Field(default=None, description="Number of verifications allowed in a burst")
+    daily_quota: Optional[int] = Field(default=None, description="Maximum number of verifications per UTC day")
+    quota_day: Optional[str] = Field(default=None, description="UTC day the quota usage is counted for (read-only)")
+    quota_used: Optional[int] = Field(default=0, description="Verifications counted against the daily quota (read-only)")
     expires_at: Optional[datetime] = Field(
-        default=datetime.now(timezone.utc) + timedelta(days=365),
+        default_factory=lambda: _utcnow() + timedelta(days=365),
         description="The date and time the API key will expire (read-only)",
     )
     created_at: Optional[datetime] = Field(
-        default=datetime.now(timezone.utc), description="The date and time the API key was created (read-only)"
+        default_factory=_utcnow, description="The date and time the API key was created (read-only)"
     )
     updated_at: Optional[datetime] = Field(
-        default=datetime.now(timezone.utc), description="The date and time the API key was last updated (read-only)"
+        default_factory=_utcnow, description="The date and time the API key was last updated (read-only)"
     )
 
+    _issued_api_key: Optional[str] = PrivateAttr(default=None)
+
     class Settings:
-        use_state_management = True
         name = settings.APIKEY_HUB_COLLECTION.split(".")[1]
+        # L'index (api_key, user_id) hérité n'est plus déclaré : l'unicité repose sur hashed_key et les
+        # migrations le rendent partiel puis le suppriment, sans conflit d'options au démarrage
         indexes = [
             pymongo.IndexModel(
-                keys=[("api_key", pymongo.ASCENDING), ("user_id", pymongo.ASCENDING)],
+                keys=[("created_at", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)],
+                name="created_at_id",
+                background=True,
+            ),
+            pymongo.IndexModel(
+                keys=[("user_id", pymongo.ASCENDING), ("created_at", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)],
+                name="user_id_created_at_id",
+                background=True,
+            ),
+            pymongo.IndexModel(
+                keys=[
+                    ("user_id", pymongo.ASCENDING),
+                    ("is_active", pymongo.ASCENDING),
+                    ("created_at", pymongo.DESCENDING),
+                    ("_id", pymongo.DESCENDING),
+                ],
+                name="user_id_is_active_created_at_id",
+                background=True,
+            ),
+            pymongo.IndexModel(
+                keys=[("is_active", pymongo.ASCENDING), ("expires_at", pymongo.ASCENDING)],
+                name="is_active_expires_at",
+                background=True,
+            ),
+            pymongo.IndexModel(
+                keys=[("hashed_key", pymongo.ASCENDING)],
+                name=HASHED_KEY_INDEX_NAME,
+                unique=True,
+                background=True,
+            ),
+            pymongo.IndexModel(
+                keys=[("key_id", pymongo.ASCENDING)],
+                name=KEY_ID_INDEX_NAME,
                 unique=True,
+                partialFilterExpression={"key_id": {"$type": "string"}},
                 background=True,
-            )
-        ]
+            ),
+        ] + (
+            [pymongo.IndexModel(keys=[("expires_at", pymongo.ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0)]
+            if settings.APIKEY_EXPIRY_MODE == "ttl_index"
+            else []
+        )
+
+    def __iter__(self):
+        # L'encodeur Beanie parcourt le modèle pour écrire le document : sans clair stocké, ne jamais écrire
+        # `api_key: null`, que l'index unique (api_key, user_id) encore en place refuserait dès la deuxième clé
+        return ((name, value) for name, value in super().__iter__() if name != "api_key" or value is not None)
+
+    @classmethod
+    def issue(cls, user_id: Union[str, PydanticObjectId], **fields) -> "APIKeyDocument":
+        """
+        Builds a new document holding a freshly generated key, hashed with the active secret
+        """
+
+        issued = key_codec.issue(user_id)
+        doc = cls(user_id=user_id, **_stored_fields(issued), **fields)
+        doc._issued_api_key = issued.api_key
+        return doc
+
+    @property
+    def issued_api_key(self) -> Optional[str]:
+        return self.api_key or self._issued_api_key
+
+    @field_serializer("api_key")
+    def serialize_api_key(self, api_key: Optional[str]) -> Optional[str]:
+        """
+        Without a stored plaintext, only the response issuing the key shows it, every other one shows it masked
+        """
+
+        if (api_key := api_key or self._issued_api_key) is not None or self.key_id is None:
+            return api_key
+        return key_codec.mask(self.key_id)
+
+    @classmethod
+    async def regenerate_api_key(
+        cls, id: PydanticObjectId, user_id: Union[str, PydanticObjectId], scope: Optional[dict] = None
+    ) -> Optional["APIKeyDocument"]:
+        """
+        Replaces the key atomically with find_one_and_update, None when no document matches `scope`
+        """
+
+        issued = key_codec.issue(user_id=user_id)
+        doc = await cls.find_one({**(scope or {}), "_id": id, "user_id": user_id}).update(
+            {
+                "$set": {**_stored_fields(issued), "updated_at": datetime.now(timezone.utc)},
+                **({} if settings.STORE_RAW_API_KEY else {"$unset": {"api_key": ""}}),
+            },
+            response_type=UpdateResponse.NEW_DOCUMENT,
+        )
+        if doc is not None:
+            doc._issued_api_key = issued.api_key
+        return doc
 
     @classmethod
-    async def regenerate_api_key(cls, id: PydanticObjectId, user_id: PydanticObjectId):
-        api_key, hashed_key = generate_api_key(user_id=user_id)
-        updated = await cls.find_one({"_id": id}).update_one({"$set": {"api_key": api_key, "hashed_key": hashed_key}})
-        if not updated.acknowledged:
-            raise ValueError("API Key not found")
-        return await cls.find_one({"_id": id})
+    async def set_active(cls, id: PydanticObjectId, is_active: bool, scope: Optional[dict] = None) -> Optional["APIKeyDocument"]:
+        """
+        Activates or deactivates the key atomically with find_one_and_update, None when no document matches `scope`
+        """
+
+        return await cls.find_one({**(scope or {}), "_id": id}).update(
+            {"$set": {"is_active": is_active, "updated_at": datetime.now(timezone.utc)}},
+            response_type=UpdateResponse.NEW_DOCUMENT,
+        )
+
+    @classmethod
+    async def set_limits(
+        cls, id: PydanticObjectId, limits: APIKeyLimitsSchema, scope: Optional[dict] = None
+    ) -> Optional["APIKeyDocument"]:
+        """
+        Replaces the rate limit and daily quota of the key atomically, None when no document matches `scope`
+        """
+
+        return await cls.find_one({**(scope or {}), "_id": id}).update(
+            {"$set": {**limits.model_dump(), "updated_at": datetime.now(timezone.utc)}},
+            response_type=UpdateResponse.NEW_DOCUMENT,
+        )
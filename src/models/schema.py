@@ -1,7 +1,12 @@
-from typing import Optional, Union
+from typing import Annotated, Generic, Optional, TypeVar, Union
 from datetime import datetime
 from beanie import PydanticObjectId
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator, StringConstraints
+
+from src.config import settings
+from src.shared import key_codec
+
+T = TypeVar("T")
 
 
 class APIKeyBaseSchema(BaseModel):
@@ -14,5 +19,165 @@ class APIKeyFilterSchema(BaseModel):
     last_used_at: Optional[datetime] = Field(
         None, title="Last Used At", description="The date and time the API key was last used"
     )
+    last_used_at_gte: Optional[datetime] = Field(None, description="Keys last used at or after this date and time")
+    last_used_at_lte: Optional[datetime] = Field(None, description="Keys last used at or before this date and time")
     expires_at: Optional[datetime] = Field(None, title="Expires At", description="The date and time the API key will expire")
+    expires_at_gte: Optional[datetime] = Field(None, description="Keys expiring at or after this date and time")
+    expires_at_lte: Optional[datetime] = Field(None, description="Keys expiring at or before this date and time")
     created_at: Optional[datetime] = Field(None, title="Created At", description="The date and time the API key was created")
+    created_at_gte: Optional[datetime] = Field(None, description="Keys created at or after this date and time")
+    created_at_lte: Optional[datetime] = Field(None, description="Keys created at or before this date and time")
+
+    def build_search(self) -> dict:
+        """
+        Translates the filters into a MongoDB query, `_gte`/`_lte` bounds become a range on their datetime field
+        """
+
+        search = self.model_dump(exclude_none=True, exclude=set(RANGE_OPERATORS_FIELDS))
+        for name, value in self.model_dump(exclude_none=True, include=set(RANGE_OPERATORS_FIELDS)).items():
+            field, operator = RANGE_OPERATORS_FIELDS[name]
+            if not isinstance(condition := search.get(field, {}), dict):
+                condition = {"$eq": condition}
+            search[field] = {**condition, operator: value}
+
+        return search
+
+
+RANGE_OPERATORS_FIELDS = {
+    f"{field}_{suffix}": (field, f"${suffix}")
+    for field in ("last_used_at", "expires_at", "created_at")
+    for suffix in ("gte", "lte")
+}
+
+
+class APIKeyOwnerSchema(BaseModel):
+    id: PydanticObjectId = Field(..., alias="_id")
+    user_id: Union[str, PydanticObjectId] = Field(..., description="The user ID that the API key belongs to")
+
+
+class APIKeyOutSchema(BaseModel):
+    """
+    Public representation of an API key, without its hash
+    """
+
+    id: str = Field(..., alias="_id")
+    user_id: str = Field(..., description="The user ID that the API key belongs to")
+    api_key: Optional[str] = Field(default=None, description="The API key, masked when its plaintext is not stored")
+    key_id: Optional[str] = Field(default=None, description="Public identifier of the API key")
+    secret_id: Optional[str] = Field(default=None, description="Id of the secret that hashed the API key")
+    is_active: Optional[bool] = Field(default=True, description="Whether the API key is active or not")
+    last_used_at: Optional[datetime] = Field(default=None, description="The date and time the API key was last used")
+    usage_count: Optional[int] = Field(default=0, description="The number of successful verifications of the API key")
+    rate_limit: Optional[float] = Field(default=None, description="Maximum number of verifications per second")
+    rate_limit_burst: Optional[int] = Field(default=None, description="Number of verifications allowed in a burst")
+    daily_quota: Optional[int] = Field(default=None, description="Maximum number of verifications per UTC day")
+    quota_day: Optional[str] = Field(default=None, description="UTC day the quota usage is counted for")
+    quota_used: Optional[int] = Field(default=0, description="Verifications counted against the daily quota")
+    expires_at: Optional[datetime] = Field(default=None, description="The date and time the API key will expire")
+    created_at: Optional[datetime] = Field(default=None, description="The date and time the API key was created")
+    updated_at: Optional[datetime] = Field(default=None, description="The date and time the API key was last updated")
+
+    @classmethod
+    def render(cls, doc: dict) -> dict:
+        """
+        Output of a raw document built in one pass without validation, ready to be encoded by orjson
+        """
+
+        output = {field: doc.get(field, default) for field, default in _OUTPUT_DEFAULTS.items()}
+        output["_id"], output["user_id"] = str(doc["_id"]), str(doc["user_id"])
+        if output["api_key"] is None and output["key_id"]:
+            output["api_key"] = key_codec.mask(output["key_id"])
+        return output
+
+
+_OUTPUT_DEFAULTS = {
+    field.alias or name: None if field.is_required() else field.default for name, field in APIKeyOutSchema.model_fields.items()
+}
+
+
+class APIKeyVerifyRecord:
+    """
+    Fields needed to decide an API key verification, read from a raw projected document.
+
+    Built without validation on the verification hot path: the document comes
+    from our own writes, so only missing fields need their defaults.
+    """
+
+    __slots__ = (
+        "id",
+        "hashed_key",
+        "key_id",
+        "secret_id",
+        "user_id",
+        "is_active",
+        "expires_at",
+        "rate_limit",
+        "rate_limit_burst",
+        "daily_quota",
+        "quota_day",
+        "quota_used",
+    )
+    PROJECTION = {"_id": True, **{field: True for field in __slots__[1:]}}
+
+    def __init__(self, doc: dict):
+        get = doc.get
+        self.id = doc["_id"]
+        self.hashed_key = doc["hashed_key"]
+        self.key_id = get("key_id")
+        self.secret_id = get("secret_id")
+        self.user_id = doc["user_id"]
+        self.is_active = get("is_active", True)
+        self.expires_at = get("expires_at")
+        self.rate_limit = get("rate_limit")
+        self.rate_limit_burst = get("rate_limit_burst")
+        self.daily_quota = get("daily_quota")
+        self.quota_day = get("quota_day")
+        self.quota_used = get("quota_used", 0)
+
+
+class APIKeyLimitsSchema(BaseModel):
+    rate_limit: Optional[float] = Field(None, gt=0, description="Maximum number of verifications per second, null for no limit")
+    rate_limit_burst: Optional[int] = Field(
+        None, ge=1, description="Number of verifications allowed in a burst, defaults to one second of traffic"
+    )
+    daily_quota: Optional[int] = Field(None, ge=0, description="Maximum number of verifications per UTC day, null for no quota")
+
+
+class APIKeyBatchVerifySchema(BaseModel):
+    api_keys: list[str] = Field(
+        ...,
+        min_length=1,
+        max_length=settings.VERIFY_BATCH_MAX_SIZE,
+        description="API Keys to verify, verdicts are returned in the same order",
+    )
+
+
+class APIKeyBulkCreateSchema(BaseModel):
+    user_ids: list[Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]] = Field(
+        ...,
+        min_length=1,
+        max_length=settings.BULK_CREATE_MAX_SIZE,
+        description="User IDs to issue an API key for, one key per entry",
+    )
+
+
+class APIKeyBulkSelectionSchema(BaseModel):
+    ids: Optional[list[PydanticObjectId]] = Field(
+        None, min_length=1, max_length=settings.BULK_SELECTION_MAX_IDS, description="IDs of the API keys to select"
+    )
+    filter: Optional[APIKeyFilterSchema] = Field(None, description="Criteria of the API keys to select")
+
+    @model_validator(mode="after")
+    def check_selection(self):
+        if (self.ids is None) == (self.filter is None):
+            raise ValueError("Provide either `ids` or `filter`")
+        if self.filter is not None and not self.filter.build_search():
+            raise ValueError("`filter` needs at least one criterion")
+        return self
+
+
+class CursorPage(BaseModel, Generic[T]):
+    items: list[T] = Field(..., description="Items of the current page")
+    current_page: Optional[str] = Field(None, description="Cursor of the current page")
+    next_page: Optional[str] = Field(None, description="Cursor of the next page, null on the last page")
+    previous_page: Optional[str] = Field(None, description="Cursor of the previous page, null on the first page")
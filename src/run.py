@@ -1,11 +1,30 @@
+import asyncio
+import os
+from pathlib import Path
+from typing import Optional
+
 import typer
 import uvicorn
+from motor.motor_asyncio import AsyncIOMotorClient
 
 from src.config import settings
 
 app = typer.Typer(pretty_exceptions_enable=True)
 
 
+def _mongo_client() -> AsyncIOMotorClient:
+    # Mêmes options de pool, TLS et compression que l'application
+    from src.shared import client_uri
+
+    return AsyncIOMotorClient(client_uri(settings.MONGODB_URI))
+
+
+@app.callback(invoke_without_command=True)
+def main(ctx: typer.Context):
+    if ctx.invoked_subcommand is None:
+        run_app()
+
+
 @app.command(name="Run app server")
 def run_app():
     uvicorn.run(
@@ -19,5 +38,123 @@ def run_app():
     )
 
 
+@app.command(name="serve")
+def serve(
+    workers: Optional[int] = typer.Option(None, help="Number of worker processes, defaults to APP_WORKERS or the CPU count"),
+):
+    """
+    Run the production server: several uvloop + httptools workers without auto-reload.
+
+    Each worker imports the app itself, so its lifespan opens the Mongo client and
+    builds the caches after the fork. Send SIGHUP to restart the workers gracefully,
+    APP_LIMIT_MAX_REQUESTS recycles a worker after that many requests. Metrics are
+    per worker unless METRICS_MULTIPROCESS_DIR lets the scraped worker aggregate them.
+    Rate limits stay per worker: a key may reach workers x replicas times its rate,
+    only the daily quota is shared through MongoDB.
+    """
+
+    workers = workers or settings.APP_WORKERS or os.cpu_count() or 1
+    if settings.USE_RATE_LIMITING and workers > 1:
+        typer.echo(f"Rate limits are enforced per worker: each key may reach {workers} times its rate on this replica")
+
+    if settings.METRICS_MULTIPROCESS_DIR:
+        # Repartir de zéro : les instantanés d'un lancement précédent fausseraient les compteurs
+        for snapshot in Path(settings.METRICS_MULTIPROCESS_DIR).glob("*.json"):
+            snapshot.unlink()
+
+    uvicorn.run(
+        app="src.main:app",
+        host=settings.APP_HOSTNAME,
+        port=settings.APP_DEFAULT_PORT,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        reload=False,
+        log_level=settings.APP_LOG_LEVEL,
+        access_log=settings.APP_ACCESS_LOG,
+        backlog=settings.APP_BACKLOG,
+        timeout_keep_alive=settings.APP_TIMEOUT_KEEP_ALIVE,
+        limit_concurrency=settings.APP_LIMIT_CONCURRENCY,
+        limit_max_requests=settings.APP_LIMIT_MAX_REQUESTS,
+        timeout_graceful_shutdown=settings.APP_TIMEOUT_GRACEFUL_SHUTDOWN,
+    )
+
+
+@app.command(name="migrate-hashed-key-index")
+def migrate_hashed_key_index():
+    """
+    Build the unique `hashed_key` index used by the verification lookup
+    """
+
+    from src.models.migrations import ensure_hashed_key_index, get_apikey_collection
+
+    client = _mongo_client()
+    try:
+        result = asyncio.run(ensure_hashed_key_index(get_apikey_collection(client)))
+    finally:
+        client.close()
+
+    typer.echo(result)
+    if not result["created"]:
+        raise typer.Exit(code=1)
+
+
+@app.command(name="migrate-relax-api-key-index")
+def migrate_relax_api_key_index():
+    """
+    Make the unique (api_key, user_id) index partial, run before setting STORE_RAW_API_KEY=False
+    """
+
+    from src.models.migrations import get_apikey_collection, relax_api_key_index
+
+    client = _mongo_client()
+    try:
+        result = asyncio.run(relax_api_key_index(get_apikey_collection(client)))
+    finally:
+        client.close()
+
+    typer.echo(result)
+
+
+@app.command(name="migrate-backfill-key-id")
+def migrate_backfill_key_id(batch_size: int = typer.Option(1000, help="Number of documents rewritten per bulk write")):
+    """
+    Set the key_id of the keys issued before it, USE_HASHED_KEY_FALLBACK can be disabled once none is left without
+    """
+
+    from src.models.migrations import backfill_key_ids, get_apikey_collection
+
+    client = _mongo_client()
+    try:
+        result = asyncio.run(backfill_key_ids(get_apikey_collection(client), batch_size=batch_size))
+    finally:
+        client.close()
+
+    typer.echo(result)
+    if result["without_key_id"]:
+        typer.echo("Keys without a key_id are left, keep USE_HASHED_KEY_FALLBACK enabled to verify them")
+
+
+@app.command(name="migrate-drop-raw-api-key")
+def migrate_drop_raw_api_key(batch_size: int = typer.Option(1000, help="Number of documents rewritten per bulk write")):
+    """
+    Remove the stored plaintext API keys and the (api_key, user_id) index, run with STORE_RAW_API_KEY=False
+    """
+
+    from src.models.migrations import drop_raw_api_keys, get_apikey_collection
+
+    if settings.STORE_RAW_API_KEY:
+        typer.echo("Set STORE_RAW_API_KEY=False first, otherwise new keys would keep storing their plaintext")
+        raise typer.Exit(code=1)
+
+    client = _mongo_client()
+    try:
+        result = asyncio.run(drop_raw_api_keys(get_apikey_collection(client), batch_size=batch_size))
+    finally:
+        client.close()
+
+    typer.echo(result)
+
+
 if __name__ == "__main__":
     app()
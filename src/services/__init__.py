@@ -0,0 +1,7 @@
+from .activity_logs import activity_log_shipper, ActivityLogShipper  # noqa: F401
+from .bulk import bulk_delete, bulk_update, issue_api_keys  # noqa: F401
+from .expiry import expiry_sweeper, ExpirySweeper  # noqa: F401
+from .ratelimit import rate_limiter, RateLimiter, RateLimitPolicy, RateLimitVerdict  # noqa: F401
+from .rehash import key_rehasher, KeyRehasher  # noqa: F401
+from .usage import usage_tracker, UsageTracker  # noqa: F401
+from .watcher import cache_invalidation_watcher, CacheInvalidationWatcher  # noqa: F401
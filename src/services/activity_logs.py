@@ -0,0 +1,225 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+from fastapi import Request
+
+from src.config import settings
+from src.shared import API_TRAILHUB_ENDPOINT
+from src.shared.trailhub import build_event, post_event
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityLogShipper:
+    """
+    Ships activity logs to trailhub from a background task.
+
+    Endpoints enqueue events without waiting; the worker flushes them in
+    batches (by size or age), posting one event per request with the service
+    credential, retries with jittered backoff and spills to an NDJSON file
+    when trailhub stays unreachable or the queue is full. Each process spills
+    to its own file, replayed after the next successful flush along with the
+    files left by processes that are gone, and the queue is drained on shutdown.
+    """
+
+    def __init__(self, trailhub_url: str):
+        self.trailhub_url = trailhub_url
+        self.shipped = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.retries = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: list[dict] = []
+        self._spilling: set[asyncio.Task] = set()
+        self._spill_lock = threading.Lock()
+
+    @property
+    def spill_base_path(self) -> Path:
+        return Path(settings.ACTIVITY_LOGS_SPILL_PATH or Path(tempfile.gettempdir()) / "apikeys-hub-activity-logs.ndjson")
+
+    @property
+    def spill_path(self) -> Path:
+        # Un fichier par processus : les workers de `serve` n'écrivent ni ne renomment jamais le même fichier
+        base = self.spill_base_path
+        return base.with_name(f"{base.stem}-{os.getpid()}{base.suffix}")
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def enqueue(self, request: Request, message: str, user_id: str) -> None:
+        event = build_event(request=request, source=settings.APP_NAME.lower(), message=message, user_id=user_id)
+        try:
+            if not self.running:
+                raise asyncio.QueueFull
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Backpressure : ne jamais bloquer la requête, déverser sur disque hors de la boucle
+            task = asyncio.get_running_loop().create_task(self._spill([event]))
+            self._spilling.add(task)
+            task.add_done_callback(self._spilling.discard)
+
+    async def start(self) -> None:
+        # Trailhub authentifie chaque événement : sans identifiant de service, tout serait rejeté puis déversé
+        if not settings.ACTIVITY_LOGS_AUTHORIZATION:
+            raise ValueError("ACTIVITY_LOGS_AUTHORIZATION must be set to ship activity logs to trailhub")
+        if not self.running:
+            self._queue = asyncio.Queue(maxsize=settings.ACTIVITY_LOGS_QUEUE_SIZE)
+            self._task = asyncio.create_task(self._run(), name="activity-log-shipper")
+
+    async def stop(self) -> None:
+        if self._spilling:
+            await asyncio.gather(*self._spilling)
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        # Le lot en cours ne garde que les événements non acquittés, même interrompu en pleine collecte
+        pending, self._inflight = self._inflight, []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+
+        drain = asyncio.create_task(self._post(pending))
+        await asyncio.wait({drain}, timeout=settings.ACTIVITY_LOGS_DRAIN_TIMEOUT)
+        if not drain.done():
+            drain.cancel()
+            try:
+                await drain
+            except asyncio.CancelledError:
+                pass
+            logger.warning("Activity logs drain timed out, %d event(s) spilled to %s", len(pending), self.spill_path)
+        if pending:
+            await self._spill(pending)
+
+    async def _post(self, events: list[dict]) -> list[dict]:
+        """
+        Posts the events one per request, in order, removing each acknowledged one from `events` in place
+        """
+
+        while events:
+            if not await post_event(self.trailhub_url, events[0], authorization=settings.ACTIVITY_LOGS_AUTHORIZATION):
+                break
+            del events[0]
+            self.shipped += 1
+        return events
+
+    async def _spill_inflight(self) -> None:
+        # Détacher d'abord : un arrêt pendant l'écriture ne déverse pas les mêmes événements une seconde fois
+        events, self._inflight = self._inflight, []
+        await self._spill(events)
+
+    async def _run(self) -> None:
+        while True:
+            await self._next_batch()
+            await self._ship()
+
+    async def _next_batch(self) -> None:
+        # Accumuler dans _inflight : un arrêt pendant la collecte retrouve les événements déjà sortis de la file
+        self._inflight = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.ACTIVITY_LOGS_FLUSH_INTERVAL
+
+        while len(self._inflight) < settings.ACTIVITY_LOGS_BATCH_SIZE:
+            if (timeout := deadline - loop.time()) <= 0:
+                break
+            try:
+                self._inflight.append(await asyncio.wait_for(self._queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _ship(self) -> None:
+        for attempt in range(settings.ACTIVITY_LOGS_MAX_RETRIES + 1):
+            if not await self._post(self._inflight):
+                await self._replay_spill()
+                return
+
+            if attempt < settings.ACTIVITY_LOGS_MAX_RETRIES:
+                self.retries += 1
+                backoff = min(settings.ACTIVITY_LOGS_RETRY_MAX_DELAY, settings.ACTIVITY_LOGS_RETRY_BASE_DELAY * 2**attempt)
+                await asyncio.sleep(random.uniform(0, backoff))  # nosec B311
+
+        await self._spill_inflight()
+
+    async def _spill(self, events: list[dict]) -> None:
+        await asyncio.to_thread(self._write_spill, events)
+        self.spilled += len(events)
+
+    def _write_spill(self, events: list[dict]) -> None:
+        with self._spill_lock, open(self.spill_path, "a", encoding="utf-8") as spill:
+            spill.writelines(json.dumps(event, default=str) + "\n" for event in events)
+
+    def _spill_files(self) -> list[Path]:
+        """
+        Spill file of this process, then those of processes that are no longer running
+        """
+
+        base, own = self.spill_base_path, self.spill_path
+        files = [own] if own.exists() else []
+        for path in sorted(base.parent.glob(f"{base.stem}-*{base.suffix}")):
+            pid = path.stem.removeprefix(f"{base.stem}-")
+            if path != own and pid.isdigit() and not _process_alive(int(pid)):
+                files.append(path)
+        return files
+
+    def _claim_spill(self) -> list[dict]:
+        events, replay_path = [], self.spill_path.with_suffix(".replay")
+        with self._spill_lock:
+            for path in self._spill_files():
+                # Renommer d'abord pour que les nouveaux débordements ne soient pas perdus pendant la relecture,
+                # le renommage atomique réserve un fichier orphelin à un seul worker
+                try:
+                    os.replace(path, replay_path)
+                except FileNotFoundError:
+                    continue
+                with open(replay_path, encoding="utf-8") as replay:
+                    events += [json.loads(line) for line in replay if line.strip()]
+                replay_path.unlink()
+        return events
+
+    async def _replay_spill(self) -> None:
+        if not (events := await asyncio.to_thread(self._claim_spill)):
+            return
+
+        # Relus depuis le disque, ils deviennent le lot en cours pour survivre à un arrêt
+        self.replayed += len(events)
+        self._inflight = events
+        if await self._post(self._inflight):
+            await self._spill_inflight()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "maxsize": settings.ACTIVITY_LOGS_QUEUE_SIZE,
+            "shipped": self.shipped,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "retries": self.retries,
+        }
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+activity_log_shipper = ActivityLogShipper(trailhub_url=API_TRAILHUB_ENDPOINT)
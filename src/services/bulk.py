@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Optional
+
+from beanie import PydanticObjectId
+from pymongo import DeleteMany, UpdateMany
+from pymongo.errors import BulkWriteError
+
+from src.models import APIKeyDocument
+from src.shared import APIKeyErrorCode
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+def _chunks(items: list, size: int) -> list[list]:
+    return [items[start : start + size] for start in range(0, len(items), size)]  # noqa: E203
+
+
+def _build_documents(user_ids: list[str]) -> list[APIKeyDocument]:
+    return [APIKeyDocument.issue(user_id, id=PydanticObjectId()) for user_id in user_ids]
+
+
+async def _insert_documents(docs: list[APIKeyDocument]) -> dict[int, APIKeyErrorCode]:
+    """
+    Inserts a chunk with an unordered insert_many, returns the error codes by position in the chunk
+    """
+
+    try:
+        await APIKeyDocument.insert_many(docs, ordered=False)
+    except BulkWriteError as exc:
+        errors = exc.details.get("writeErrors", [])
+    else:
+        return {}
+
+    # Le message brut de Mongo révèle index et valeurs : il reste dans les logs, le client reçoit un code stable
+    for error in errors:
+        logger.warning("Bulk insert of API key %d failed: %s", error["index"], error.get("errmsg"))
+    return {
+        error["index"]: (
+            APIKeyErrorCode.BULK_DUPLICATE_KEY if error.get("code") == DUPLICATE_KEY_ERROR else APIKeyErrorCode.BULK_WRITE_ERROR
+        )
+        for error in errors
+    }
+
+
+async def issue_api_keys(user_ids: list[str], chunk_size: int) -> AsyncIterator[dict]:
+    """
+    Issues one API key per user id, chunk by chunk, and yields the outcome of every item in order.
+
+    Keys of the next chunk are generated in a worker thread while the current
+    chunk is being inserted, so HMAC work overlaps with the database round trip.
+    """
+
+    chunks = _chunks(user_ids, chunk_size)
+    offset = 0
+    next_docs = asyncio.create_task(asyncio.to_thread(_build_documents, chunks[0])) if chunks else None
+
+    for position in range(len(chunks)):
+        docs = await next_docs
+        if position + 1 < len(chunks):
+            next_docs = asyncio.create_task(asyncio.to_thread(_build_documents, chunks[position + 1]))
+
+        errors = await _insert_documents(docs)
+        for index, doc in enumerate(docs):
+            item = {"index": offset + index, "user_id": str(doc.user_id)}
+            if index in errors:
+                item["error"] = errors[index]
+            else:
+                item.update({"_id": str(doc.id), "api_key": doc.issued_api_key})
+            yield item
+
+        offset += len(docs)
+
+
+def _selection_queries(ids: Optional[list], search: dict, scope: dict, chunk_size: int) -> list[dict]:
+    if ids is not None:
+        return [{"_id": {"$in": chunk}, **scope} for chunk in _chunks(ids, chunk_size)]
+    return [{"$and": [search, scope]} if scope else search]
+
+
+async def bulk_update(ids: Optional[list], search: dict, scope: dict, update: dict, chunk_size: int) -> dict:
+    """
+    Applies an update to a selection of keys, sent as a single unordered bulk_write of UpdateMany operations
+    """
+
+    operations = [UpdateMany(query, update) for query in _selection_queries(ids, search, scope, chunk_size)]
+    result = await APIKeyDocument.get_motor_collection().bulk_write(operations, ordered=False)
+    return {"matched": result.matched_count, "modified": result.modified_count}
+
+
+async def bulk_delete(ids: Optional[list], search: dict, scope: dict, chunk_size: int) -> dict:
+    """
+    Deletes a selection of keys, sent as a single unordered bulk_write of DeleteMany operations
+    """
+
+    operations = [DeleteMany(query) for query in _selection_queries(ids, search, scope, chunk_size)]
+    result = await APIKeyDocument.get_motor_collection().bulk_write(operations, ordered=False)
+    return {"deleted": result.deleted_count}
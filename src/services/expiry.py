@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from src.config import settings
+from src.models import APIKeyDocument
+from src.shared import verification_cache
+
+logger = logging.getLogger(__name__)
+
+LEASE_ID = "expiry-sweeper"
+
+
+class ExpirySweeper:
+    """
+    Deactivates expired API keys from a background task.
+
+    Expired active keys are found on the (is_active, expires_at) index and
+    deactivated by batches of EXPIRY_SWEEP_BATCH_SIZE with update_many, with a
+    pause between batches so a large backlog does not saturate the primary.
+    Every worker of every replica runs the task, but only the holder of a
+    lease stored next to the keys sweeps; it renews the lease at each run and
+    another process takes over once it has lapsed.
+    """
+
+    def __init__(self):
+        self.swept = 0
+        self.failures = 0
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def sweep(self) -> int:
+        collection = APIKeyDocument.get_motor_collection()
+        swept = 0
+
+        while True:
+            now = datetime.now(timezone.utc)
+            expired = {"is_active": True, "expires_at": {"$lte": now}}
+            cursor = collection.find(expired, projection={"_id": True}, limit=settings.EXPIRY_SWEEP_BATCH_SIZE)
+            ids = [doc["_id"] async for doc in cursor]
+            if not ids:
+                break
+
+            result = await collection.update_many(
+                {"_id": {"$in": ids}, **expired}, {"$set": {"is_active": False, "updated_at": now}}
+            )
+            verification_cache.invalidate(*ids)
+            swept += result.modified_count
+
+            if len(ids) < settings.EXPIRY_SWEEP_BATCH_SIZE:
+                break
+            await asyncio.sleep(settings.EXPIRY_SWEEP_BATCH_PAUSE)
+
+        self.swept += swept
+        return swept
+
+    async def acquire_lease(self) -> bool:
+        """
+        Takes or renews the sweep lease, returns whether this process holds it until the next run
+        """
+
+        collection = APIKeyDocument.get_motor_collection()
+        leases = collection.database[f"{collection.name}_leases"]
+        now = datetime.now(timezone.utc)
+        try:
+            # Si un autre processus détient un bail encore valide, l'upsert se heurte à son _id
+            await leases.update_one(
+                {"_id": LEASE_ID, "$or": [{"owner": self.owner}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=2 * settings.EXPIRY_SWEEP_INTERVAL)}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.create_task(self._run(), name="expiry-sweeper")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if await self.acquire_lease():
+                    await self.sweep()
+            except PyMongoError as exc:
+                self.failures += 1
+                logger.warning("Unable to deactivate expired API keys: %r", exc)
+            await asyncio.sleep(settings.EXPIRY_SWEEP_INTERVAL)
+
+    def stats(self) -> dict:
+        return {"running": self.running, "owner": self.owner, "swept": self.swept, "failures": self.failures}
+
+
+expiry_sweeper = ExpirySweeper()
@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple, Optional
+
+from beanie import PydanticObjectId
+from cachetools import TTLCache
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from src.config import settings
+from src.models import APIKeyDocument, APIKeyVerifyRecord
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitPolicy(NamedTuple):
+    rate: Optional[float]
+    burst: Optional[int]
+    daily_quota: Optional[int]
+
+    @classmethod
+    def from_document(cls, doc: APIKeyVerifyRecord) -> Optional["RateLimitPolicy"]:
+        if doc.rate_limit is None and doc.daily_quota is None:
+            return None
+
+        burst = doc.rate_limit_burst or (max(1, math.ceil(doc.rate_limit)) if doc.rate_limit is not None else None)
+        return cls(rate=doc.rate_limit, burst=burst, daily_quota=doc.daily_quota)
+
+
+class RateLimitVerdict(NamedTuple):
+    allowed: bool
+    headers: dict[str, str]
+
+
+class _KeyState:
+    __slots__ = ("policy", "tokens", "refilled_at", "day", "synced", "unsynced")
+
+    def __init__(self, policy: RateLimitPolicy, day: str, used: int, now: float):
+        self.policy = policy
+        self.tokens = float(policy.burst or 0)
+        self.refilled_at = now
+        self.day = day
+        self.synced = used
+        self.unsynced = 0
+
+
+def _utc_day() -> tuple[str, float]:
+    """
+    Returns the current UTC day and the number of seconds until it ends
+    """
+
+    now = datetime.now(timezone.utc)
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+    return now.date().isoformat(), (midnight - now).total_seconds()
+
+
+class RateLimiter:
+    """
+    Enforces per-key rate limits (token bucket) and daily quotas in process.
+
+    A check is O(1): one bounded TTL cache lookup, a refill computed from the
+    elapsed time and a counter update. Idle keys are evicted after
+    RATE_LIMIT_IDLE_TTL seconds. The rate limit is enforced per process, so
+    with N serve workers on each of R replicas a key may reach N x R times its
+    rate. The daily quota is shared: the consumption of each process is added
+    to the document every RATE_LIMIT_SYNC_INTERVAL seconds and the global
+    count is read back, so it may only be exceeded by what the processes
+    allow during one interval.
+    """
+
+    def __init__(self, maxsize: int, idle_ttl: float):
+        self.denied = 0
+        self.synced = 0
+        self.failures = 0
+        self._states: TTLCache = TTLCache(maxsize=maxsize, ttl=idle_ttl, timer=time.monotonic)
+        self._pending: dict[str, list] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def check(self, doc_id: str, policy: RateLimitPolicy, quota: Optional[tuple[Optional[str], int]] = None) -> RateLimitVerdict:
+        """
+        Consumes one verification of the key, `quota` seeds the daily usage (day, count) read from the document
+        """
+
+        now = time.monotonic()
+        day, day_remaining = _utc_day()
+
+        state = self._states.get(doc_id)
+        if state is None or state.policy != policy:
+            quota_day, quota_used = quota or (None, 0)
+            state = _KeyState(policy, day=day, used=quota_used if quota_day == day else 0, now=now)
+        elif state.day != day:
+            state.day, state.synced, state.unsynced = day, 0, 0
+
+        allowed, retry_after, headers = True, 0.0, {}
+        if policy.rate is not None:
+            state.tokens = min(float(policy.burst), state.tokens + (now - state.refilled_at) * policy.rate)
+            state.refilled_at = now
+            if state.tokens < 1:
+                allowed, retry_after = False, (1 - state.tokens) / policy.rate
+
+        if policy.daily_quota is not None:
+            if (entry := self._pending.get(doc_id)) is None or entry[0] != day:
+                self._pending[doc_id] = [day, 0]
+            if state.synced + state.unsynced >= policy.daily_quota:
+                allowed, retry_after = False, max(retry_after, day_remaining)
+
+        if allowed:
+            if policy.rate is not None:
+                state.tokens -= 1
+            if policy.daily_quota is not None:
+                state.unsynced += 1
+                self._pending[doc_id][1] += 1
+        else:
+            self.denied += 1
+            headers["Retry-After"] = str(math.ceil(retry_after))
+
+        if policy.rate is not None:
+            headers["X-RateLimit-Limit"] = str(policy.burst)
+            headers["X-RateLimit-Remaining"] = str(int(state.tokens))
+        if policy.daily_quota is not None:
+            headers["X-Quota-Limit"] = str(policy.daily_quota)
+            headers["X-Quota-Remaining"] = str(max(0, policy.daily_quota - state.synced - state.unsynced))
+            headers["X-Quota-Reset"] = str(math.ceil(day_remaining))
+
+        # Réinsérer l'état repousse son éviction tant que la clé reste utilisée
+        self._states[doc_id] = state
+        return RateLimitVerdict(allowed=allowed, headers=headers)
+
+    def forget(self, *doc_ids: str) -> None:
+        for doc_id in doc_ids:
+            self._states.pop(str(doc_id), None)
+
+    def clear(self) -> None:
+        self._states.clear()
+
+    async def sync(self) -> int:
+        """
+        Adds the local quota consumption to the documents and reads the global usage back
+        """
+
+        if not self._pending:
+            return 0
+
+        pending, self._pending = self._pending, {}
+        operations = []
+        for doc_id, (day, count) in pending.items():
+            if count:
+                operations += [
+                    UpdateOne(
+                        {"_id": PydanticObjectId(doc_id), "quota_day": {"$ne": day}},
+                        {"$set": {"quota_day": day, "quota_used": 0}},
+                    ),
+                    UpdateOne({"_id": PydanticObjectId(doc_id), "quota_day": day}, {"$inc": {"quota_used": count}}),
+                ]
+
+        collection = APIKeyDocument.get_motor_collection()
+        try:
+            if operations:
+                await collection.bulk_write(operations, ordered=True)
+            cursor = collection.find(
+                {"_id": {"$in": [PydanticObjectId(doc_id) for doc_id in pending]}},
+                projection={"quota_day": True, "quota_used": True},
+            )
+            usage = {str(doc["_id"]): (doc.get("quota_day"), doc.get("quota_used", 0)) async for doc in cursor}
+        except PyMongoError as exc:
+            self.failures += 1
+            logger.warning("Unable to sync the quota of %d API key(s): %r", len(pending), exc)
+            self._merge(pending)
+            return 0
+
+        for doc_id, (day, count) in pending.items():
+            state = self._states.get(doc_id)
+            if state is None or state.day != day:
+                continue
+            state.unsynced = max(0, state.unsynced - count)
+            quota_day, quota_used = usage.get(doc_id, (None, 0))
+            state.synced = quota_used if quota_day == day else 0
+
+        self.synced += len(pending)
+        return len(pending)
+
+    def _merge(self, pending: dict[str, list]) -> None:
+        # Réintégrer les consommations non écrites du même jour
+        for doc_id, (day, count) in pending.items():
+            current = self._pending.setdefault(doc_id, [day, 0])
+            if current[0] == day:
+                current[1] += count
+
+    async def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.create_task(self._run(), name="rate-limiter-sync")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.sync()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.RATE_LIMIT_SYNC_INTERVAL)
+            await self.sync()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "tracked": self._states.currsize,
+            "maxsize": self._states.maxsize,
+            "pending": len(self._pending),
+            "denied": self.denied,
+            "synced": self.synced,
+            "failures": self.failures,
+        }
+
+
+rate_limiter = RateLimiter(maxsize=settings.RATE_LIMIT_MAX_KEYS, idle_ttl=settings.RATE_LIMIT_IDLE_TTL)
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+from typing import Optional
+
+from beanie import PydanticObjectId
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from src.config import settings
+from src.models import APIKeyDocument
+from src.shared import key_codec
+
+logger = logging.getLogger(__name__)
+
+
+class KeyRehasher:
+    """
+    Migrates keys to the active secret lazily, after a successful verification.
+
+    The raw key is only known while it is being verified: the new hash is
+    computed there once per key and written behind in batches, guarded by the
+    secret id it was verified with so a concurrent regeneration is never
+    overwritten. Keys already on the active secret cost nothing.
+    """
+
+    def __init__(self):
+        self.rehashed = 0
+        self.failures = 0
+        self._pending: dict[str, tuple[Optional[str], dict]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @staticmethod
+    def is_outdated(key_id: Optional[str], secret_id: Optional[str]) -> bool:
+        return key_id is None or key_codec.resolve(secret_id) != key_codec.active_id
+
+    def record(self, doc_id: str, raw_key: str, key_id: str, secret_id: Optional[str]) -> None:
+        if doc_id in self._pending:
+            return
+
+        update = {"hashed_key": key_codec.hash(raw_key, key_codec.active_id), "key_id": key_id, "secret_id": key_codec.active_id}
+        self._pending[doc_id] = (secret_id, update)
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+
+        pending, self._pending = self._pending, {}
+        operations = [
+            UpdateOne({"_id": PydanticObjectId(doc_id), "secret_id": secret_id}, {"$set": update})
+            for doc_id, (secret_id, update) in pending.items()
+        ]
+
+        written = 0
+        collection = APIKeyDocument.get_motor_collection()
+        for start in range(0, len(operations), settings.REHASH_BATCH_SIZE):
+            batch = operations[start : start + settings.REHASH_BATCH_SIZE]  # noqa: E203
+            try:
+                result = await collection.bulk_write(batch, ordered=False)
+            except PyMongoError as exc:
+                # Les clés non migrées le seront à leur prochaine vérification
+                self.failures += 1
+                logger.warning("Unable to re-hash %d API key(s): %r", len(batch), exc)
+                continue
+            written += result.modified_count
+
+        self.rehashed += written
+        return written
+
+    async def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.create_task(self._run(), name="key-rehasher")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.REHASH_FLUSH_INTERVAL)
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {"running": self.running, "pending": len(self._pending), "rehashed": self.rehashed, "failures": self.failures}
+
+
+key_rehasher = KeyRehasher()
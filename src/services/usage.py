@@ -0,0 +1,116 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+from beanie import PydanticObjectId
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from src.config import settings
+from src.models import APIKeyDocument
+
+logger = logging.getLogger(__name__)
+
+
+class UsageTracker:
+    """
+    Aggregates API key usage in memory and writes it behind with one bulk_write per interval.
+
+    Each verified key costs a dict update on the hot path; every key seen
+    during an interval is written at most once, with its last-seen
+    timestamp and the number of hits since the previous flush.
+    """
+
+    def __init__(self):
+        self.flushed = 0
+        self.failures = 0
+        self._usage: dict[str, list] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def record(self, doc_id: str) -> None:
+        if not settings.USE_USAGE_TRACKING:
+            return
+
+        now = datetime.now(timezone.utc)
+        if (usage := self._usage.get(doc_id)) is None:
+            self._usage[doc_id] = [now, 1]
+            if len(self._usage) >= settings.USAGE_TRACKER_MAX_KEYS and self._wakeup is not None:
+                self._wakeup.set()
+        else:
+            usage[0] = now
+            usage[1] += 1
+
+    async def flush(self) -> int:
+        if not self._usage:
+            return 0
+
+        usage, self._usage = self._usage, {}
+        operations = [
+            UpdateOne(
+                {"_id": PydanticObjectId(doc_id)},
+                {"$max": {"last_used_at": last_used_at}, "$inc": {"usage_count": hits}},
+            )
+            for doc_id, (last_used_at, hits) in usage.items()
+        ]
+
+        try:
+            await APIKeyDocument.get_motor_collection().bulk_write(operations, ordered=False)
+        except PyMongoError as exc:
+            self.failures += 1
+            logger.warning("Unable to flush the usage of %d API key(s): %r", len(operations), exc)
+            self._merge(usage)
+            return 0
+
+        self.flushed += len(operations)
+        return len(operations)
+
+    def _merge(self, usage: dict[str, list]) -> None:
+        # Réintégrer les compteurs non écrits sans écraser ceux enregistrés entre-temps
+        for doc_id, (last_used_at, hits) in usage.items():
+            if (current := self._usage.get(doc_id)) is None:
+                self._usage[doc_id] = [last_used_at, hits]
+            else:
+                current[0] = max(current[0], last_used_at)
+                current[1] += hits
+
+    async def start(self) -> None:
+        if not self.running:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name="usage-tracker")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._wakeup = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.USAGE_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "pending": len(self._usage),
+            "flushed": self.flushed,
+            "failures": self.failures,
+        }
+
+
+usage_tracker = UsageTracker()
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+from typing import Any, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from src.config import settings
+from src.models import APIKeyDocument
+from src.shared import verification_cache
+from .ratelimit import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# Champs qui changent un verdict ; usage_count, last_used_at et quota_used sont écrits en continu et ignorés
+WATCHED_FIELDS = (
+    "hashed_key",
+    "key_id",
+    "secret_id",
+    "user_id",
+    "is_active",
+    "expires_at",
+    "rate_limit",
+    "rate_limit_burst",
+    "daily_quota",
+)
+COLLECTION_EVENTS = ("drop", "rename", "dropDatabase", "invalidate")
+CHANGE_STREAM_PIPELINE = [
+    {
+        "$match": {
+            "$or": [
+                {"operationType": {"$in": ["delete", "replace", *COLLECTION_EVENTS]}},
+                *(
+                    {"operationType": "update", f"updateDescription.updatedFields.{field}": {"$exists": True}}
+                    for field in WATCHED_FIELDS
+                ),
+            ]
+        }
+    }
+]
+
+# Codes renvoyés par un mongod sans replica set et par un jeton de reprise sorti de l'oplog
+CHANGE_STREAM_UNSUPPORTED_CODES = {40573, 40324}
+CHANGE_STREAM_HISTORY_LOST_CODES = {260, 280, 286}
+
+
+class CacheInvalidationWatcher:
+    """
+    Evicts the local cache entries of API keys changed by any replica.
+
+    Subscribes to the change stream of the API keys collection and resumes
+    after the last seen event on reconnection. On a standalone mongod (or
+    mongomock) change streams are unavailable and the local caches fall back
+    to their TTL only.
+    """
+
+    def __init__(self):
+        self.available: Optional[bool] = None
+        self.events = 0
+        self.failures = 0
+        self._resume_token: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def handle(self, change: dict) -> None:
+        self.events += 1
+        if change["operationType"] in COLLECTION_EVENTS:
+            self._clear()
+            return
+
+        doc_id = change["documentKey"]["_id"]
+        verification_cache.invalidate(doc_id)
+        rate_limiter.forget(doc_id)
+
+    @staticmethod
+    def _clear() -> None:
+        verification_cache.clear()
+        rate_limiter.clear()
+
+    @staticmethod
+    async def _supports_change_streams(database: Any) -> bool:
+        try:
+            hello = await database.command("hello")
+        except (NotImplementedError, PyMongoError):
+            return False
+        return "setName" in hello or hello.get("msg") == "isdbgrid"
+
+    async def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.create_task(self._run(), name="cache-invalidation-watcher")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        collection = APIKeyDocument.get_motor_collection()
+        if not await self._supports_change_streams(collection.database):
+            self._fallback()
+            return
+
+        while True:
+            try:
+                async with collection.watch(CHANGE_STREAM_PIPELINE, resume_after=self._resume_token) as stream:
+                    self.available = True
+                    async for change in stream:
+                        self.handle(change)
+                        # Un flux invalidé ne peut pas être repris : repartir d'un nouveau flux
+                        self._resume_token = None if change["operationType"] == "invalidate" else stream.resume_token
+            except OperationFailure as exc:
+                if exc.code in CHANGE_STREAM_UNSUPPORTED_CODES:
+                    self._fallback()
+                    return
+                if exc.code in CHANGE_STREAM_HISTORY_LOST_CODES:
+                    # Des événements ont été perdus : le cache local n'est plus fiable
+                    self._resume_token = None
+                    self._clear()
+                self.failures += 1
+                logger.warning("API keys change stream failed: %r", exc)
+            except PyMongoError as exc:
+                self.failures += 1
+                logger.warning("API keys change stream interrupted: %r", exc)
+            await asyncio.sleep(settings.CHANGE_STREAM_RETRY_DELAY)
+
+    def _fallback(self) -> None:
+        self.available = False
+        logger.info("Change streams are unavailable, local caches rely on their TTL only")
+
+    def stats(self) -> dict:
+        return {"running": self.running, "available": self.available, "events": self.events, "failures": self.failures}
+
+
+cache_invalidation_watcher = CacheInvalidationWatcher()
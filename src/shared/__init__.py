@@ -1,3 +1,22 @@
+from .cache import auth_cache, AuthDecisionCache, verification_cache, VerificationCache  # noqa: F401
+from .codec import IssuedKey, KEY_ID_LENGTH, key_codec, KeyCodec, ParsedKey  # noqa: F401
 from .error_codes import APIKeyErrorCode  # noqa: F401
+from .export import EXPORT_MEDIA_TYPES, stream_export  # noqa: F401
+from .http_client import http_client, SharedHTTPClient  # noqa: F401
+from .metrics import (  # noqa: F401
+    auth_request_duration,
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    HistogramSeries,
+    hmac_duration,
+    metrics_registry,
+    metrics_snapshots,
+    MetricsMiddleware,
+    MetricsSnapshots,
+    mongo_lookup_duration,
+    StatsGauges,
+    verifications,
+)
+from .mongo import client_uri, pool_wait_listener, read_router  # noqa: F401
+from .permission import CheckAccessAllow, VerifyAccessToken  # noqa: F401
 from .url_patterns import *  # noqa: F401, F403
 from .utils import *  # noqa: F401, F403
@@ -0,0 +1,187 @@
+import base64
+import hashlib
+import json
+import time
+from typing import Any, Hashable, Optional
+
+from cachetools import TLRUCache
+
+from src.config import settings
+
+
+def digest(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def token_expiry(authorization: str) -> Optional[float]:
+    """
+    Reads the `exp` claim (epoch seconds) of a bearer JWT without verifying it, None if there is none
+    """
+
+    try:
+        payload = authorization.split()[-1].split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class StatsCache:
+    """
+    Base class of the in-process caches, counting hits and misses so they can be sized
+    """
+
+    def __init__(self, entries: TLRUCache, ttl: float, enabled: bool = True):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = entries
+
+    def _lookup(self, key: Hashable) -> Any:
+        if (entry := self._entries.get(key)) is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": self._entries.currsize,
+            "maxsize": self._entries.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class VerificationCache(StatsCache):
+    """
+    Bounded TTL/LRU cache of API key verification results, keyed by a digest of the presented key.
+
+    An entry never outlives the expiry date of the key it was resolved from.
+    A reverse index from document id to cache keys makes an invalidation cost
+    the number of entries of that document, not the size of the cache. Entries
+    evicted by the cache itself leave stale keys in the index, which is rebuilt
+    once it holds twice as many keys as the cache.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, enabled: bool = True):
+        super().__init__(TLRUCache(maxsize=maxsize, ttu=self._time_to_use, timer=time.time), ttl=ttl, enabled=enabled)
+        self._keys_by_doc: dict[str, set[str]] = {}
+        self._indexed = 0
+
+    def _time_to_use(self, key: str, value: tuple, now: float) -> float:
+        expires_at = value[3]
+        return min(now + self.ttl, expires_at) if expires_at is not None else now + self.ttl
+
+    @staticmethod
+    def digest(apikey: str) -> str:
+        return digest(apikey)
+
+    def get(self, apikey: str) -> Optional[tuple[dict, str, Any]]:
+        """
+        Returns the cached result, the id of the document it was resolved from and its rate limit policy
+        """
+
+        if not self.enabled:
+            return None
+
+        entry = self._lookup(self.digest(apikey))
+        return entry[:3] if entry is not None else None
+
+    def set(self, apikey: str, result: dict, doc_id: Any, policy: Any = None, expires_at: Optional[float] = None) -> None:
+        if not self.enabled:
+            return
+
+        key, doc_id = self.digest(apikey), str(doc_id)
+        self._entries[key] = (result, doc_id, policy, expires_at)
+        keys = self._keys_by_doc.setdefault(doc_id, set())
+        if key not in keys:
+            keys.add(key)
+            self._indexed += 1
+            if self._indexed > 2 * self._entries.maxsize:
+                self._reindex()
+
+    def _reindex(self) -> None:
+        # Oublier les clés déjà évincées par le cache (expiration ou LRU)
+        self._keys_by_doc = {}
+        for key, (_, doc_id, *_) in list(self._entries.items()):
+            self._keys_by_doc.setdefault(doc_id, set()).add(key)
+        self._indexed = self._entries.currsize
+
+    def invalidate(self, *doc_ids: Any) -> int:
+        """
+        Evict every cached result that was resolved from one of the given documents
+        """
+
+        evicted = 0
+        for doc_id in {str(doc_id) for doc_id in doc_ids}:
+            keys = self._keys_by_doc.pop(doc_id, ())
+            self._indexed -= len(keys)
+            for key in keys:
+                if (entry := self._entries.get(key)) is not None and entry[1] == doc_id:
+                    del self._entries[key]
+                    evicted += 1
+        return evicted
+
+    def clear(self) -> None:
+        super().clear()
+        self._keys_by_doc.clear()
+        self._indexed = 0
+
+
+class AuthDecisionCache(StatsCache):
+    """
+    Bounded cache of the auth service answers, keyed by a digest of the bearer token.
+
+    An entry never outlives the `exp` claim of the token it was resolved for.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, enabled: bool = True):
+        super().__init__(TLRUCache(maxsize=maxsize, ttu=self._time_to_use, timer=time.time), ttl=ttl, enabled=enabled)
+
+    def _time_to_use(self, key: tuple, value: tuple, now: float) -> float:
+        expires_at = value[1]
+        return min(now + self.ttl, expires_at) if expires_at is not None else now + self.ttl
+
+    @staticmethod
+    def key(authorization: str, *scope: Hashable) -> tuple:
+        return (digest(authorization), *scope)
+
+    def get(self, authorization: str, *scope: Hashable) -> Any:
+        if not self.enabled or not authorization:
+            return None
+
+        entry = self._lookup(self.key(authorization, *scope))
+        return entry[0] if entry is not None else None
+
+    def set(self, authorization: str, value: Any, *scope: Hashable) -> None:
+        if not self.enabled or not authorization:
+            return
+
+        expires_at = token_expiry(authorization)
+        if expires_at is not None and expires_at <= time.time():
+            return
+
+        self._entries[self.key(authorization, *scope)] = (value, expires_at)
+
+
+verification_cache = VerificationCache(
+    maxsize=settings.VERIFY_CACHE_MAXSIZE,
+    ttl=settings.VERIFY_CACHE_TTL,
+    enabled=settings.USE_VERIFY_CACHE,
+)
+
+auth_cache = AuthDecisionCache(
+    maxsize=settings.AUTH_CACHE_MAXSIZE,
+    ttl=settings.AUTH_CACHE_TTL,
+    enabled=settings.USE_AUTH_CACHE,
+)
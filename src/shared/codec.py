@@ -0,0 +1,148 @@
+import hashlib
+import secrets
+from hmac import compare_digest, HMAC
+from typing import NamedTuple, Optional, Union
+
+from beanie import PydanticObjectId
+
+from src.config import settings
+
+KEY_ID_LENGTH = 16
+# Octets aléatoires de la clé qui ne sont jamais publiés (le key_id est affiché et sert à la recherche)
+MIN_SECRET_BYTES = 16
+
+
+class ParsedKey(NamedTuple):
+    raw_key: str
+    user_id: str
+    key_id: str
+
+
+class IssuedKey(NamedTuple):
+    api_key: str
+    hashed_key: str
+    key_id: str
+    secret_id: str
+
+
+class KeyCodec:
+    """
+    Generates, parses and hashes API keys with state computed once.
+
+    The prefix and the expected secret length are resolved at construction and
+    every secret of the keyring gets a pre-keyed HMAC template: hashing a key
+    copies the template of its secret instead of re-encoding the secret and
+    re-deriving the HMAC pads on every call.
+
+    Each key stores the id of the secret that hashed it and is looked up by its
+    `key_id` (the first characters of its random part), so the secret is picked
+    in O(1) and a key still resolves after being re-hashed with another secret.
+    The key_id is public, so it is drawn apart from the secret bytes that
+    follow it, and the codec refuses a length leaving fewer than
+    MIN_SECRET_BYTES of them.
+    """
+
+    __slots__ = ("prefix", "active_id", "legacy_id", "_prefix_length", "_secret_length", "_token_bytes", "_hmacs")
+
+    def __init__(self, prefix: str, keyring: dict[str, str], active_id: str, legacy_id: str, token_hex_length: int):
+        if active_id not in keyring or legacy_id not in keyring:
+            raise ValueError(f"Unknown secret id, the keyring holds {sorted(keyring)}")
+        if token_hex_length - KEY_ID_LENGTH // 2 < MIN_SECRET_BYTES:
+            raise ValueError(
+                f"TOKEN_SECRET_HEX_LENGTH must be at least {KEY_ID_LENGTH // 2 + MIN_SECRET_BYTES}: "
+                f"the first {KEY_ID_LENGTH} hex characters of a key are its public key_id"
+            )
+
+        self.prefix = prefix
+        self.active_id = active_id
+        self.legacy_id = legacy_id
+        self._prefix_length = len(prefix)
+        self._token_bytes = token_hex_length
+        self._secret_length = token_hex_length * 2
+        self._hmacs = {
+            secret_id: HMAC(key=secret.encode("utf-8"), digestmod=hashlib.sha256) for secret_id, secret in keyring.items()
+        }
+
+    @classmethod
+    def from_settings(cls) -> "KeyCodec":
+        environment = "live" if settings.USE_LIVE_CLIENT else "test"
+        return cls(
+            prefix=f"{settings.API_KEY_PREFIX}_{environment}_",
+            keyring={**settings.SECRET_KEYRING, settings.SECRET_KEY_ID: settings.SECRET_KEY_HASHED},
+            active_id=settings.ACTIVE_SECRET_ID or settings.SECRET_KEY_ID,
+            legacy_id=settings.SECRET_KEY_ID,
+            token_hex_length=settings.TOKEN_SECRET_HEX_LENGTH,
+        )
+
+    def resolve(self, secret_id: Optional[str]) -> str:
+        """
+        Id of the secret of a key, keys stored without one were hashed with SECRET_KEY_HASHED
+        """
+
+        return secret_id or self.legacy_id
+
+    def hash(self, raw_key: str, secret_id: Optional[str] = None) -> str:
+        """
+        Computes the HMAC of a raw API key (without prefix), as stored in `hashed_key`
+        """
+
+        mac = self._hmacs[self.resolve(secret_id)].copy()
+        mac.update(raw_key.encode("utf-8"))
+        return mac.hexdigest()
+
+    def matches(self, raw_key: str, secret_id: Optional[str], stored_hash: str) -> bool:
+        if self.resolve(secret_id) not in self._hmacs:
+            return False
+        return compare_digest(self.hash(raw_key, secret_id), stored_hash)
+
+    def issue(self, user_id: Union[str, PydanticObjectId]) -> IssuedKey:
+        key_id = secrets.token_hex(KEY_ID_LENGTH // 2)
+        raw_key = f"{key_id}{secrets.token_hex(self._token_bytes - KEY_ID_LENGTH // 2)}{user_id}"
+        return IssuedKey(
+            api_key=f"{self.prefix}{raw_key}",
+            hashed_key=self.hash(raw_key, self.active_id),
+            key_id=key_id,
+            secret_id=self.active_id,
+        )
+
+    def generate(self, user_id: Union[str, PydanticObjectId]) -> tuple[str, str]:
+        issued = self.issue(user_id)
+        return issued.api_key, issued.hashed_key
+
+    def mask(self, key_id: str) -> str:
+        """
+        Displayable form of a key whose plaintext is not stored, built from its public key_id
+        """
+
+        return f"{self.prefix}{key_id}{'*' * 8}"
+
+    def split(self, key: str) -> Optional[tuple[str, str]]:
+        """
+        Checks the format of a key and returns its raw part and user id, None if it is malformed
+        """
+
+        if not key.startswith(self.prefix) or len(key) <= self._prefix_length + self._secret_length:
+            return None
+
+        raw_key = key[self._prefix_length :]  # noqa: E203
+        return raw_key, raw_key[self._secret_length :]  # noqa: E203
+
+    def parse(self, key: str) -> Optional[ParsedKey]:
+        """
+        Validates and splits a key in one pass, None if it is malformed
+        """
+
+        if (parts := self.split(key)) is None:
+            return None
+
+        raw_key, user_id = parts
+        return ParsedKey(raw_key=raw_key, user_id=user_id, key_id=raw_key[:KEY_ID_LENGTH])
+
+    def verify(self, key: str, stored_hash: str, secret_id: Optional[str] = None) -> tuple[bool, Optional[str]]:
+        if (parsed := self.parse(key)) is None:
+            return False, None
+
+        return self.matches(parsed.raw_key, secret_id, stored_hash), parsed.user_id
+
+
+key_codec = KeyCodec.from_settings()
@@ -3,3 +3,7 @@ from enum import StrEnum
 
 class APIKeyErrorCode(StrEnum):
     CANNOT_ACCESS_RESOURCE = "resource/cannot-access-resource"
+    AUTH_SERVICE_UNAVAILABLE = "auth/service-unavailable"
+    INVALID_CURSOR = "pagination/invalid-cursor"
+    BULK_DUPLICATE_KEY = "bulk/duplicate-key"
+    BULK_WRITE_ERROR = "bulk/write-error"
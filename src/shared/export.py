@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Literal
+
+from bson import ObjectId
+from fastapi import Request
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from .codec import key_codec
+
+EXPORT_FIELDS = [
+    "_id",
+    "user_id",
+    "api_key",
+    "is_active",
+    "usage_count",
+    "last_used_at",
+    "expires_at",
+    "created_at",
+    "updated_at",
+]
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _serialize(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return value
+
+
+def _display(doc: dict) -> dict:
+    # Sans clé brute stockée, exporter sa forme masquée
+    if doc.get("api_key") is None and doc.get("key_id"):
+        doc["api_key"] = key_codec.mask(doc["key_id"])
+    return doc
+
+
+def _render(docs: list[dict], export_format: Literal["ndjson", "csv"]) -> str:
+    docs = [_display(doc) for doc in docs]
+    if export_format == "ndjson":
+        return "".join(json.dumps({key: _serialize(value) for key, value in doc.items()}) + "\n" for doc in docs)
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+    writer.writerows({key: _serialize(value) for key, value in doc.items()} for doc in docs)
+    return buffer.getvalue()
+
+
+async def stream_export(
+    request: Request,
+    collection: AsyncIOMotorCollection,
+    query: dict,
+    sort: list[tuple[str, int]],
+    export_format: Literal["ndjson", "csv"],
+    batch_size: int,
+) -> AsyncIterator[str]:
+    """
+    Streams the matching documents batch by batch from a server-side cursor, `hashed_key` is never read.
+
+    At most one batch is held in memory and the cursor is closed as soon as the client goes away.
+    """
+
+    cursor = collection.find(query, projection={"hashed_key": False}, sort=sort, batch_size=batch_size)
+    try:
+        if export_format == "csv":
+            yield ",".join(EXPORT_FIELDS) + "\r\n"
+
+        batch = []
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) < batch_size:
+                continue
+
+            if await request.is_disconnected():
+                return
+            yield _render(batch, export_format)
+            batch = []
+
+        if batch:
+            yield _render(batch, export_format)
+    finally:
+        await cursor.close()
@@ -0,0 +1,61 @@
+import asyncio
+from importlib.util import find_spec
+from typing import Optional
+
+import httpx
+
+from src.config import settings
+
+
+class SharedHTTPClient:
+    """
+    Long-lived pooled HTTP client used for every call to the auth and trailhub services.
+
+    It is opened in the application lifespan and lazily on first use, so that
+    code running outside of it (tests, CLI) still gets a working client.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_slots: dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def http2(self) -> bool:
+        return bool(settings.HTTP_CLIENT_HTTP2) and find_spec("h2") is not None
+
+    async def start(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(settings.HTTP_CLIENT_TIMEOUT, connect=settings.HTTP_CLIENT_CONNECT_TIMEOUT),
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._host_slots.clear()
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        client = await self.start()
+        host = httpx.URL(url).host
+        if (slots := self._host_slots.get(host)) is None:
+            slots = self._host_slots[host] = asyncio.Semaphore(settings.HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST)
+
+        async with slots:
+            return await client.request(method, url, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+
+http_client = SharedHTTPClient()
@@ -0,0 +1,386 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Callable, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Instantané des workers arrêtés, repliés en un seul fichier : pid 0 n'est jamais celui d'un worker
+RETIRED_SNAPSHOT, RETIRED_PID = "retired", 0
+
+
+def _format_labels(label_names: tuple[str, ...], values: tuple, extra: Optional[tuple[str, str]] = None) -> str:
+    pairs = list(zip(label_names, values)) + ([extra] if extra is not None else [])
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class CounterSeries:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dump(self) -> float:
+        return self.value
+
+    def absorb(self, state: float) -> None:
+        self.value += state
+
+
+class HistogramSeries:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def since(self, start: float) -> None:
+        self.observe(time.perf_counter() - start)
+
+    def dump(self) -> list:
+        return [self.counts, self.sum]
+
+    def absorb(self, state: list) -> None:
+        counts, total = state
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, counts)]
+        self.sum += total
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._series: dict[tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        """
+        Returns the series of the given label values, created once: hot paths keep the returned object
+        """
+
+        if (series := self._series.get(values)) is None:
+            series = self._series[values] = self._new_series()
+        return series
+
+    def _new_series(self):
+        raise NotImplementedError
+
+    def render(self, series: Optional[dict] = None) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, item in list((self._series if series is None else series).items()):
+            lines.extend(self._render_series(values, item))
+        return lines
+
+    def snapshot(self) -> list:
+        return [[list(values), series.dump()] for values, series in list(self._series.items())]
+
+    def fold(self, snapshots: list[dict]) -> list:
+        return [[list(values), series.dump()] for values, series in self._merge(snapshots).items()]
+
+    def render_snapshots(self, snapshots: dict[int, dict]) -> list[str]:
+        return self.render(self._merge(snapshots.values()))
+
+    def _merge(self, snapshots) -> dict:
+        # Compteurs et histogrammes s'additionnent entre processus, y compris ceux des workers recyclés
+        merged: dict[tuple[str, ...], object] = {}
+        for snapshot in snapshots:
+            for values, state in snapshot.get(self.name, []):
+                if (series := merged.get(key := tuple(values))) is None:
+                    series = merged[key] = self._new_series()
+                series.absorb(state)
+        return merged
+
+    def _render_series(self, values: tuple[str, ...], series) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_series(self) -> CounterSeries:
+        return CounterSeries()
+
+    def _render_series(self, values: tuple[str, ...], series: CounterSeries) -> list[str]:
+        return [f"{self.name}_total{_format_labels(self.label_names, values)} {series.value}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+
+    def _new_series(self) -> HistogramSeries:
+        return HistogramSeries(self.buckets)
+
+    def _render_series(self, values: tuple[str, ...], series: HistogramSeries) -> list[str]:
+        lines, cumulative = [], 0
+        for bound, count in zip((*self.buckets, "+Inf"), series.counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, values, ('le', bound))} {cumulative}")
+        labels = _format_labels(self.label_names, values)
+        lines.append(f"{self.name}_sum{labels} {series.sum}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class StatsGauges:
+    """
+    Exposes the numeric fields of the components `stats()` as gauges, read at scrape time only
+    """
+
+    def __init__(self, prefix: str, sources: dict[str, Callable[[], dict]]):
+        self.name = self.prefix = prefix
+        self.sources = sources
+
+    def snapshot(self) -> dict[str, float]:
+        gauges = {}
+        for component, stats in self.sources.items():
+            for field, value in stats().items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, (int, float)):
+                    gauges[f"{self.prefix}_{component}_{field}"] = value
+        return gauges
+
+    def render(self) -> list[str]:
+        return [line for name, value in self.snapshot().items() for line in (f"# TYPE {name} gauge", f"{name} {value}")]
+
+    def fold(self, snapshots: list[dict]) -> dict:
+        # Les jauges d'un worker arrêté ne décrivent plus rien
+        return {}
+
+    def render_snapshots(self, snapshots: dict[int, dict]) -> list[str]:
+        # Une jauge ne s'additionne pas : une série par worker vivant
+        lines = []
+        for name in dict.fromkeys(name for snapshot in snapshots.values() for name in snapshot.get(self.name, {})):
+            lines.append(f"# TYPE {name} gauge")
+            for pid, snapshot in sorted(snapshots.items()):
+                if pid != RETIRED_PID and _process_alive(pid) and (value := snapshot.get(self.name, {}).get(name)) is not None:
+                    lines.append(f"{name}{_format_labels(('pid',), (pid,))} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.enabled = settings.USE_METRICS
+        self._collectors: list = []
+
+    def register(self, collector):
+        self._collectors.append(collector)
+        return collector
+
+    def render(self) -> str:
+        lines = []
+        for collector in self._collectors:
+            lines.extend(collector.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        return {collector.name: collector.snapshot() for collector in self._collectors}
+
+    def fold(self, snapshots: list[dict]) -> dict:
+        return {collector.name: collector.fold(snapshots) for collector in self._collectors}
+
+    def render_snapshots(self, snapshots: dict[int, dict]) -> str:
+        lines = []
+        for collector in self._collectors:
+            lines.extend(collector.render_snapshots(snapshots))
+        return "\n".join(lines) + "\n"
+
+
+class MetricsSnapshots:
+    """
+    Shares the metrics of the `serve` workers through METRICS_MULTIPROCESS_DIR.
+
+    Each worker writes its registry to `<pid>.json` every METRICS_SNAPSHOT_INTERVAL
+    and before answering a scrape, so whichever worker is scraped renders the
+    counters and histograms summed over every process and the gauges of each
+    live worker. The snapshots of dead workers are folded into `retired.json`.
+    Without the directory the registry of the process is rendered.
+    """
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def directory(self) -> Optional[Path]:
+        return Path(settings.METRICS_MULTIPROCESS_DIR) if settings.METRICS_MULTIPROCESS_DIR else None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def dump(self) -> str:
+        # Lu dans la boucle : les séries ne changent pas pendant la copie
+        return json.dumps(self.registry.snapshot())
+
+    def write(self, payload: str, name: Optional[str] = None) -> None:
+        path = self.directory / f"{name or os.getpid()}.json"
+        # Écrire puis renommer : un worker qui agrège ne lit jamais un fichier à moitié écrit
+        partial = path.with_suffix(".tmp")
+        partial.write_text(payload, encoding="utf-8")
+        os.replace(partial, path)
+
+    def read(self) -> dict[int, dict]:
+        snapshots = {}
+        for path in self.directory.glob("*.json"):
+            try:
+                pid = RETIRED_PID if path.stem == RETIRED_SNAPSHOT else int(path.stem)
+                snapshots[pid] = json.loads(path.read_text(encoding="utf-8"))
+            except (ValueError, OSError) as exc:
+                logger.warning("Skipping the metrics snapshot %s: %r", path, exc)
+        return snapshots
+
+    def fold(self, reclaim: bool = False) -> dict[int, dict]:
+        """
+        Folds the snapshots of dead workers into `retired.json`, deletes them and returns what is left.
+
+        With `reclaim` the snapshot left under the pid of this process is folded
+        too: a recycled pid must not overwrite the totals of its previous worker.
+        """
+
+        # Les workers replient sous un verrou de fichier : un même instantané n'est jamais compté deux fois
+        with open(self.directory / ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            snapshots = self.read()
+            retired = [
+                pid for pid in snapshots if pid != RETIRED_PID and (reclaim if pid == os.getpid() else not _process_alive(pid))
+            ]
+            if not retired:
+                return snapshots
+
+            folded = self.registry.fold([snapshots[pid] for pid in (RETIRED_PID, *retired) if pid in snapshots])
+            self.write(json.dumps(folded), name=RETIRED_SNAPSHOT)
+            for pid in retired:
+                (self.directory / f"{pid}.json").unlink(missing_ok=True)
+
+        return {pid: snapshot for pid, snapshot in snapshots.items() if pid not in retired} | {RETIRED_PID: folded}
+
+    async def render(self) -> str:
+        if self.directory is None:
+            return self.registry.render()
+
+        await asyncio.to_thread(self.write, self.dump())
+        return self.registry.render_snapshots(await asyncio.to_thread(self.fold))
+
+    async def start(self) -> None:
+        if self.directory is not None and not self.running:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            await asyncio.to_thread(self.fold, True)
+            self._task = asyncio.create_task(self._run(), name="metrics-snapshots")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Les compteurs d'un worker arrêté restent comptés dans les scrapes suivants
+        await asyncio.to_thread(self.write, self.dump())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.to_thread(self.write, self.dump())
+            await asyncio.sleep(settings.METRICS_SNAPSHOT_INTERVAL)
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+metrics_registry = MetricsRegistry()
+metrics_snapshots = MetricsSnapshots(metrics_registry)
+
+http_request_duration = metrics_registry.register(
+    Histogram("apikey_http_request_duration_seconds", "HTTP request latency by route", ("method", "route"))
+)
+mongo_lookup_duration = metrics_registry.register(
+    Histogram("apikey_mongo_lookup_duration_seconds", "MongoDB lookup latency of the verification paths", ("operation",))
+)
+hmac_duration = metrics_registry.register(
+    Histogram(
+        "apikey_hmac_duration_seconds",
+        "HMAC computation latency of a presented key",
+        buckets=(1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 1e-3),
+    )
+)
+auth_request_duration = metrics_registry.register(
+    Histogram("apikey_auth_request_duration_seconds", "Latency of the calls to the auth service", ("call",))
+)
+verifications = metrics_registry.register(Counter("apikey_verifications", "API key verifications by outcome", ("result",)))
+mongo_pool_wait_duration = metrics_registry.register(
+    Histogram("apikey_mongo_pool_wait_duration_seconds", "Time spent waiting for a pooled MongoDB connection")
+)
+mongo_pool_checkout_failures = metrics_registry.register(
+    Counter("apikey_mongo_pool_checkout_failures", "MongoDB connection checkouts that failed, by reason", ("reason",))
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request by method and matched route template.
+
+    Series are cached per route and method, a request costs two perf_counter
+    calls, two dict lookups and a bucket increment.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._series: dict[str, dict[str, HistogramSeries]] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not metrics_registry.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            self._route_series(path, scope["method"]).since(start)
+
+    def _route_series(self, path: str, method: str) -> HistogramSeries:
+        if (by_method := self._series.get(path)) is None:
+            by_method = self._series[path] = {}
+        if (series := by_method.get(method)) is None:
+            series = by_method[method] = http_request_duration.labels(method, path)
+        return series
@@ -0,0 +1,121 @@
+from typing import Any
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from pymongo import monitoring
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+
+from src.config import settings
+from .metrics import mongo_pool_checkout_failures, mongo_pool_wait_duration
+
+READ_PREFERENCES = {
+    "primary": Primary(),
+    "primaryPreferred": PrimaryPreferred(),
+    "secondary": Secondary(),
+    "secondaryPreferred": SecondaryPreferred(),
+    "nearest": Nearest(),
+}
+
+_POOL_WAIT = mongo_pool_wait_duration.labels()
+
+
+def client_options() -> dict[str, str]:
+    """
+    Connection pool, timeout and compression options set in the settings, as MongoDB URI options
+    """
+
+    options = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "waitQueueTimeoutMS": settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "compressors": settings.MONGO_COMPRESSORS,
+    }
+    return {name: str(value) for name, value in options.items() if value is not None}
+
+
+def client_uri(uri: str) -> str:
+    """
+    Adds the client options to the URI, those of the settings replace the ones already in it
+    """
+
+    if not (options := client_options()):
+        return uri
+
+    parts = urlsplit(uri)
+    query = {name: value for name, value in parse_qsl(parts.query) if name not in options}
+    return urlunsplit(parts._replace(query=urlencode({**query, **options})))
+
+
+class ReadRouter:
+    """
+    Gives read-only operations a collection bound to their read preference.
+
+    The collections are derived once per operation and rebuilt only when the
+    models are bound to another database or the preference changes. Operations without a configured
+    preference read the primary through the model collection itself. Reads that may hit a secondary
+    can lag behind a write, callers must not cache what they derive from them.
+    """
+
+    def __init__(self):
+        self._collections: dict[str, tuple[Any, str, Any]] = {}
+
+    def reads_primary(self, operation: str) -> bool:
+        return settings.MONGO_READ_PREFERENCES.get(operation, "primary") == "primary"
+
+    def collection(self, document: Any, operation: str) -> Any:
+        base = document.get_motor_collection()
+        mode = settings.MONGO_READ_PREFERENCES.get(operation, "primary")
+        if (cached := self._collections.get(operation)) is not None and cached[0] is base and cached[1] == mode:
+            return cached[2]
+
+        collection = base if mode == "primary" else base.with_options(read_preference=READ_PREFERENCES[mode])
+        self._collections[operation] = (base, mode, collection)
+        return collection
+
+
+class PoolWaitListener(monitoring.ConnectionPoolListener):
+    """
+    Records the time spent waiting for a pooled connection, to size maxPoolSize
+    """
+
+    def connection_checked_out(self, event: monitoring.ConnectionCheckedOutEvent) -> None:
+        _POOL_WAIT.observe(event.duration)
+
+    def connection_check_out_failed(self, event: monitoring.ConnectionCheckOutFailedEvent) -> None:
+        _POOL_WAIT.observe(event.duration)
+        mongo_pool_checkout_failures.labels(event.reason).inc()
+
+    def connection_check_out_started(self, event) -> None:
+        pass
+
+    def connection_checked_in(self, event) -> None:
+        pass
+
+    def connection_created(self, event) -> None:
+        pass
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def connection_closed(self, event) -> None:
+        pass
+
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        pass
+
+    def pool_closed(self, event) -> None:
+        pass
+
+
+read_router = ReadRouter()
+pool_wait_listener = PoolWaitListener()
+
+if settings.USE_METRICS:
+    # Un écouteur global s'applique à tout client créé ensuite, dont celui de startup_db_client
+    monitoring.register(pool_wait_listener)
@@ -0,0 +1,91 @@
+import time
+from typing import Set
+
+import httpx
+from fastapi import Header, status
+
+from src.common.helpers.error_codes import AppErrorCode
+from src.common.helpers.exception import CustomHTTPException
+from .cache import auth_cache
+from .error_codes import APIKeyErrorCode
+from .http_client import http_client
+from .metrics import auth_request_duration, HistogramSeries
+
+
+def _access_denied() -> CustomHTTPException:
+    return CustomHTTPException(
+        code_error=AppErrorCode.AUTH_ACCESS_DENIED,
+        message_error="Access denied",
+        status_code=status.HTTP_403_FORBIDDEN,
+    )
+
+
+async def _call_auth_service(url: str, authorization: str, timer: HistogramSeries, **kwargs) -> httpx.Response:
+    token = authorization.split()[-1] if authorization else None
+    if not token or token in ["null", "undefined"]:
+        raise _access_denied()
+
+    start = time.perf_counter()
+    try:
+        return await http_client.get(url, headers={"Authorization": authorization}, **kwargs)
+    except httpx.HTTPError as exc:
+        raise CustomHTTPException(
+            code_error=APIKeyErrorCode.AUTH_SERVICE_UNAVAILABLE,
+            message_error=f"Authentication service unavailable: {exc.__class__.__name__}",
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        ) from exc
+    finally:
+        timer.since(start)
+
+
+def _json_object(response: httpx.Response) -> dict:
+    # Une réponse illisible ou d'une autre forme ne vaut jamais autorisation
+    try:
+        body = response.json()
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+class CheckAccessAllow:
+    """
+    Permission check answered from the auth decision cache, the auth service is only called on a miss
+    """
+
+    def __init__(self, url: str, permissions: Set[str]):
+        self.url = url
+        self.permissions = permissions
+        self._timer = auth_request_duration.labels("check_access")
+
+    async def __call__(self, authorization: str = Header(...)):
+        scope = (self.url, frozenset(self.permissions))
+        if (allowed := auth_cache.get(authorization, *scope)) is not None:
+            return allowed
+
+        response = await _call_auth_service(self.url, authorization, self._timer, params={"permission": sorted(self.permissions)})
+        if not response.is_success or not _json_object(response).get("access", False):
+            raise _access_denied()
+
+        auth_cache.set(authorization, True, *scope)
+        return True
+
+
+class VerifyAccessToken:
+    """
+    Token validation answered from the auth decision cache, the auth service is only called on a miss
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self._timer = auth_request_duration.labels("verify_token")
+
+    async def __call__(self, authorization: str = Header(...)):
+        if (token_info := auth_cache.get(authorization, self.url)) is not None:
+            return token_info
+
+        response = await _call_auth_service(self.url, authorization, self._timer)
+        if not response.is_success or not (token_info := _json_object(response)).get("active", False):
+            raise _access_denied()
+
+        auth_cache.set(authorization, token_info, self.url)
+        return token_info
@@ -0,0 +1,35 @@
+import logging
+
+import httpx
+from fastapi import Request
+
+from .http_client import http_client
+
+logger = logging.getLogger(__name__)
+
+
+def build_event(request: Request, source: str, message: str, user_id: str) -> dict:
+    return {
+        "source": source,
+        "message": message,
+        "user_id": user_id,
+        "ip_address": request.client.host if request.client else None,
+        "user_agent": request.headers.get("user-agent"),
+    }
+
+
+async def post_event(trailhub_url: str, event: dict, authorization: str | None = None) -> bool:
+    """
+    Posts one activity log to trailhub through the shared HTTP client, returns whether it was accepted
+    """
+
+    headers = {"Authorization": authorization} if authorization else {}
+    try:
+        response = await http_client.post(trailhub_url, json=event, headers=headers)
+    except httpx.HTTPError as exc:
+        logger.warning("Unable to ship an activity log to %s: %r", trailhub_url, exc)
+        return False
+
+    if not response.is_success:
+        logger.warning("Trailhub rejected an activity log with status %d", response.status_code)
+    return response.is_success
@@ -1,13 +1,20 @@
-import hashlib
-import secrets
-from hmac import compare_digest, HMAC
+import base64
+import binascii
+import json
+from datetime import datetime
 from typing import Optional, Union
 
 from beanie import Document, PydanticObjectId
+from bson.errors import InvalidId
+from fastapi import status
+from pymongo import DESCENDING
+from slugify import slugify
 
 from src.common.helpers.error_codes import AppErrorCode
 from src.common.helpers.exception import CustomHTTPException
 from src.config import settings
+from .codec import key_codec
+from .error_codes import APIKeyErrorCode
 
 
 def generate_api_key(user_id: Union[str, PydanticObjectId]) -> tuple[str, str]:
@@ -15,62 +22,45 @@ def generate_api_key(user_id: Union[str, PydanticObjectId]) -> tuple[str, str]:
     Generates both raw and hashed API key
     """
 
-    # Générer la clé brute avec user_id
-    raw_key = f"{secrets.token_hex(settings.TOKEN_SECRET_HEX_LENGTH)}{str(user_id)}"
-
-    # Créer la version complète avec préfixe
-    prefix = f"{settings.API_KEY_PREFIX}_live_" if settings.USE_LIVE_CLIENT else f"{settings.API_KEY_PREFIX}_test_"
-    final_api_key = f"{prefix}{raw_key}"
-
-    # Créer la version hashée pour stockage
-    secret_bytes = settings.SECRET_KEY_HASHED.encode("utf-8")
-    hmac_obj = HMAC(key=secret_bytes, msg=raw_key.encode("utf-8"), digestmod=hashlib.sha256)
-    hashed_key = hmac_obj.hexdigest()
-
-    return final_api_key, hashed_key
+    return key_codec.generate(user_id)
 
 
 def parse_api_key(key: str):
     """
     Parse and validate API key format
     """
-    prefix = f"{settings.API_KEY_PREFIX}_live_" if settings.USE_LIVE_CLIENT else f"{settings.API_KEY_PREFIX}_test_"
 
-    if not key.startswith(prefix):
+    if (parts := key_codec.split(key)) is None:
         return False, None, None
 
-    raw_key = key[len(prefix) :]  # noqa: E203
-    expected_length = settings.TOKEN_SECRET_HEX_LENGTH * 2
-
-    if len(raw_key) <= expected_length:
-        return False, None, None
-
-    user_id = raw_key[expected_length:]
+    raw_key, user_id = parts
     return True, raw_key, user_id
 
 
-def verify_api_key(provided_key: str, stored_hash: str):
+def verify_api_key(provided_key: str, stored_hash: str, secret_id: Optional[str] = None):
     """
-    Verifies a provided API key against stored key
+    Verifies a provided API key against stored key, hashed with the secret of `secret_id`
     """
 
-    # Valider format et extraire les composants
-    is_valid, raw_key, user_id = parse_api_key(provided_key)
-    if not is_valid:
-        return False, None
+    return key_codec.verify(provided_key, stored_hash, secret_id)
 
-    secret_bytes = settings.SECRET_KEY_HASHED.encode("utf-8")
-    calculated_hash = HMAC(key=secret_bytes, msg=raw_key.encode("utf-8"), digestmod=hashlib.sha256).hexdigest()
 
-    return compare_digest(calculated_hash, stored_hash), user_id
+def ownership_scope(user_info: dict) -> dict:
+    """
+    Query restricting a write to the keys the user may manage: every key for a super admin, their own keys otherwise
+    """
+
+    if (user_info.get("role") or {}).get("slug") == slugify(settings.ROLE_SUPER_ADMIN):
+        return {}
+    return {"user_id": user_info.get("_id")}
 
 
-async def find_document(document: type[Document], query: dict, status_code) -> Optional[Document]:
+async def find_document(document: type[Document], query: dict, status_code, projection: Optional[dict] = None) -> dict:
     """
-    Check if document exists in the database
+    Check if document exists in the database, returned as a raw document without model hydration
     """
 
-    if (doc := await document.find_one(query)) is None:
+    if (doc := await document.get_motor_collection().find_one(query, projection)) is None:
         raise CustomHTTPException(
             code_error=AppErrorCode.DOCUMENT_NOT_FOUND,
             message_error="Document not found",
@@ -78,3 +68,68 @@ async def find_document(document: type[Document], query: dict, status_code) -> O
         )
 
     return doc
+
+
+def encode_cursor(doc: dict, direction: str) -> str:
+    """
+    Builds an opaque cursor pointing at the (created_at, _id) position of a raw document
+    """
+
+    position = {"created_at": doc["created_at"].isoformat(), "id": str(doc["_id"]), "direction": direction}
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, PydanticObjectId, str]:
+    """
+    Reads back a cursor built by `encode_cursor`
+    """
+
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        direction = position["direction"]
+        if direction not in ("next", "prev"):
+            raise ValueError(direction)
+        return datetime.fromisoformat(position["created_at"]), PydanticObjectId(position["id"]), direction
+    except (binascii.Error, InvalidId, KeyError, TypeError, ValueError):
+        raise CustomHTTPException(
+            code_error=APIKeyErrorCode.INVALID_CURSOR,
+            message_error="Invalid pagination cursor",
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+
+
+async def paginate_by_cursor(document: type[Document], query: dict, sort: int, size: int, cursor: Optional[str]) -> dict:
+    """
+    Keyset pagination on (created_at, _id): every page is an index range scan and no total is counted
+    """
+
+    backwards = False
+    if cursor:
+        created_at, doc_id, direction = decode_cursor(cursor)
+        backwards = direction == "prev"
+
+    # Parcourir l'index dans le sens inverse pour remonter vers la page précédente
+    order = -sort if backwards else sort
+    search = query
+    if cursor:
+        operator = "$lt" if order == DESCENDING else "$gt"
+        keyset = {"$or": [{"created_at": {operator: created_at}}, {"created_at": created_at, "_id": {operator: doc_id}}]}
+        search = {"$and": [query, keyset]} if query else keyset
+
+    # Documents bruts : le modèle de réponse les valide une seule fois, sans hydratation Beanie
+    collection = document.get_motor_collection()
+    docs = await collection.find(search, sort=[("created_at", order), ("_id", order)], limit=size + 1).to_list(length=size + 1)
+    has_more = len(docs) > size
+    docs = docs[:size]
+    if backwards:
+        docs.reverse()
+
+    if not docs:
+        return {"items": [], "current_page": cursor, "next_page": None, "previous_page": None}
+
+    return {
+        "items": docs,
+        "current_page": cursor,
+        "next_page": encode_cursor(docs[-1], "next") if (has_more or backwards) else None,
+        "previous_page": encode_cursor(docs[0], "prev") if (has_more if backwards else cursor is not None) else None,
+    }
@@ -0,0 +1,26 @@
+import os
+
+import pytest
+from beanie import init_beanie
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# Sans URI, les benchmarks tournent sur le mongomock des tests fonctionnels
+BENCHMARK_MONGODB_URI = os.getenv("APIKEY_BENCHMARK_MONGODB_URI")
+BENCHMARK_MONGO_DB = os.getenv("APIKEY_BENCHMARK_MONGO_DB", "apikeys_benchmark")
+
+
+@pytest.fixture(autouse=True)
+async def mock_mongodb_client(mock_mongodb_client, mock_app_instance, fixture_models):
+    """
+    Points the models at a local mongod when APIKEY_BENCHMARK_MONGODB_URI is set, mongomock otherwise
+    """
+
+    if not BENCHMARK_MONGODB_URI:
+        yield mock_mongodb_client
+        return
+
+    client = AsyncIOMotorClient(BENCHMARK_MONGODB_URI)
+    mock_app_instance.mongo_db_client = client[BENCHMARK_MONGO_DB]
+    await init_beanie(database=mock_app_instance.mongo_db_client, document_models=fixture_models.document_models)
+    yield client
+    client.close()
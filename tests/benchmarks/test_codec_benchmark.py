@@ -0,0 +1,87 @@
+import hashlib
+import os
+import timeit
+from hmac import compare_digest, HMAC
+
+import pytest
+
+from src.config import settings
+from src.shared import generate_api_key, key_codec
+
+# Mesures CPU uniquement : lancer avec APIKEY_BENCHMARKS=1 pytest -s tests/benchmarks
+RUN_BENCHMARKS = os.getenv("APIKEY_BENCHMARKS") == "1"
+ROUNDS = 5
+NUMBER = 20000
+
+
+def _legacy_hash(raw_key: str) -> str:
+    secret_bytes = settings.SECRET_KEY_HASHED.encode("utf-8")
+    return HMAC(key=secret_bytes, msg=raw_key.encode("utf-8"), digestmod=hashlib.sha256).hexdigest()
+
+
+def _legacy_parse(key: str):
+    prefix = f"{settings.API_KEY_PREFIX}_live_" if settings.USE_LIVE_CLIENT else f"{settings.API_KEY_PREFIX}_test_"
+    if not key.startswith(prefix):
+        return False, None, None
+
+    raw_key = key[len(prefix) :]  # noqa: E203
+    expected_length = settings.TOKEN_SECRET_HEX_LENGTH * 2
+    if len(raw_key) <= expected_length:
+        return False, None, None
+
+    return True, raw_key, raw_key[expected_length:]
+
+
+def _legacy_verify(key: str, stored_hash: str):
+    is_valid, raw_key, user_id = _legacy_parse(key)
+    if not is_valid:
+        return False, None
+    return compare_digest(_legacy_hash(raw_key), stored_hash), user_id
+
+
+def _legacy_lookup(key: str):
+    # Chemin de verify_apikey avant le codec : analyse puis empreinte
+    is_valid, raw_key, user_id = _legacy_parse(key)
+    return _legacy_hash(raw_key), user_id
+
+
+def _codec_lookup(key: str):
+    parsed = key_codec.parse(key)
+    return key_codec.hash(parsed.raw_key), parsed.user_id
+
+
+def _per_call_ns(func, *args) -> float:
+    return min(timeit.repeat(lambda: func(*args), number=NUMBER, repeat=ROUNDS)) / NUMBER * 1e9
+
+
+def test_codec_matches_legacy_implementation():
+    api_key, hashed_key = generate_api_key("6512bd43d9caa6e02c990b0a82652dca")
+
+    # CASE 1: Keys generated by the codec are read the same way by the previous implementation
+    parsed = key_codec.parse(api_key)
+    assert _legacy_parse(api_key) == (True, parsed.raw_key, parsed.user_id)
+    assert _legacy_hash(parsed.raw_key) == key_codec.hash(parsed.raw_key) == hashed_key
+    assert key_codec.verify(api_key, hashed_key) == _legacy_verify(api_key, hashed_key)
+
+    # CASE 2: Malformed keys are rejected by both
+    for key in ("", "invalid-key", key_codec.prefix, api_key[: len(key_codec.prefix) + 64]):
+        assert key_codec.parse(key) is None
+        assert _legacy_parse(key) == (False, None, None)
+
+
+@pytest.mark.skipif(not RUN_BENCHMARKS, reason="APIKEY_BENCHMARKS is not set")
+def test_codec_per_call_cost():
+    api_key, hashed_key = generate_api_key("6512bd43d9caa6e02c990b0a82652dca")
+    raw_key = key_codec.parse(api_key).raw_key
+
+    cases = {
+        "hash": ((_legacy_hash, raw_key), (key_codec.hash, raw_key)),
+        "parse + hash": ((_legacy_lookup, api_key), (_codec_lookup, api_key)),
+        "verify": ((_legacy_verify, api_key, hashed_key), (key_codec.verify, api_key, hashed_key)),
+    }
+
+    print(f"\n{'operation':<14}{'before (ns)':>14}{'after (ns)':>14}{'speedup':>10}")
+    for name, (before, after) in cases.items():
+        before_ns, after_ns = _per_call_ns(*before), _per_call_ns(*after)
+        print(f"{name:<14}{before_ns:>14.0f}{after_ns:>14.0f}{before_ns / after_ns:>9.2f}x")
+        assert after_ns < before_ns, name
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from pathlib import Path
+
+import pytest
+
+from src.shared import verification_cache
+
+# Charge HTTP sur l'application ASGI : APIKEY_BENCHMARKS=1 pytest -s tests/benchmarks
+RUN_BENCHMARKS = os.getenv("APIKEY_BENCHMARKS") == "1"
+# 10M de clés demandent un mongod local (APIKEY_BENCHMARK_MONGODB_URI), mongomock tient jusqu'à ~100k
+COLLECTION_SIZES = [int(size) for size in os.getenv("APIKEY_BENCHMARK_SIZES", "10000").split(",")]
+CLIENTS = int(os.getenv("APIKEY_BENCHMARK_CLIENTS", "16"))
+REQUESTS = int(os.getenv("APIKEY_BENCHMARK_REQUESTS", "2000"))
+OUTPUT = Path(os.getenv("APIKEY_BENCHMARK_OUTPUT", "benchmark-results.json"))
+BASELINE = os.getenv("APIKEY_BENCHMARK_BASELINE")
+TOLERANCE = float(os.getenv("APIKEY_BENCHMARK_TOLERANCE", "0.2"))
+
+SEED_BATCH_SIZE = 10000
+SAMPLE_SIZE = 10000
+USERS = 1000
+AUTHORIZATION = {"Authorization": "Bearer fake_token"}
+
+
+async def seed_keys(document_model, size: int) -> list[str]:
+    """
+    Inserts `size` keys spread over USERS users and returns an evenly spaced sample of their plaintext
+    """
+
+    stride, sample = max(1, size // SAMPLE_SIZE), []
+    for start in range(0, size, SEED_BATCH_SIZE):
+        docs = [document_model.issue(f"user-{index % USERS}") for index in range(start, min(size, start + SEED_BATCH_SIZE))]
+        await document_model.insert_many(docs)
+        sample += [doc.issued_api_key for index, doc in enumerate(docs, start) if index % stride == 0]
+    return sample
+
+
+def summarize(latencies: list[float], elapsed: float) -> dict:
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+    }
+
+
+async def run_load(client, request_factory, clients: int, requests: int) -> dict:
+    """
+    Drives `clients` concurrent users sending `requests` requests in total, each built by `request_factory`
+    """
+
+    latencies, remaining = [], iter(range(requests))
+
+    async def user():
+        for _ in remaining:
+            method, url, kwargs = request_factory()
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code < 400, response.text
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(clients)))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def scenarios(sample: list[str]) -> dict:
+    batch_size = min(10, len(sample))
+    return {
+        "verify-api-key": lambda: ("GET", "/verify-api-key", {"headers": {"X-API-Key": random.choice(sample)}}),
+        "verify-api-keys": lambda: ("POST", "/verify-api-keys", {"json": {"api_keys": random.sample(sample, batch_size)}}),
+        "list": lambda: ("GET", "/keys", {"params": {"user_id": f"user-{random.randrange(USERS)}"}, "headers": AUTHORIZATION}),
+        "create": lambda: ("POST", "/keys", {"json": {"user_id": f"user-{random.randrange(USERS)}"}, "headers": AUTHORIZATION}),
+    }
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Lists the endpoints whose p95 grew by more than `tolerance` compared to the baseline
+    """
+
+    found = []
+    for size, endpoints in results.items():
+        for endpoint, current in endpoints.items():
+            if (previous := baseline.get(size, {}).get(endpoint)) and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+                found.append(f"{endpoint} @ {size} keys: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+    return found
+
+
+@pytest.fixture(scope="module")
+def benchmark_report():
+    results = {}
+    yield results
+
+    if results:
+        OUTPUT.write_text(json.dumps(results, indent=2, sort_keys=True))
+        print(f"\nBenchmark results written to {OUTPUT}")
+
+
+async def test_load_harness_uses_cases(http_client_api, fixture_models):
+    sample = await seed_keys(fixture_models.APIKeyDocument, 30)
+
+    # CASE 1: Every scenario succeeds against the stubbed auth service and reports its percentiles
+    for name, factory in scenarios(sample).items():
+        report = await run_load(http_client_api, factory, clients=3, requests=12)
+        assert report["requests"] == 12, name
+        assert 0 < report["p50_ms"] <= report["p95_ms"] <= report["p99_ms"], name
+
+    # CASE 2: Only a p95 above the tolerance is a regression
+    baseline = {"30": {"list": {"p95_ms": 10.0}, "create": {"p95_ms": 10.0}}}
+    results = {"30": {"list": {"p95_ms": 11.0}, "create": {"p95_ms": 13.0}, "verify-api-key": {"p95_ms": 1.0}}}
+    assert regressions(results, baseline, tolerance=0.2) == ["create @ 30 keys: p95 10.0ms -> 13.0ms"]
+
+
+@pytest.mark.skipif(not RUN_BENCHMARKS, reason="APIKEY_BENCHMARKS is not set")
+@pytest.mark.parametrize("size", COLLECTION_SIZES)
+async def test_load_per_endpoint(http_client_api, fixture_models, benchmark_report, size):
+    sample = await seed_keys(fixture_models.APIKeyDocument, size)
+    results = benchmark_report[str(size)] = {}
+
+    print(f"\n{size} keys, {CLIENTS} clients\n{'endpoint':<18}{'req/s':>10}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}")
+    for name, factory in scenarios(sample).items():
+        # Partir d'un cache vide : les vérifications mesurent la recherche Mongo et non le cache
+        verification_cache.clear()
+        results[name] = report = await run_load(http_client_api, factory, clients=CLIENTS, requests=REQUESTS)
+        print(f"{name:<18}{report['rps']:>10}{report['p50_ms']:>10}{report['p95_ms']:>10}{report['p99_ms']:>10}")
+
+    if BASELINE:
+        baseline = json.loads(Path(BASELINE).read_text())
+        assert not (found := regressions({str(size): results}, baseline, TOLERANCE)), "\n".join(found)
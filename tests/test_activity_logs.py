@@ -0,0 +1,141 @@
+import asyncio
+import json
+import os
+from unittest import mock
+
+import pytest
+from starlette.requests import Request
+
+from src.config import settings
+from src.services import ActivityLogShipper
+
+
+def _request() -> Request:
+    return Request({"type": "http", "headers": [(b"user-agent", b"pytest")], "client": ("127.0.0.1", 1234)})
+
+
+@pytest.fixture()
+def shipper_settings(tmp_path):
+    with (
+        mock.patch.object(settings, "ACTIVITY_LOGS_SPILL_PATH", str(tmp_path / "spill.ndjson")),
+        mock.patch.object(settings, "ACTIVITY_LOGS_BATCH_SIZE", 3),
+        mock.patch.object(settings, "ACTIVITY_LOGS_FLUSH_INTERVAL", 0.05),
+        mock.patch.object(settings, "ACTIVITY_LOGS_MAX_RETRIES", 1),
+        mock.patch.object(settings, "ACTIVITY_LOGS_RETRY_BASE_DELAY", 0.01),
+        mock.patch.object(settings, "ACTIVITY_LOGS_AUTHORIZATION", "Bearer service-token"),
+    ):
+        yield settings
+
+
+@pytest.mark.asyncio
+async def test_activity_log_shipper_batches_events(shipper_settings):
+    with mock.patch("src.services.activity_logs.post_event", new_callable=mock.AsyncMock) as mock_post:
+        mock_post.return_value = True
+        shipper = ActivityLogShipper(trailhub_url="http://trailhub/logs")
+        await shipper.start()
+
+        for index in range(5):
+            shipper.enqueue(request=_request(), message=f"event {index}", user_id="user")
+        await asyncio.sleep(0.2)
+        await shipper.stop()
+
+    # CASE 1: Events are posted one per request, in order, with the service credential
+    events = [call.args[1] for call in mock_post.await_args_list]
+    assert [event["message"] for event in events] == [f"event {index}" for index in range(5)]
+    assert events[0]["user_agent"] == "pytest"
+    assert {call.kwargs["authorization"] for call in mock_post.await_args_list} == {"Bearer service-token"}
+    assert shipper.stats()["shipped"] == 5
+
+
+@pytest.mark.asyncio
+async def test_activity_log_shipper_spills_and_replays(shipper_settings):
+    shipper = ActivityLogShipper(trailhub_url="http://trailhub/logs")
+
+    with mock.patch("src.services.activity_logs.post_event", new_callable=mock.AsyncMock) as mock_post:
+        # CASE 1: Trailhub is down, the batch is retried then spilled to disk
+        mock_post.return_value = False
+        await shipper.start()
+        shipper.enqueue(request=_request(), message="lost event", user_id="user")
+        await asyncio.sleep(0.2)
+
+        assert mock_post.await_count == 2
+        with open(shipper.spill_path, encoding="utf-8") as spill:
+            assert [json.loads(line)["message"] for line in spill] == ["lost event"]
+
+        # CASE 2: Trailhub is back, the spill file is replayed after the next flush
+        mock_post.return_value = True
+        shipper.enqueue(request=_request(), message="new event", user_id="user")
+        await asyncio.sleep(0.2)
+        await shipper.stop()
+
+    assert [call.args[1]["message"] for call in mock_post.await_args_list[-2:]] == ["new event", "lost event"]
+    assert not shipper.spill_path.exists()
+    assert shipper.stats()["replayed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_activity_log_shipper_spill_files_per_process(shipper_settings):
+    shipper = ActivityLogShipper(trailhub_url="http://trailhub/logs")
+    base = shipper.spill_base_path
+    orphan, sibling = base.with_name(f"{base.stem}-1001{base.suffix}"), base.with_name(f"{base.stem}-1002{base.suffix}")
+    orphan.write_text(json.dumps({"message": "orphan event"}) + "\n", encoding="utf-8")
+    sibling.write_text(json.dumps({"message": "sibling event"}) + "\n", encoding="utf-8")
+
+    # CASE 1: The spill file is named after the current process
+    assert shipper.spill_path.name == f"{base.stem}-{os.getpid()}{base.suffix}"
+
+    with (
+        mock.patch("src.services.activity_logs.post_event", new_callable=mock.AsyncMock) as mock_post,
+        mock.patch("src.services.activity_logs._process_alive", side_effect=lambda pid: pid == 1002),
+    ):
+        mock_post.return_value = True
+        await shipper.start()
+        shipper.enqueue(request=_request(), message="new event", user_id="user")
+        await asyncio.sleep(0.2)
+        await shipper.stop()
+
+    # CASE 2: Files of exited processes are replayed, those of running workers are left to them
+    assert [call.args[1]["message"] for call in mock_post.await_args_list] == ["new event", "orphan event"]
+    assert not orphan.exists() and sibling.exists()
+
+
+@pytest.mark.asyncio
+async def test_activity_log_shipper_stop_keeps_pending_events(shipper_settings):
+    shipper = ActivityLogShipper(trailhub_url="http://trailhub/logs")
+
+    async def stalled_post(url, event, authorization=None):
+        # Trailhub acquitte le premier événement puis ne répond plus
+        if event["message"] != "event 0":
+            await asyncio.Event().wait()
+        return True
+
+    with (
+        mock.patch("src.services.activity_logs.post_event", side_effect=stalled_post) as mock_post,
+        mock.patch.object(settings, "ACTIVITY_LOGS_FLUSH_INTERVAL", 10),
+        mock.patch.object(settings, "ACTIVITY_LOGS_DRAIN_TIMEOUT", 0.1),
+    ):
+        # CASE 1: Events already taken off the queue by a batch still filling up are not lost on stop
+        await shipper.start()
+        for index in range(2):
+            shipper.enqueue(request=_request(), message=f"event {index}", user_id="user")
+        await asyncio.sleep(0.05)
+        assert shipper._queue.empty()
+
+        # CASE 2: The drain times out, only the events trailhub did not acknowledge are spilled
+        await shipper.stop()
+
+    shipped = [call.args[1]["message"] for call in mock_post.await_args_list[: shipper.shipped]]
+    with open(shipper.spill_path, encoding="utf-8") as spill:
+        spilled = [json.loads(line)["message"] for line in spill]
+    assert shipper.shipped == 1
+    assert shipped + spilled == ["event 0", "event 1"]
+
+
+@pytest.mark.asyncio
+async def test_activity_log_shipper_requires_credential(shipper_settings):
+    shipper = ActivityLogShipper(trailhub_url="http://trailhub/logs")
+
+    # CASE 1: Without a service credential the shipper refuses to start
+    with mock.patch.object(settings, "ACTIVITY_LOGS_AUTHORIZATION", None), pytest.raises(ValueError):
+        await shipper.start()
+    assert not shipper.running
@@ -0,0 +1,26 @@
+from src.shared import VerificationCache
+
+
+def test_verification_cache_invalidate_uses_cases():
+    cache = VerificationCache(maxsize=4, ttl=60)
+    cache.set("key-a1", {"verified": True}, doc_id="a")
+    cache.set("key-a2", {"verified": True}, doc_id="a")
+    cache.set("key-b", {"verified": True}, doc_id="b")
+
+    # CASE 1: Only the entries of the invalidated document are evicted
+    assert cache.invalidate("a") == 2
+    assert cache.get("key-a1") is None and cache.get("key-a2") is None
+    assert cache.get("key-b") is not None
+
+    # CASE 2: Entries evicted by the cache itself are dropped from the reverse index
+    for index in range(20):
+        cache.set(f"key-{index}", {"verified": True}, doc_id=f"doc-{index}")
+    assert sum(len(keys) for keys in cache._keys_by_doc.values()) <= 2 * cache._entries.maxsize
+    assert cache.invalidate("doc-19") == 1
+    assert cache.invalidate("doc-0") == 0
+
+    # CASE 3: A key resolved to another document is not evicted through its former document
+    cache.set("moved", {"verified": True}, doc_id="old")
+    cache.set("moved", {"verified": False}, doc_id="new")
+    assert cache.invalidate("old") == 0
+    assert cache.get("moved") == ({"verified": False}, "new", None)
@@ -0,0 +1,41 @@
+from hashlib import sha256
+from hmac import HMAC
+from unittest import mock
+
+import pytest
+
+from src.shared import KEY_ID_LENGTH, KeyCodec, key_codec, verify_api_key
+
+
+def _codec(token_hex_length: int) -> KeyCodec:
+    return KeyCodec(
+        prefix="st_test_", keyring={"v1": "secret"}, active_id="v1", legacy_id="v1", token_hex_length=token_hex_length
+    )
+
+
+def test_key_codec_keeps_the_secret_apart_from_the_key_id():
+    # CASE 1: The public key_id leads the key and is followed by at least 16 unpublished random bytes
+    codec = _codec(24)
+    issued = codec.issue("user")
+    raw_key = issued.api_key.removeprefix("st_test_")
+    assert raw_key.startswith(issued.key_id) and len(issued.key_id) == KEY_ID_LENGTH
+    assert len(raw_key.removesuffix("user")) - KEY_ID_LENGTH == 32
+    assert codec.parse(issued.api_key).key_id == issued.key_id
+
+    # CASE 2: A secret length that would leave too few bytes beyond the key_id is refused at startup
+    for token_hex_length in (8, 16, 23):
+        with pytest.raises(ValueError, match="TOKEN_SECRET_HEX_LENGTH"):
+            _codec(token_hex_length)
+
+
+def test_verify_api_key_uses_the_secret_of_the_key():
+    issued = key_codec.issue("user")
+
+    # CASE 1: A key hashed with a rotated secret is verified with its secret_id only
+    with mock.patch.dict(key_codec._hmacs, {"v2": HMAC(key=b"rotated-secret", digestmod=sha256)}):
+        stored_hash = key_codec.hash(key_codec.parse(issued.api_key).raw_key, "v2")
+        assert verify_api_key(issued.api_key, stored_hash, "v2") == (True, "user")
+        assert verify_api_key(issued.api_key, stored_hash) == (False, "user")
+
+    # CASE 2: A malformed key is rejected
+    assert verify_api_key("malformed", stored_hash, "v2") == (False, None)
@@ -1,6 +1,11 @@
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
 import pytest
 from starlette import status
 
+from src.config import settings
+
 
 @pytest.mark.asyncio
 async def test_ping_api(http_client_api):
@@ -104,6 +109,12 @@ async def test_read_one_uses_cases(http_client_api, fake_api_data, mock_check_as
     assert read_resp.json()["user_id"] == response["user_id"]
     assert "hashed_key" not in read_resp.json()
 
+    # CASE 1b: The lean output keeps the fields of the document response and is the same in the listings
+    assert read_resp.json().keys() == response.keys()
+    list_resp = await http_client_api.get("/keys", headers=headers)
+    cursor_resp = await http_client_api.get("/keys/cursor", headers=headers)
+    assert list_resp.json()["items"] == cursor_resp.json()["items"] == [read_resp.json()]
+
     # CASE 2: Read API Key by invalid ID
     invalid_id_resp = await http_client_api.get("/keys/invalid-id", headers=headers)
     assert invalid_id_resp.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY, invalid_id_resp.text
@@ -120,7 +131,7 @@ async def test_read_one_uses_cases(http_client_api, fake_api_data, mock_check_as
 
 
 @pytest.mark.asyncio
-async def test_regenerate_apikey_uses_cases(http_client_api, fake_api_data, mock_check_assess_allow):
+async def test_regenerate_apikey_uses_cases(http_client_api, fake_api_data, mock_check_assess_allow, mock_verify_assess_token):
     headers = {"Authorization": "Bearer fake_token"}
 
     create_apikey_resp = await http_client_api.post("/keys", json=fake_api_data, headers=headers)
@@ -128,14 +139,40 @@ async def test_regenerate_apikey_uses_cases(http_client_api, fake_api_data, mock
 
     response = create_apikey_resp.json()
 
-    # CASE 1: Regenerate API Key by ID
+    # CASE 1: Regenerate API Key by ID as super admin
     regenerate_resp = await http_client_api.put(f"/keys/{response['_id']}", headers=headers)
-    assert regenerate_resp.status_code == status.HTTP_403_FORBIDDEN, regenerate_resp.text
-    assert regenerate_resp.json() == {
+    assert regenerate_resp.status_code == status.HTTP_202_ACCEPTED, regenerate_resp.text
+    assert regenerate_resp.json()["_id"] == response["_id"]
+    assert regenerate_resp.json()["api_key"] != response["api_key"]
+    assert "hashed_key" not in regenerate_resp.json()
+
+    verify_old = await http_client_api.get("/verify-api-key", headers={"X-API-Key": response["api_key"]})
+    assert verify_old.json()["verified"] is False
+    verify_new = await http_client_api.get("/verify-api-key", headers={"X-API-Key": regenerate_resp.json()["api_key"]})
+    assert verify_new.json()["verified"] is True
+
+    # CASE 1 bis: Regenerate API Key of another user without being super admin
+    mock_verify_assess_token.side_effect = None
+    mock_verify_assess_token.return_value = {
+        "active": True,
+        "user_info": {"_id": "another-user", "role": {"slug": "prestataire"}},
+    }
+    forbidden_resp = await http_client_api.put(f"/keys/{response['_id']}", headers=headers)
+    assert forbidden_resp.status_code == status.HTTP_403_FORBIDDEN, forbidden_resp.text
+    assert forbidden_resp.json() == {
         "code_error": "resource/cannot-access-resource",
         "message_error": "You cannot access this resource",
     }
 
+    # CASE 1 ter: Regenerate its own API Key without being super admin
+    mock_verify_assess_token.return_value = {
+        "active": True,
+        "user_info": {"_id": response["user_id"], "role": {"slug": "prestataire"}},
+    }
+    owner_resp = await http_client_api.put(f"/keys/{response['_id']}", headers=headers)
+    assert owner_resp.status_code == status.HTTP_202_ACCEPTED, owner_resp.text
+    assert owner_resp.json()["user_id"] == response["user_id"]
+
     # CASE 2: Regenerate API Key by invalid ID
     invalid_id_resp = await http_client_api.put("/keys/invalid-id", headers=headers)
     assert invalid_id_resp.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY, invalid_id_resp.text
@@ -153,7 +190,9 @@ async def test_regenerate_apikey_uses_cases(http_client_api, fake_api_data, mock
 
 @pytest.mark.asyncio
 @pytest.mark.parametrize("action", ["activate", "deactivate"])
-async def test_activate_or_deactivate_apikey_uses_cases(http_client_api, fake_api_data, action, mock_check_assess_allow):
+async def test_activate_or_deactivate_apikey_uses_cases(
+    http_client_api, fake_api_data, action, mock_check_assess_allow, mock_verify_assess_token
+):
     headers = {"Authorization": "Bearer fake_token"}
 
     create_apikey_resp = await http_client_api.post("/keys", json=fake_api_data, headers=headers)
@@ -161,10 +200,24 @@ async def test_activate_or_deactivate_apikey_uses_cases(http_client_api, fake_ap
 
     response = create_apikey_resp.json()
 
-    # CASE 1: Update API Key by ID
+    # CASE 1: Update API Key by ID as super admin
     update_resp = await http_client_api.put(f"/keys/{response['_id']}/action", params={"action": action}, headers=headers)
-    assert update_resp.status_code == status.HTTP_403_FORBIDDEN, update_resp.text
-    assert update_resp.json() == {
+    assert update_resp.status_code == status.HTTP_202_ACCEPTED, update_resp.text
+    assert update_resp.json()["is_active"] is (action == "activate")
+    assert "hashed_key" not in update_resp.json()
+
+    verify_resp = await http_client_api.get("/verify-api-key", headers={"X-API-Key": response["api_key"]})
+    assert verify_resp.json()["verified"] is (action == "activate")
+
+    # CASE 1 bis: Update API Key of another user without being super admin
+    mock_verify_assess_token.side_effect = None
+    mock_verify_assess_token.return_value = {
+        "active": True,
+        "user_info": {"_id": "another-user", "role": {"slug": "prestataire"}},
+    }
+    forbidden_resp = await http_client_api.put(f"/keys/{response['_id']}/action", params={"action": action}, headers=headers)
+    assert forbidden_resp.status_code == status.HTTP_403_FORBIDDEN, forbidden_resp.text
+    assert forbidden_resp.json() == {
         "code_error": "resource/cannot-access-resource",
         "message_error": "You cannot access this resource",
     }
@@ -252,3 +305,701 @@ async def test_verify_api_key_uses_cases(
         print(verify_response.json())
 
         assert verify_response.json()["verified"] == expected_verified, verify_response.text
+
+
+@pytest.mark.asyncio
+async def test_raw_api_key_not_stored_uses_cases(
+    http_client_api, fixture_models, mock_check_assess_allow, mock_verify_assess_token
+):
+    import json
+
+    from beanie import PydanticObjectId
+
+    from src.models.migrations import relax_api_key_index
+    from src.shared import key_codec
+
+    authorization = {"Authorization": "Bearer fake_token"}
+    with mock.patch.object(settings, "STORE_RAW_API_KEY", False):
+        # CASE 1: The plaintext is returned once on creation but never stored
+        create_apikey_resp = await http_client_api.post("/keys", headers=authorization)
+        assert create_apikey_resp.status_code == status.HTTP_201_CREATED, create_apikey_resp.text
+        response = create_apikey_resp.json()
+        assert key_codec.parse(response["api_key"]) is not None
+
+        collection = fixture_models.APIKeyDocument.get_motor_collection()
+        stored = await collection.find_one({"_id": PydanticObjectId(response["_id"])})
+        assert "api_key" not in stored
+        assert stored["key_id"] == key_codec.parse(response["api_key"]).key_id
+
+        # CASE 2: While the legacy (api_key, user_id) index still exists, a user gets several keys, one by one or in bulk
+        await collection.create_index([("api_key", 1), ("user_id", 1)], name="api_key_1_user_id_1", unique=True)
+        assert (await relax_api_key_index(collection))["rebuilt"] is True
+        mock_verify_assess_token.side_effect = None
+        mock_verify_assess_token.return_value = {"active": True, "user_info": {"_id": response["user_id"], "role": {}}}
+        second_resp = await http_client_api.post("/keys", headers=authorization)
+        assert second_resp.status_code == status.HTTP_201_CREATED, second_resp.text
+        bulk_resp = await http_client_api.post("/keys/bulk", json={"user_ids": [response["user_id"]] * 2}, headers=authorization)
+        assert all("error" not in json.loads(line) for line in bulk_resp.text.splitlines())
+        assert await collection.count_documents({"user_id": response["user_id"], "api_key": {"$exists": False}}) == 4
+
+        # CASE 3: Reads show the masked key and verification still works
+        read_resp = await http_client_api.get(f"/keys/{response['_id']}", headers=authorization)
+        assert read_resp.json()["api_key"] == key_codec.mask(stored["key_id"])
+
+        verify_response = await http_client_api.get("/verify-api-key", headers={"X-API-Key": response["api_key"]})
+        assert verify_response.json()["verified"] is True
+
+        # CASE 4: Regenerating returns the new plaintext once
+        regenerate_resp = await http_client_api.put(f"/keys/{response['_id']}", headers=authorization)
+        assert regenerate_resp.status_code == status.HTTP_202_ACCEPTED, regenerate_resp.text
+        assert key_codec.parse(regenerate_resp.json()["api_key"]) is not None
+        assert "api_key" not in await collection.find_one({"_id": PydanticObjectId(response["_id"])})
+
+
+@pytest.mark.asyncio
+async def test_verify_api_key_cache_uses_cases(http_client_api, fake_api_data, mock_check_assess_allow):
+    authorization = {"Authorization": "Bearer fake_token"}
+
+    create_apikey_resp = await http_client_api.post("/keys", json=fake_api_data, headers=authorization)
+    assert create_apikey_resp.status_code == status.HTTP_201_CREATED, create_apikey_resp.text
+    response = create_apikey_resp.json()
+    headers = {"X-API-Key": response["api_key"]}
+
+    stats_before = (await http_client_api.get("/apikeys/@stats")).json()["verification_cache"]
+
+    # CASE 1: First verification is a miss, the second one is served from the cache
+    for _ in range(2):
+        verify_response = await http_client_api.get("/verify-api-key", headers=headers)
+        assert verify_response.status_code == status.HTTP_200_OK, verify_response.text
+        assert verify_response.json()["verified"] is True
+
+    stats_after = (await http_client_api.get("/apikeys/@stats")).json()["verification_cache"]
+    assert stats_after["misses"] == stats_before["misses"] + 1
+    assert stats_after["hits"] == stats_before["hits"] + 1
+
+    # CASE 2: Removing the key invalidates the cached verdict
+    delete_resp = await http_client_api.delete(f"/keys/{response['_id']}", headers=authorization)
+    assert delete_resp.status_code == status.HTTP_204_NO_CONTENT, delete_resp.text
+
+    verify_response = await http_client_api.get("/verify-api-key", headers=headers)
+    assert verify_response.status_code == status.HTTP_200_OK, verify_response.text
+    assert verify_response.json()["verified"] is False
+
+
+@pytest.mark.asyncio
+async def test_metrics_uses_cases(http_client_api, fake_api_data, mock_check_assess_allow, tmp_path):
+    authorization = {"Authorization": "Bearer fake_token"}
+
+    create_apikey_resp = await http_client_api.post("/keys", json=fake_api_data, headers=authorization)
+    assert create_apikey_resp.status_code == status.HTTP_201_CREATED, create_apikey_resp.text
+    await http_client_api.get("/verify-api-key", headers={"X-API-Key": create_apikey_resp.json()["api_key"]})
+    await http_client_api.get("/verify-api-key", headers={"X-API-Key": "malformed"})
+
+    # CASE 1: The exposition holds the hot-path histograms, labelled by route template
+    metrics_resp = await http_client_api.get("/apikeys/@metrics")
+    assert metrics_resp.status_code == status.HTTP_200_OK, metrics_resp.text
+    assert metrics_resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = metrics_resp.text
+    assert 'apikey_http_request_duration_seconds_bucket{method="GET",route="/verify-api-key",le="+Inf"}' in body
+    assert 'apikey_http_request_duration_seconds_count{method="POST",route="/keys"}' in body
+    assert 'apikey_mongo_lookup_duration_seconds_count{operation="verify"}' in body
+    assert "apikey_hmac_duration_seconds_count " in body
+    assert 'apikey_verifications_total{result="verified"}' in body
+    assert 'apikey_verifications_total{result="rejected"}' in body
+
+    # CASE 2: The in-process statistics are exported as gauges
+    assert "apikey_verification_cache_hits " in body
+    assert "apikey_rate_limiter_denied " in body
+
+    # CASE 3: Unknown paths share a single series instead of one per URL
+    await http_client_api.get("/does-not-exist/123")
+    body = (await http_client_api.get("/apikeys/@metrics")).text
+    assert 'route="unmatched"' in body
+    assert "/does-not-exist/123" not in body
+
+    # CASE 4: Serve workers share their snapshots, counters add up and gauges are kept per live worker
+    import json
+    import os
+
+    from src.shared import verifications
+
+    other = {"apikey_verifications": [[["verified"], 5.0]], "apikey": {"apikey_rate_limiter_denied": 7}}
+    (tmp_path / "1001.json").write_text(json.dumps(other), encoding="utf-8")
+    with (
+        mock.patch.object(settings, "METRICS_MULTIPROCESS_DIR", str(tmp_path)),
+        mock.patch("src.shared.metrics._process_alive", side_effect=lambda pid: pid == os.getpid()),
+    ):
+        verified = verifications.labels("verified").value
+        body = (await http_client_api.get("/apikeys/@metrics")).text
+    assert f'apikey_verifications_total{{result="verified"}} {verified + 5.0}' in body
+    assert f'apikey_rate_limiter_denied{{pid="{os.getpid()}"}}' in body
+    assert 'pid="1001"' not in body
+    assert (tmp_path / f"{os.getpid()}.json").exists()
+
+    # CASE 5: Dead workers are folded into a single retired snapshot, counted once across scrapes
+    assert not (tmp_path / "1001.json").exists()
+    assert (tmp_path / "retired.json").exists()
+    with (
+        mock.patch.object(settings, "METRICS_MULTIPROCESS_DIR", str(tmp_path)),
+        mock.patch("src.shared.metrics._process_alive", side_effect=lambda pid: pid == os.getpid()),
+    ):
+        body = (await http_client_api.get("/apikeys/@metrics")).text
+    assert f'apikey_verifications_total{{result="verified"}} {verified + 5.0}' in body
+
+    # CASE 6: A worker reusing the pid of a dead one folds its totals before writing its own
+    from src.shared import metrics_snapshots
+
+    own = tmp_path / f"{os.getpid()}.json"
+    own.write_text(json.dumps({"apikey_verifications": [[["verified"], 3.0]]}), encoding="utf-8")
+    with mock.patch.object(settings, "METRICS_MULTIPROCESS_DIR", str(tmp_path)):
+        snapshots = metrics_snapshots.fold(reclaim=True)
+    assert not own.exists()
+    assert snapshots == {0: json.loads((tmp_path / "retired.json").read_text(encoding="utf-8"))}
+    assert [["verified"], 8.0] in snapshots[0]["apikey_verifications"]
+
+
+@pytest.mark.asyncio
+async def test_verify_api_key_with_many_keys_per_user(http_client_api, fake_data, fixture_models):
+    from src.shared import generate_api_key
+
+    user_id = fake_data.uuid4()
+    api_keys = []
+    for _ in range(3):
+        doc = await fixture_models.APIKeyDocument.issue(user_id).create()
+        api_keys.append(doc.api_key)
+
+    # CASE 1: Every key of the same user is verified
+    for api_key in api_keys:
+        verify_response = await http_client_api.get("/verify-api-key", headers={"X-API-Key": api_key})
+        assert verify_response.status_code == status.HTTP_200_OK, verify_response.text
+        assert verify_response.json()["verified"] is True
+
+    # CASE 2: A well-formed but unknown key is rejected
+    unknown_api_key, _ = generate_api_key(user_id)
+    verify_response = await http_client_api.get("/verify-api-key", headers={"X-API-Key": unknown_api_key})
+    assert verify_response.status_code == status.HTTP_200_OK, verify_response.text
+    assert verify_response.json()["verified"] is False
+
+
+@pytest.mark.asyncio
+async def test_verify_api_key_secret_rotation(http_client_api, fake_data, fixture_models, mock_check_assess_allow):
+    from hashlib import sha256
+    from hmac import HMAC
+
+    from src.services import key_rehasher
+    from src.shared import generate_api_key, key_codec, verification_cache
+
+    # Clé émise avant le keyring : ni key_id ni secret_id, hashée avec SECRET_KEY_HASHED
+    user_id = fake_data.uuid4()
+    raw_api_key, hashed_key = generate_api_key(user_id)
+    collection = fixture_models.APIKeyDocument.get_motor_collection()
+    legacy_id = (await collection.insert_one({"user_id": user_id, "api_key": raw_api_key, "hashed_key": hashed_key})).inserted_id
+    headers = {"X-API-Key": raw_api_key}
+
+    with (
+        mock.patch.dict(key_codec._hmacs, {"v2": HMAC(key=b"rotated-secret", digestmod=sha256)}),
+        mock.patch.object(key_codec, "active_id", "v2"),
+    ):
+        # CASE 1: The legacy key is still verified and queued for a re-hash with the active secret
+        verify_response = await http_client_api.get("/verify-api-key", headers=headers)
+        assert verify_response.json()["verified"] is True
+        assert await key_rehasher.flush() == 1
+
+        doc = await fixture_models.APIKeyDocument.get(legacy_id)
+        assert doc.secret_id == "v2"
+        assert doc.key_id == key_codec.parse(raw_api_key).key_id
+        assert doc.hashed_key == key_codec.hash(key_codec.parse(raw_api_key).raw_key, "v2") != hashed_key
+
+        # CASE 2: The re-hashed key resolves by its key_id and is not re-hashed again
+        verification_cache.invalidate(legacy_id)
+        verify_responses = await http_client_api.post("/verify-api-keys", json={"api_keys": [raw_api_key, f"{raw_api_key}0"]})
+        assert [verdict["verified"] for verdict in verify_responses.json()] == [True, False]
+        assert await key_rehasher.flush() == 0
+
+        # CASE 3: New keys are hashed with the active secret
+        create_apikey_resp = await http_client_api.post("/keys", headers={"Authorization": "Bearer fake_token"})
+        new_doc = await fixture_models.APIKeyDocument.get(create_apikey_resp.json()["_id"])
+        assert new_doc.secret_id == "v2"
+
+
+@pytest.mark.asyncio
+async def test_verify_api_key_expiry_uses_cases(http_client_api, fake_data, fixture_models):
+    from src.services import expiry_sweeper, ExpirySweeper
+
+    user_id = fake_data.uuid4()
+    now = datetime.now()
+    keys = {}
+    for name, expires_at in (("expired", now - timedelta(minutes=1)), ("valid", now + timedelta(days=1))):
+        doc = await fixture_models.APIKeyDocument.issue(user_id, expires_at=expires_at).create()
+        keys[name] = (doc.api_key, doc.id)
+
+    # CASE 1: An expired key is rejected even while it is still active
+    for name, expected_verified in (("expired", False), ("valid", True)):
+        verify_response = await http_client_api.get("/verify-api-key", headers={"X-API-Key": keys[name][0]})
+        assert verify_response.status_code == status.HTTP_200_OK, verify_response.text
+        assert verify_response.json()["verified"] is expected_verified
+
+    # CASE 2: The sweeper deactivates expired keys only
+    with mock.patch.object(settings, "EXPIRY_SWEEP_BATCH_SIZE", 1):
+        assert await expiry_sweeper.sweep() == 1
+    assert (await fixture_models.APIKeyDocument.get(keys["expired"][1])).is_active is False
+    assert (await fixture_models.APIKeyDocument.get(keys["valid"][1])).is_active is True
+    assert await expiry_sweeper.sweep() == 0
+
+    # CASE 3: Only one process at a time holds the sweep lease, another one takes over once it lapsed
+    other = ExpirySweeper()
+    other.owner = "other-replica:1"
+    assert await expiry_sweeper.acquire_lease() is True
+    assert await other.acquire_lease() is False
+    assert await expiry_sweeper.acquire_lease() is True
+    with mock.patch.object(settings, "EXPIRY_SWEEP_INTERVAL", -1):
+        assert await expiry_sweeper.acquire_lease() is True
+    assert await other.acquire_lease() is True
+    assert await expiry_sweeper.acquire_lease() is False
+
+
+@pytest.mark.asyncio
+async def test_verify_api_key_rate_limit_uses_cases(http_client_api, fake_api_data, fixture_models, mock_check_assess_allow):
+    from src.services import rate_limiter
+
+    authorization = {"Authorization": "Bearer fake_token"}
+    create_apikey_resp = await http_client_api.post("/keys", json=fake_api_data, headers=authorization)
+    assert create_apikey_resp.status_code == status.HTTP_201_CREATED, create_apikey_resp.text
+    response = create_apikey_resp.json()
+    headers = {"X-API-Key": response["api_key"]}
+
+    # CASE 1: A key without limits is not rate limited
+    verify_response = await http_client_api.get("/verify-api-key", headers=headers)
+    assert verify_response.json() == {"verified": True}
+    assert "X-RateLimit-Limit" not in verify_response.headers
+
+    # CASE 2: Setting limits invalidates the cached verdict, the burst is consumed then the key is denied
+    limits = {"rate_limit": 0.001, "rate_limit_burst": 2, "daily_quota": 10}
+    limits_resp = await http_client_api.put(f"/keys/{response['_id']}/limits", json=limits, headers=authorization)
+    assert limits_resp.status_code == status.HTTP_202_ACCEPTED, limits_resp.text
+    assert limits_resp.json()["daily_quota"] == 10
+
+    verdicts = []
+    for _ in range(3):
+        verify_response = await http_client_api.get("/verify-api-key", headers=headers)
+        assert verify_response.status_code == status.HTTP_200_OK, verify_response.text
+        verdicts.append(verify_response.json())
+    assert verdicts == [{"verified": True, "allowed": True}] * 2 + [{"verified": True, "allowed": False}]
+    assert verify_response.headers["X-RateLimit-Remaining"] == "0"
+    assert verify_response.headers["X-Quota-Remaining"] == "8"
+    assert int(verify_response.headers["Retry-After"]) > 0
+
+    # CASE 3: The quota consumption is written to the document
+    assert await rate_limiter.sync() == 1
+    doc = await fixture_models.APIKeyDocument.get(response["_id"])
+    assert doc.quota_used == 2
+    assert doc.quota_day == datetime.now(timezone.utc).date().isoformat()
+
+    # CASE 4: Invalid limits
+    invalid_resp = await http_client_api.put(f"/keys/{response['_id']}/limits", json={"rate_limit": 0}, headers=authorization)
+    assert invalid_resp.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY, invalid_resp.text
+
+
+@pytest.mark.asyncio
+async def test_verify_api_keys_batch_rate_limit_uses_cases(http_client_api, fake_data, fixture_models):
+    user_id = fake_data.uuid4()
+    throttled = await fixture_models.APIKeyDocument.issue(user_id, rate_limit=0.001, rate_limit_burst=1).create()
+    unlimited = await fixture_models.APIKeyDocument.issue(user_id).create()
+    payload = {"api_keys": [throttled.api_key, unlimited.api_key]}
+
+    # CASE 1: The first batch consumes the burst of the throttled key
+    verify_response = await http_client_api.post("/verify-api-keys", json=payload)
+    assert verify_response.status_code == status.HTTP_200_OK, verify_response.text
+    assert verify_response.json() == [{"verified": True, "allowed": True}, {"verified": True}]
+
+    # CASE 2: From the cache, the throttled key is denied with its delay while the other one stays allowed
+    verify_response = await http_client_api.post("/verify-api-keys", json=payload)
+    limited, other = verify_response.json()
+    assert (limited["verified"], limited["allowed"], other) == (True, False, {"verified": True})
+    assert limited["retry_after"] > 0
+
+    # CASE 3: Single verification shares the same bucket
+    single_response = await http_client_api.get("/verify-api-key", headers={"X-API-Key": throttled.api_key})
+    assert single_response.json() == {"verified": True, "allowed": False}
+
+
+@pytest.mark.asyncio
+async def test_verify_api_key_from_secondary_is_not_cached(http_client_api, fake_data, fixture_models):
+    from src.shared import read_router, verification_cache
+
+    doc = await fixture_models.APIKeyDocument.issue(fake_data.uuid4()).create()
+
+    # mongomock ne gère pas with_options : la collection du modèle tient lieu de secondaire
+    with (
+        mock.patch.object(settings, "MONGO_READ_PREFERENCES", {"verify": "secondaryPreferred"}),
+        mock.patch.object(read_router, "collection", lambda document, operation: document.get_motor_collection()),
+    ):
+        # CASE 1: A verdict read from a secondary is served but never cached
+        verify_response = await http_client_api.get("/verify-api-key", headers={"X-API-Key": doc.api_key})
+        assert verify_response.json()["verified"] is True
+        batch_response = await http_client_api.post("/verify-api-keys", json={"api_keys": [doc.api_key]})
+        assert batch_response.json()[0]["verified"] is True
+        assert verification_cache.get(doc.api_key) is None
+
+    # CASE 2: Reads from the primary are cached
+    await http_client_api.get("/verify-api-key", headers={"X-API-Key": doc.api_key})
+    assert verification_cache.get(doc.api_key) is not None
+
+
+@pytest.mark.asyncio
+async def test_verify_api_key_daily_quota_is_shared(http_client_api, fake_data, fixture_models):
+    from src.services import rate_limiter
+    from src.shared import verification_cache
+
+    doc = await fixture_models.APIKeyDocument.issue(
+        fake_data.uuid4(), daily_quota=3, quota_day=datetime.now(timezone.utc).date().isoformat(), quota_used=2
+    ).create()
+    raw_api_key = doc.api_key
+
+    # CASE 1: The usage already counted by other replicas seeds the quota
+    verdicts = [(await http_client_api.get("/verify-api-key", headers={"X-API-Key": raw_api_key})).json() for _ in range(2)]
+    assert [verdict["allowed"] for verdict in verdicts] == [True, False]
+
+    # CASE 2: A new day resets the quota
+    await rate_limiter.sync()
+    await fixture_models.APIKeyDocument.find_one({"_id": doc.id}).update({"$set": {"quota_day": "1970-01-01"}})
+    rate_limiter.forget(doc.id)
+    verification_cache.invalidate(doc.id)
+    verify_response = await http_client_api.get("/verify-api-key", headers={"X-API-Key": raw_api_key})
+    assert verify_response.json()["allowed"] is True
+    assert verify_response.headers["X-Quota-Remaining"] == "2"
+
+
+@pytest.mark.asyncio
+async def test_verify_api_keys_batch_uses_cases(http_client_api, fake_api_data, mock_check_assess_allow):
+    authorization = {"Authorization": "Bearer fake_token"}
+
+    api_keys = []
+    for _ in range(2):
+        create_apikey_resp = await http_client_api.post("/keys", json=fake_api_data, headers=authorization)
+        assert create_apikey_resp.status_code == status.HTTP_201_CREATED, create_apikey_resp.text
+        api_keys.append(create_apikey_resp.json()["api_key"])
+
+    # CASE 1: Verdicts are returned in the same order as the keys
+    payload = {"api_keys": [api_keys[0], "invalid-key", f"{api_keys[1][:-4]}0000", api_keys[1], api_keys[0]]}
+    verify_response = await http_client_api.post("/verify-api-keys", json=payload)
+    assert verify_response.status_code == status.HTTP_200_OK, verify_response.text
+    assert [verdict["verified"] for verdict in verify_response.json()] == [True, False, False, True, True]
+
+    # CASE 2: Empty batch
+    empty_response = await http_client_api.post("/verify-api-keys", json={"api_keys": []})
+    assert empty_response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY, empty_response.text
+    assert empty_response.json()["code_error"] == "app/unprocessable-entity"
+
+
+@pytest.mark.asyncio
+async def test_verify_api_key_tracks_usage(http_client_api, fake_api_data, fixture_models, mock_check_assess_allow):
+    from src.services import usage_tracker
+
+    await usage_tracker.flush()
+    authorization = {"Authorization": "Bearer fake_token"}
+    create_apikey_resp = await http_client_api.post("/keys", json=fake_api_data, headers=authorization)
+    assert create_apikey_resp.status_code == status.HTTP_201_CREATED, create_apikey_resp.text
+    response = create_apikey_resp.json()
+
+    # CASE 1: Verifications are aggregated in memory and written once per flush
+    for _ in range(3):
+        verify_response = await http_client_api.get("/verify-api-key", headers={"X-API-Key": response["api_key"]})
+        assert verify_response.json()["verified"] is True
+    await http_client_api.get("/verify-api-key", headers={"X-API-Key": "invalid-key"})
+
+    assert await usage_tracker.flush() == 1
+    doc = await fixture_models.APIKeyDocument.get(response["_id"])
+    assert doc.usage_count == 3
+    assert doc.last_used_at.replace(tzinfo=None) > datetime.fromisoformat(response["last_used_at"]).replace(tzinfo=None)
+
+    # CASE 2: Nothing left to write
+    assert await usage_tracker.flush() == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sort", ["asc", "desc"])
+async def test_read_all_by_cursor_uses_cases(http_client_api, fake_api_data, sort, mock_check_assess_allow):
+    headers = {"Authorization": "Bearer fake_token"}
+
+    created_ids = []
+    for _ in range(5):
+        create_apikey_resp = await http_client_api.post("/keys", json=fake_api_data, headers=headers)
+        assert create_apikey_resp.status_code == status.HTTP_201_CREATED, create_apikey_resp.text
+        created_ids.append(create_apikey_resp.json()["_id"])
+
+    # CASE 1: Walk forward through every page
+    pages, cursor = [], None
+    while True:
+        params = {"sort": sort, "size": 2, **({"cursor": cursor} if cursor else {})}
+        page_resp = await http_client_api.get("/keys/cursor", params=params, headers=headers)
+        assert page_resp.status_code == status.HTTP_200_OK, page_resp.text
+        page = page_resp.json()
+        assert "total" not in page
+        assert all("hashed_key" not in item for item in page["items"])
+        pages.append(page)
+        if (cursor := page["next_page"]) is None:
+            break
+
+    assert [len(page["items"]) for page in pages] == [2, 2, 1]
+    assert pages[0]["previous_page"] is None
+    seen_ids = [item["_id"] for page in pages for item in page["items"]]
+    assert seen_ids == (created_ids if sort == "asc" else created_ids[::-1])
+
+    # CASE 2: Walk back to the previous page
+    previous_resp = await http_client_api.get(
+        "/keys/cursor", params={"sort": sort, "size": 2, "cursor": pages[-1]["previous_page"]}, headers=headers
+    )
+    assert previous_resp.status_code == status.HTTP_200_OK, previous_resp.text
+    assert [item["_id"] for item in previous_resp.json()["items"]] == [item["_id"] for item in pages[1]["items"]]
+
+    # CASE 3: Filters still apply
+    user_id = pages[0]["items"][0]["user_id"]
+    user_resp = await http_client_api.get("/keys/cursor", params={"user_id": user_id}, headers=headers)
+    assert [item["user_id"] for item in user_resp.json()["items"]] == [user_id]
+
+    # CASE 4: Invalid cursor
+    invalid_resp = await http_client_api.get("/keys/cursor", params={"cursor": "not-a-cursor"}, headers=headers)
+    assert invalid_resp.status_code == status.HTTP_400_BAD_REQUEST, invalid_resp.text
+    assert invalid_resp.json()["code_error"] == "pagination/invalid-cursor"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sort", ["asc", "desc"])
+async def test_read_all_by_cursor_orders_by_created_at(http_client_api, fake_data, fixture_models, sort, mock_check_assess_allow):
+    from beanie import PydanticObjectId
+
+    headers = {"Authorization": "Bearer fake_token"}
+    user_id = fake_data.uuid4()
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    # Insérés dans le désordre, avec deux clés créées au même instant pour départager sur _id
+    offsets = [3, 0, 4, 1, 1, 2]
+    docs = [
+        fixture_models.APIKeyDocument.issue(user_id, id=PydanticObjectId(), created_at=start + timedelta(minutes=offset))
+        for offset in offsets
+    ]
+    await fixture_models.APIKeyDocument.insert_many(docs)
+    expected = [str(doc.id) for doc in sorted(docs, key=lambda doc: (doc.created_at, doc.id), reverse=sort == "desc")]
+
+    # CASE 1: Pages follow (created_at, _id), not the insertion order
+    pages, cursor = [], None
+    while True:
+        params = {"sort": sort, "size": 2, **({"cursor": cursor} if cursor else {})}
+        page = (await http_client_api.get("/keys/cursor", params=params, headers=headers)).json()
+        pages.append([item["_id"] for item in page["items"]])
+        if (cursor := page["next_page"]) is None:
+            break
+    assert [doc_id for page in pages for doc_id in page] == expected
+
+    # CASE 2: The previous cursor crosses the created_at tie in the other direction
+    params = {"sort": sort, "size": 2, "cursor": page["previous_page"]}
+    previous_resp = await http_client_api.get("/keys/cursor", params=params, headers=headers)
+    assert [item["_id"] for item in previous_resp.json()["items"]] == pages[1]
+
+
+@pytest.mark.asyncio
+async def test_read_all_with_range_filters(http_client_api, fake_api_data, mock_check_assess_allow):
+    headers = {"Authorization": "Bearer fake_token"}
+
+    create_apikey_resp = await http_client_api.post("/keys", json=fake_api_data, headers=headers)
+    assert create_apikey_resp.status_code == status.HTTP_201_CREATED, create_apikey_resp.text
+    expires_at = datetime.fromisoformat(create_apikey_resp.json()["expires_at"])
+
+    cases = [
+        ({"expires_at_gte": (expires_at - timedelta(days=1)).isoformat()}, 1),
+        ({"expires_at_lte": (expires_at - timedelta(days=1)).isoformat()}, 0),
+        (
+            {
+                "expires_at_gte": (expires_at - timedelta(days=1)).isoformat(),
+                "expires_at_lte": (expires_at + timedelta(days=1)).isoformat(),
+            },
+            1,
+        ),
+        ({"created_at_gte": (expires_at + timedelta(days=1)).isoformat()}, 0),
+        ({"last_used_at_lte": (expires_at + timedelta(days=1)).isoformat(), "is_active": True}, 1),
+    ]
+    for params, expected_total in cases:
+        range_resp = await http_client_api.get("/keys", params=params, headers=headers)
+        assert range_resp.status_code == status.HTTP_200_OK, range_resp.text
+        assert range_resp.json().get("total") == expected_total, params
+
+
+@pytest.mark.asyncio
+async def test_read_all_with_created_at_range(http_client_api, fake_data, fixture_models, mock_check_assess_allow):
+    headers = {"Authorization": "Bearer fake_token"}
+    user_id = fake_data.uuid4()
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for day in range(5):
+        await fixture_models.APIKeyDocument.issue(user_id, created_at=start + timedelta(days=day)).create()
+
+    def _day(day: int) -> str:
+        return (start + timedelta(days=day)).isoformat()
+
+    # CASE 1: Bounds are inclusive and select the keys created in between
+    cases = [
+        ({"created_at_gte": _day(2)}, [2, 3, 4]),
+        ({"created_at_lte": _day(1)}, [0, 1]),
+        ({"created_at_gte": _day(1), "created_at_lte": _day(3)}, [1, 2, 3]),
+        ({"created_at_gte": _day(3), "created_at_lte": _day(1)}, []),
+    ]
+    for params, expected_days in cases:
+        range_resp = await http_client_api.get("/keys", params={**params, "sort": "asc"}, headers=headers)
+        assert range_resp.status_code == status.HTTP_200_OK, range_resp.text
+        created = [datetime.fromisoformat(item["created_at"]).replace(tzinfo=timezone.utc) for item in range_resp.json()["items"]]
+        assert created == [start + timedelta(days=day) for day in expected_days], params
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("export_format", ["ndjson", "csv"])
+async def test_export_uses_cases(http_client_api, fake_api_data, export_format, mock_check_assess_allow):
+    import csv
+    import io
+    import json
+
+    headers = {"Authorization": "Bearer fake_token"}
+
+    created = []
+    for _ in range(3):
+        create_apikey_resp = await http_client_api.post("/keys", json=fake_api_data, headers=headers)
+        assert create_apikey_resp.status_code == status.HTTP_201_CREATED, create_apikey_resp.text
+        created.append(create_apikey_resp.json())
+
+    # CASE 1: Export every key, streamed by batches smaller than the result
+    with mock.patch.object(settings, "EXPORT_BATCH_SIZE", 2):
+        export_resp = await http_client_api.get("/keys/export", params={"format": export_format}, headers=headers)
+    assert export_resp.status_code == status.HTTP_200_OK, export_resp.text
+    if export_format == "ndjson":
+        assert export_resp.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in export_resp.text.splitlines()]
+    else:
+        assert export_resp.headers["content-type"].startswith("text/csv")
+        rows = list(csv.DictReader(io.StringIO(export_resp.text)))
+
+    assert sorted(row["_id"] for row in rows) == sorted(doc["_id"] for doc in created)
+    assert all("hashed_key" not in row for row in rows)
+
+    # CASE 2: Filters apply to the export
+    params = {"format": export_format, "user_id": created[0]["user_id"]}
+    filtered_resp = await http_client_api.get("/keys/export", params=params, headers=headers)
+    assert filtered_resp.status_code == status.HTTP_200_OK, filtered_resp.text
+    assert created[0]["_id"] in filtered_resp.text
+    assert created[1]["_id"] not in filtered_resp.text
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_uses_cases(http_client_api, fake_data, fixture_models, mock_check_assess_allow):
+    import json
+
+    headers = {"Authorization": "Bearer fake_token"}
+    user_ids = [fake_data.uuid4() for _ in range(5)]
+
+    # CASE 1: One key per user id, streamed in order across several chunks
+    with mock.patch.object(settings, "BULK_CHUNK_SIZE", 2):
+        bulk_resp = await http_client_api.post("/keys/bulk", json={"user_ids": user_ids}, headers=headers)
+    assert bulk_resp.status_code == status.HTTP_201_CREATED, bulk_resp.text
+    items = [json.loads(line) for line in bulk_resp.text.splitlines()]
+    assert [item["index"] for item in items] == list(range(5))
+    assert [item["user_id"] for item in items] == user_ids
+    assert await fixture_models.APIKeyDocument.count() == 5
+
+    verify_response = await http_client_api.post("/verify-api-keys", json={"api_keys": [item["api_key"] for item in items]})
+    assert all(verdict["verified"] for verdict in verify_response.json())
+
+    # CASE 2: Failed items are reported without stopping the others
+    from src.shared import key_codec, KeyCodec
+
+    issue = key_codec.issue
+
+    def _duplicated_hash(self, user_id):
+        return issue(user_id)._replace(hashed_key="duplicated-hash")
+
+    with mock.patch.object(KeyCodec, "issue", _duplicated_hash):
+        bulk_resp = await http_client_api.post("/keys/bulk", json={"user_ids": user_ids[:3]}, headers=headers)
+    items = [json.loads(line) for line in bulk_resp.text.splitlines()]
+    assert [item.get("error") for item in items] == [None, "bulk/duplicate-key", "bulk/duplicate-key"]
+    assert await fixture_models.APIKeyDocument.count() == 6
+
+    # CASE 3: Empty or blank user ids
+    for payload in ({"user_ids": []}, {"user_ids": [" "]}):
+        invalid_resp = await http_client_api.post("/keys/bulk", json=payload, headers=headers)
+        assert invalid_resp.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY, invalid_resp.text
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_ownership_uses_cases(http_client_api, fake_data, fixture_models, mock_verify_assess_token):
+    headers = {"Authorization": "Bearer fake_token"}
+    owner_id = fake_data.uuid4()
+    mock_verify_assess_token.side_effect = None
+    mock_verify_assess_token.return_value = {"active": True, "user_info": {"_id": owner_id, "role": {"slug": "prestataire"}}}
+
+    # CASE 1: A user who is not super admin cannot mint keys for someone else
+    payload = {"user_ids": [owner_id, fake_data.uuid4()]}
+    with mock.patch.object(settings, "USE_TRACK_ACTIVITY_LOGS", True), mock.patch("src.endpoint.activity_log_shipper") as shipper:
+        forbidden_resp = await http_client_api.post("/keys/bulk", json=payload, headers=headers)
+    assert forbidden_resp.status_code == status.HTTP_403_FORBIDDEN, forbidden_resp.text
+    assert forbidden_resp.json()["code_error"] == "resource/cannot-access-resource"
+    assert await fixture_models.APIKeyDocument.count() == 0
+    shipper.enqueue.assert_not_called()
+
+    # CASE 2: Their own keys are issued and logged
+    with mock.patch.object(settings, "USE_TRACK_ACTIVITY_LOGS", True), mock.patch("src.endpoint.activity_log_shipper") as shipper:
+        bulk_resp = await http_client_api.post("/keys/bulk", json={"user_ids": [owner_id, owner_id]}, headers=headers)
+    assert bulk_resp.status_code == status.HTTP_201_CREATED, bulk_resp.text
+    assert await fixture_models.APIKeyDocument.count() == 2
+    assert shipper.enqueue.call_args.kwargs["message"] == "has created 2 api keys in bulk"
+
+
+@pytest.mark.asyncio
+async def test_bulk_action_and_remove_uses_cases(
+    http_client_api, fake_api_data, mock_check_assess_allow, mock_verify_assess_token
+):
+    from src.services import rate_limiter
+
+    headers = {"Authorization": "Bearer fake_token"}
+
+    created = []
+    for _ in range(4):
+        create_apikey_resp = await http_client_api.post("/keys", json=fake_api_data, headers=headers)
+        assert create_apikey_resp.status_code == status.HTTP_201_CREATED, create_apikey_resp.text
+        created.append(create_apikey_resp.json())
+
+    async def _verified(api_key: str) -> bool:
+        return (await http_client_api.get("/verify-api-key", headers={"X-API-Key": api_key})).json()["verified"]
+
+    assert await _verified(created[0]["api_key"]) is True
+
+    # CASE 1: Deactivate by ids, cached verdicts and rate limiter states of the selected keys are invalidated
+    ids = [created[0]["_id"], created[1]["_id"]]
+    with mock.patch.object(rate_limiter, "forget", wraps=rate_limiter.forget) as mock_forget:
+        action_resp = await http_client_api.request(
+            "PUT", "/keys/bulk/action", params={"action": "deactivate"}, json={"ids": ids}, headers=headers
+        )
+    assert action_resp.status_code == status.HTTP_202_ACCEPTED, action_resp.text
+    assert action_resp.json() == {"matched": 2, "modified": 2}
+    assert [str(doc_id) for doc_id in mock_forget.call_args.args] == ids
+    assert await _verified(created[0]["api_key"]) is False
+
+    # CASE 2: Activate by filter, every rate limiter state is dropped
+    with mock.patch.object(rate_limiter, "clear", wraps=rate_limiter.clear) as mock_clear:
+        action_resp = await http_client_api.request(
+            "PUT", "/keys/bulk/action", params={"action": "activate"}, json={"filter": {"is_active": False}}, headers=headers
+        )
+    assert action_resp.json() == {"matched": 2, "modified": 2}
+    mock_clear.assert_called_once()
+    assert await _verified(created[0]["api_key"]) is True
+
+    # CASE 3: A user who is not super admin only reaches their own keys
+    owner_info = {"active": True, "user_info": {"_id": created[2]["user_id"], "role": {"slug": "prestataire"}}}
+    mock_verify_assess_token.side_effect = None
+    mock_verify_assess_token.return_value = owner_info
+    delete_resp = await http_client_api.request(
+        "DELETE", "/keys/bulk", json={"ids": [created[2]["_id"], created[3]["_id"]]}, headers=headers
+    )
+    assert delete_resp.status_code == status.HTTP_200_OK, delete_resp.text
+    assert delete_resp.json() == {"deleted": 1}
+
+    # CASE 4: Invalid selections
+    for payload in ({}, {"ids": ids, "filter": {"is_active": True}}, {"filter": {}}):
+        invalid_resp = await http_client_api.request("DELETE", "/keys/bulk", json=payload, headers=headers)
+        assert invalid_resp.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY, invalid_resp.text
@@ -0,0 +1,80 @@
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING
+
+from src.models import APIKeyDocument
+from src.shared import generate_api_key
+
+# mongomock has no query planner: these checks only run against a real mongod
+MONGODB_EXPLAIN_URI = os.getenv("MONGODB_EXPLAIN_URI")
+
+pytestmark = pytest.mark.skipif(not MONGODB_EXPLAIN_URI, reason="MONGODB_EXPLAIN_URI is not set")
+
+
+def _stages(plan: dict):
+    yield plan.get("stage")
+    for child in ("inputStage", "queryPlan"):
+        if child in plan:
+            yield from _stages(plan[child])
+    for sub_plan in plan.get("inputStages", []):
+        yield from _stages(sub_plan)
+
+
+@pytest.fixture()
+async def explain_collection():
+    client = AsyncIOMotorClient(MONGODB_EXPLAIN_URI)
+    collection = client[f"explain_{uuid.uuid4().hex}"]["keys"]
+    await collection.create_indexes(APIKeyDocument.Settings.indexes)
+
+    now = datetime.now(timezone.utc)
+    docs = []
+    for index in range(200):
+        api_key, hashed_key = generate_api_key(f"user-{index % 20}")
+        docs.append(
+            {
+                "user_id": f"user-{index % 20}",
+                "api_key": api_key,
+                "hashed_key": hashed_key,
+                "is_active": index % 3 != 0,
+                "last_used_at": now - timedelta(hours=index),
+                "expires_at": now + timedelta(days=index),
+                "created_at": now - timedelta(minutes=index),
+            }
+        )
+    await collection.insert_many(docs)
+
+    yield collection
+
+    await client.drop_database(collection.database.name)
+    client.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "search, sort",
+    [
+        ({}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+        ({"user_id": "user-1"}, [("created_at", DESCENDING)]),
+        ({"user_id": "user-1"}, [("created_at", ASCENDING), ("_id", ASCENDING)]),
+        ({"user_id": "user-1", "is_active": True}, [("created_at", DESCENDING)]),
+        ({"is_active": True, "expires_at": {"$lte": datetime.now(timezone.utc) + timedelta(days=30)}}, None),
+        ({"created_at": {"$gte": datetime.now(timezone.utc) - timedelta(hours=1)}}, [("created_at", DESCENDING)]),
+        ({"hashed_key": "0" * 64}, None),
+    ],
+)
+async def test_listing_queries_use_an_index(explain_collection, search, sort):
+    cursor = explain_collection.find(search)
+    if sort:
+        cursor = cursor.sort(sort)
+
+    plan = (await cursor.explain())["queryPlanner"]["winningPlan"]
+    stages = set(_stages(plan))
+
+    assert "IXSCAN" in stages or "EXPRESS_IXSCAN" in stages, plan
+    assert "COLLSCAN" not in stages, plan
+    # Le tri doit être fourni par l'index et non fait en mémoire
+    assert "SORT" not in stages, plan
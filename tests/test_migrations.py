@@ -0,0 +1,111 @@
+import pytest
+
+from src.models.migrations import backfill_key_ids, drop_raw_api_keys, ensure_hashed_key_index, relax_api_key_index
+from src.shared import generate_api_key, key_codec
+
+
+@pytest.mark.asyncio
+async def test_ensure_hashed_key_index_uses_cases(fixture_models, fake_data):
+    collection = fixture_models.APIKeyDocument.get_motor_collection()
+    await collection.drop_indexes()
+
+    user_id = fake_data.uuid4()
+    raw_api_key, hashed_key = generate_api_key(user_id)
+    await collection.insert_many(
+        [
+            {"user_id": user_id, "api_key": raw_api_key, "hashed_key": hashed_key},
+            {"user_id": user_id, "api_key": f"{raw_api_key}-copy", "hashed_key": hashed_key},
+        ]
+    )
+
+    # CASE 1: Duplicated hashed keys are reported and the index is not built
+    result = await ensure_hashed_key_index(collection)
+    assert result["created"] is False
+    assert len(result["duplicated_ids"]) == 1
+    assert "hashed_key_unique" not in await collection.index_information()
+
+    # CASE 2: Once the duplicates are gone the index is built
+    await collection.delete_one({"api_key": f"{raw_api_key}-copy"})
+    result = await ensure_hashed_key_index(collection)
+    assert result["created"] is True
+    assert "hashed_key_unique" in await collection.index_information()
+
+
+@pytest.mark.asyncio
+async def test_drop_raw_api_keys_uses_cases(fixture_models, fake_data):
+    collection = fixture_models.APIKeyDocument.get_motor_collection()
+    await collection.drop_indexes()
+    await collection.create_index([("api_key", 1), ("user_id", 1)], unique=True)
+
+    user_id = fake_data.uuid4()
+    api_keys = [generate_api_key(user_id) for _ in range(3)]
+    await collection.insert_many(
+        [{"user_id": user_id, "api_key": api_key, "hashed_key": hashed_key} for api_key, hashed_key in api_keys]
+        + [{"user_id": user_id, "api_key": "unparsable-key", "hashed_key": "unparsable-hash"}]
+    )
+
+    # CASE 1: Every plaintext is removed batch by batch, the key_id is kept for lookup and display
+    result = await drop_raw_api_keys(collection, batch_size=2)
+    assert result == {"rewritten": 4, "without_key_id": 1, "dropped_index": True}
+    assert await collection.count_documents({"api_key": {"$exists": True}}) == 0
+    for api_key, hashed_key in api_keys:
+        assert (await collection.find_one({"hashed_key": hashed_key}))["key_id"] == key_codec.parse(api_key).key_id
+
+    indexes = await collection.index_information()
+    assert "api_key_1_user_id_1" not in indexes
+    assert "key_id_unique" in indexes
+
+    # CASE 2: Running it again is a no-op
+    assert (await drop_raw_api_keys(collection, batch_size=2))["rewritten"] == 0
+
+
+@pytest.mark.asyncio
+async def test_relax_api_key_index_uses_cases(fixture_models, fake_data):
+    from pymongo.errors import DuplicateKeyError
+
+    collection = fixture_models.APIKeyDocument.get_motor_collection()
+    await collection.drop_indexes()
+    await collection.create_index([("api_key", 1), ("user_id", 1)], name="api_key_1_user_id_1", unique=True)
+
+    user_id = fake_data.uuid4()
+    api_key, hashed_key = generate_api_key(user_id)
+    await collection.insert_one({"user_id": user_id, "api_key": api_key, "hashed_key": hashed_key})
+    await collection.insert_one({"user_id": user_id, "hashed_key": "first-hash"})
+
+    # CASE 1: The full index rejects a second key stored without its plaintext
+    with pytest.raises(DuplicateKeyError):
+        await collection.insert_one({"user_id": user_id, "hashed_key": "second-hash"})
+
+    # CASE 2: Once partial, keys without plaintext coexist while stored plaintexts stay unique
+    assert await relax_api_key_index(collection) == {"rebuilt": True}
+    await collection.insert_one({"user_id": user_id, "hashed_key": "second-hash"})
+    with pytest.raises(DuplicateKeyError):
+        await collection.insert_one({"user_id": user_id, "api_key": api_key, "hashed_key": "copy-hash"})
+
+    # CASE 3: Running it again is a no-op
+    assert await relax_api_key_index(collection) == {"rebuilt": False}
+
+
+@pytest.mark.asyncio
+async def test_backfill_key_ids_uses_cases(fixture_models, fake_data):
+    collection = fixture_models.APIKeyDocument.get_motor_collection()
+    await collection.drop_indexes()
+
+    user_id = fake_data.uuid4()
+    api_keys = [generate_api_key(user_id) for _ in range(3)]
+    await collection.insert_many(
+        [{"user_id": user_id, "api_key": api_key, "hashed_key": hashed_key} for api_key, hashed_key in api_keys]
+        + [{"user_id": user_id, "api_key": "unparsable-key", "hashed_key": "unparsable-hash"}]
+    )
+
+    # CASE 1: Legacy keys get the key_id of their plaintext and the legacy secret id, batch by batch
+    result = await backfill_key_ids(collection, batch_size=2)
+    assert result == {"backfilled": 3, "without_key_id": 1}
+    for api_key, hashed_key in api_keys:
+        doc = await collection.find_one({"hashed_key": hashed_key})
+        assert doc["key_id"] == key_codec.parse(api_key).key_id
+        assert doc["secret_id"] == key_codec.legacy_id
+        assert doc["api_key"] == api_key
+
+    # CASE 2: Running it again is a no-op
+    assert await backfill_key_ids(collection, batch_size=2) == {"backfilled": 0, "without_key_id": 1}
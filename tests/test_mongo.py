@@ -0,0 +1,40 @@
+from unittest import mock
+
+from pymongo.read_preferences import SecondaryPreferred
+
+from src.config import settings
+from src.shared import client_uri, pool_wait_listener, read_router
+from src.shared.metrics import mongo_pool_wait_duration
+
+
+def test_client_uri_uses_cases():
+    # CASE 1: Without pool settings the URI is left untouched
+    assert client_uri("mongodb://db:27017/?replicaSet=rs0") == "mongodb://db:27017/?replicaSet=rs0"
+
+    # CASE 2: The settings are added as URI options and replace the ones already set
+    with mock.patch.multiple(settings, MONGO_MAX_POOL_SIZE=200, MONGO_COMPRESSORS="zstd,snappy"):
+        uri = client_uri("mongodb://db:27017/?replicaSet=rs0&maxPoolSize=10")
+    assert uri == "mongodb://db:27017/?replicaSet=rs0&maxPoolSize=200&compressors=zstd%2Csnappy"
+
+
+def test_read_router_uses_cases(fixture_models):
+    document = fixture_models.APIKeyDocument
+
+    # CASE 1: Operations without a read preference read the model collection
+    assert read_router.collection(document, "export") is document.get_motor_collection()
+    assert read_router.reads_primary("export") is True
+
+    # CASE 2: A configured operation gets a collection bound to its read preference, derived once
+    with mock.patch.object(settings, "MONGO_READ_PREFERENCES", {"verify": "secondaryPreferred"}):
+        collection = read_router.collection(document, "verify")
+        assert collection.read_preference == SecondaryPreferred()
+        assert read_router.collection(document, "verify") is collection
+        assert read_router.reads_primary("verify") is False
+
+
+def test_pool_wait_listener_records_checkouts():
+    series = mongo_pool_wait_duration.labels()
+    count = sum(series.counts)
+
+    pool_wait_listener.connection_checked_out(mock.Mock(duration=0.002))
+    assert sum(series.counts) == count + 1
@@ -0,0 +1,173 @@
+import base64
+import json
+import time
+from unittest import mock
+
+import httpx
+import pytest
+from starlette import status
+
+from src.common.helpers.exception import CustomHTTPException
+from src.shared import (
+    auth_cache,
+    CheckAccessAllow,
+    CHECK_ACCESS_ALLOW_ENDPOINT,
+    CHECK_VALIDATE_ACCESS_TOKEN_ENDPOINT,
+    VerifyAccessToken,
+)
+
+# The endpoint fixtures patch these dependencies, keep a handle on the cached implementations
+check_access_allow = CheckAccessAllow.__call__
+verify_access_token = VerifyAccessToken.__call__
+
+
+def _bearer_jwt(exp: float) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).decode().rstrip("=")
+    return f"Bearer header.{payload}.signature"
+
+
+@pytest.fixture(autouse=True)
+def clear_auth_cache():
+    auth_cache.clear()
+    yield
+    auth_cache.clear()
+
+
+@pytest.fixture()
+def mock_auth_service():
+    with mock.patch("src.shared.permission.http_client.get", new_callable=mock.AsyncMock) as mock_get:
+        yield mock_get
+
+
+@pytest.mark.asyncio
+async def test_check_access_allow_cache_uses_cases(mock_auth_service):
+    mock_auth_service.return_value = httpx.Response(status.HTTP_200_OK, json={"access": True})
+    read_access = CheckAccessAllow(url=CHECK_ACCESS_ALLOW_ENDPOINT, permissions={"apikey:can-read-apikey"})
+    delete_access = CheckAccessAllow(url=CHECK_ACCESS_ALLOW_ENDPOINT, permissions={"apikey:can-delete-apikey"})
+
+    # CASE 1: The same token and permissions only reach the auth service once
+    assert await check_access_allow(read_access, authorization="Bearer fake_token") is True
+    assert await check_access_allow(read_access, authorization="Bearer fake_token") is True
+    assert mock_auth_service.await_count == 1
+    mock_auth_service.assert_awaited_with(
+        CHECK_ACCESS_ALLOW_ENDPOINT,
+        headers={"Authorization": "Bearer fake_token"},
+        params={"permission": ["apikey:can-read-apikey"]},
+    )
+
+    # CASE 2: Another permission set is a distinct decision
+    assert await check_access_allow(delete_access, authorization="Bearer fake_token") is True
+    assert mock_auth_service.await_count == 2
+
+    # CASE 3: Denials are never cached
+    mock_auth_service.return_value = httpx.Response(status.HTTP_200_OK, json={"access": False})
+    for _ in range(2):
+        with pytest.raises(CustomHTTPException) as exc:
+            await check_access_allow(read_access, authorization="Bearer other_token")
+        assert exc.value.status_code == status.HTTP_403_FORBIDDEN
+    assert mock_auth_service.await_count == 4
+
+    # CASE 4: The auth service is unreachable on a miss
+    mock_auth_service.side_effect = httpx.ConnectError("connection refused")
+    with pytest.raises(CustomHTTPException) as exc:
+        await check_access_allow(read_access, authorization="Bearer another_token")
+    assert exc.value.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+@pytest.mark.asyncio
+async def test_verify_access_token_cache_honours_token_expiry(mock_auth_service):
+    mock_auth_service.return_value = httpx.Response(status.HTTP_200_OK, json={"active": True, "user_info": {"_id": "user"}})
+    verify_token = VerifyAccessToken(url=CHECK_VALIDATE_ACCESS_TOKEN_ENDPOINT)
+
+    # CASE 1: A live token is cached
+    live_token = _bearer_jwt(exp=time.time() + 3600)
+    assert (await verify_access_token(verify_token, authorization=live_token))["user_info"]["_id"] == "user"
+    assert (await verify_access_token(verify_token, authorization=live_token))["user_info"]["_id"] == "user"
+    assert mock_auth_service.await_count == 1
+
+    # CASE 2: An expired token is always sent to the auth service
+    expired_token = _bearer_jwt(exp=time.time() - 1)
+    await verify_access_token(verify_token, authorization=expired_token)
+    await verify_access_token(verify_token, authorization=expired_token)
+    assert mock_auth_service.await_count == 3
+
+    # CASE 3: A missing token is denied without calling the auth service
+    with pytest.raises(CustomHTTPException) as exc:
+        await verify_access_token(verify_token, authorization="Bearer null")
+    assert exc.value.status_code == status.HTTP_403_FORBIDDEN
+    assert mock_auth_service.await_count == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "response",
+    [
+        httpx.Response(status.HTTP_200_OK, json={"user_info": {"_id": "user"}}),
+        httpx.Response(status.HTTP_200_OK, json=[{"active": True}]),
+        httpx.Response(status.HTTP_200_OK, content=b"<html>maintenance</html>"),
+        httpx.Response(status.HTTP_500_INTERNAL_SERVER_ERROR, json={"active": True, "access": True}),
+    ],
+)
+async def test_malformed_auth_answers_are_denied(mock_auth_service, response):
+    mock_auth_service.return_value = response
+
+    # CASE 1: A token validation without an explicit `active` is denied
+    with pytest.raises(CustomHTTPException) as exc:
+        await verify_access_token(VerifyAccessToken(url=CHECK_VALIDATE_ACCESS_TOKEN_ENDPOINT), authorization="Bearer fake_token")
+    assert exc.value.status_code == status.HTTP_403_FORBIDDEN
+
+    # CASE 2: A permission check without an explicit `access` is denied
+    with pytest.raises(CustomHTTPException) as exc:
+        await check_access_allow(
+            CheckAccessAllow(url=CHECK_ACCESS_ALLOW_ENDPOINT, permissions={"apikey:can-read-apikey"}),
+            authorization="Bearer fake_token",
+        )
+    assert exc.value.status_code == status.HTTP_403_FORBIDDEN
+    assert not auth_cache.stats()["size"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("granted", [True, False])
+async def test_auth_contract_matches_common_library(granted):
+    from src.common.depends import permission as common
+
+    async def _send(client: httpx.AsyncClient, request: httpx.Request, **kwargs) -> httpx.Response:
+        requests.append(request)
+        body = (
+            {"access": granted} if request.url.path.endswith("check-access") else {"active": granted, "user_info": {"_id": "u"}}
+        )
+        return httpx.Response(status.HTTP_200_OK, json=body, request=request)
+
+    async def _decide(dependency) -> object:
+        try:
+            return await dependency(authorization="Bearer fake_token")
+        except CustomHTTPException as exc:
+            return exc.status_code
+
+    # Les deux implémentations passent par httpx : comparer les requêtes émises et les décisions prises
+    permissions = {"apikey:can-read-apikey"}
+    cases = [
+        (
+            common.CheckAccessAllow(url=CHECK_ACCESS_ALLOW_ENDPOINT, permissions=permissions),
+            check_access_allow.__get__(CheckAccessAllow(url=CHECK_ACCESS_ALLOW_ENDPOINT, permissions=permissions)),
+        ),
+        (
+            common.VerifyAccessToken(url=CHECK_VALIDATE_ACCESS_TOKEN_ENDPOINT),
+            verify_access_token.__get__(VerifyAccessToken(url=CHECK_VALIDATE_ACCESS_TOKEN_ENDPOINT)),
+        ),
+    ]
+    with mock.patch("httpx.AsyncClient.send", new=_send):
+        for reference, local in cases:
+            requests = []
+            expected, actual = await _decide(reference), await _decide(local)
+            common_request, local_request = requests
+
+            # CASE 1: Same method, URL, query parameters and credentials
+            assert (local_request.method, local_request.url) == (common_request.method, common_request.url)
+            assert local_request.headers["Authorization"] == common_request.headers["Authorization"]
+
+            # CASE 2: Same decision for a well-formed answer (token info, True, or the 403 of a denial)
+            if granted or isinstance(reference, common.CheckAccessAllow):
+                assert actual == expected
+            else:
+                assert actual == status.HTTP_403_FORBIDDEN
@@ -0,0 +1,60 @@
+from unittest import mock
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+from src.services import CacheInvalidationWatcher, rate_limiter, RateLimitPolicy
+from src.services.watcher import CHANGE_STREAM_PIPELINE
+from src.shared import verification_cache
+
+
+def _cache_verdict(doc_id: ObjectId, apikey: str) -> None:
+    verification_cache.set(apikey, {"verified": True}, doc_id=doc_id)
+    rate_limiter.check(str(doc_id), RateLimitPolicy(rate=1.0, burst=1, daily_quota=None))
+
+
+@pytest.mark.asyncio
+async def test_watcher_evicts_changed_keys():
+    watcher = CacheInvalidationWatcher()
+    changed_id, other_id = ObjectId(), ObjectId()
+    _cache_verdict(changed_id, "changed-key")
+    _cache_verdict(other_id, "other-key")
+
+    # CASE 1: An update of a watched field evicts the key from every local cache
+    watcher.handle({"operationType": "update", "documentKey": {"_id": changed_id}})
+    assert verification_cache.get("changed-key") is None
+    assert verification_cache.get("other-key") is not None
+    assert rate_limiter.stats()["tracked"] >= 1
+
+    # CASE 2: Dropping the collection clears the local caches
+    watcher.handle({"operationType": "drop"})
+    assert verification_cache.get("other-key") is None
+    assert rate_limiter.stats()["tracked"] == 0
+    assert watcher.stats()["events"] == 2
+
+
+def test_watcher_ignores_usage_writes():
+    match = CHANGE_STREAM_PIPELINE[0]["$match"]["$or"]
+    watched = {key.rsplit(".", 1)[-1] for condition in match for key in condition if key.startswith("updateDescription")}
+
+    assert {"is_active", "hashed_key", "key_id", "secret_id", "expires_at"} <= watched
+    assert not watched & {"usage_count", "last_used_at", "quota_used", "quota_day"}
+
+
+@pytest.mark.asyncio
+async def test_watcher_falls_back_to_ttl_without_change_streams():
+    # CASE 1: mongomock has no change streams, the watcher stops and the caches rely on their TTL
+    watcher = CacheInvalidationWatcher()
+    await watcher.start()
+    await watcher._task
+    assert watcher.stats() == {"running": False, "available": False, "events": 0, "failures": 0}
+
+    # CASE 2: A standalone mongod refuses to open the change stream
+    watcher = CacheInvalidationWatcher()
+    collection = mock.MagicMock()
+    collection.database.command = mock.AsyncMock(return_value={"setName": "rs0"})
+    collection.watch.side_effect = OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+    with mock.patch("src.services.watcher.APIKeyDocument.get_motor_collection", return_value=collection):
+        await watcher._run()
+    assert watcher.available is False